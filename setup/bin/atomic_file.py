@@ -0,0 +1,34 @@
+import os, json, errno, contextlib
+
+def make_parent_directory(path):
+    # Concurrent runs may create the same directory, so one that appears in the meantime is fine
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(directory)
+    except OSError as error:
+        if error.errno != errno.EEXIST or not os.path.isdir(directory):
+            raise
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w', hidden=False):
+    """Write a file through a temp file next to it, which is renamed over it when the with block succeeds
+
+    Readers of the file only ever see the old one or the whole new one. The temp file has the pid in its name, so
+    concurrent runs never write into each other's, and it is removed if the with block fails. A hidden temp file
+    starts with a dot, so it stays out of listings of a shared directory like the portal repo
+    """
+    make_parent_directory(path)
+    temp_name = os.path.basename(path) + '.' + str(os.getpid()) + '.tmp'
+    temp_file = os.path.join(os.path.dirname(path), '.' + temp_name if hidden else temp_name)
+    try:
+        with open(temp_file, mode) as output_file:
+            yield output_file
+        os.rename(temp_file, path)
+    except:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+def write_json(path, data):
+    with atomic_write(path) as json_file:
+        json.dump(data, json_file)
@@ -0,0 +1,89 @@
+import io, gzip, zlib, struct, collections
+from concurrent.futures import ThreadPoolExecutor
+
+GZIP_MAGIC = '\x1f\x8b'
+# Same uncompressed block size as htslib, so that a compressed block always fits the 64KB BGZF limit
+BGZF_BLOCK_SIZE = 0xff00
+# The empty block that htslib expects at the end of every BGZF file
+BGZF_EOF = '\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+def is_gzipped(path):
+    with open(path,'rb') as input_file:
+        return input_file.read(2) == GZIP_MAGIC
+
+def open_input(path):
+    # Plain text and gzip/BGZF files are both read as a stream of lines. BufferedReader avoids the slow readline of GzipFile
+    if is_gzipped(path):
+        return io.BufferedReader(gzip.open(path,'rb'))
+    return open(path,'rb')
+
+def open_output(path, threads=1):
+    # Anything written to a .gz path is BGZF compressed, so it can still be indexed and read by htslib tools
+    if path.endswith('.gz'):
+        return BgzfWriter(path, threads)
+    return open(path,'wb')
+
+def compress_block(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed_data = compressor.compress(data) + compressor.flush()
+    # 18 bytes of gzip header with the BC extra field holding the total block size, then 8 bytes of CRC32 and length
+    block_size = len(compressed_data) + 26
+    header = struct.pack('<4BI2BH2BHH', 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, block_size - 1)
+    footer = struct.pack('<2I', zlib.crc32(data) & 0xffffffff, len(data))
+    return header + compressed_data + footer
+
+class BgzfWriter(object):
+    """Write a BGZF file, compressing blocks on a pool of threads since zlib releases the GIL"""
+
+    def __init__(self, path, threads=1, level=6):
+        self.name = path
+        self.level = level
+        self.output_file = open(path,'wb')
+        self.buffer = []
+        self.buffered_size = 0
+        self.executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        # Bound the number of blocks in flight, so that memory stays flat when the disk is slower than the threads
+        self.max_pending = threads * 4
+        self.pending = collections.deque()
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered_size += len(data)
+        if self.buffered_size >= BGZF_BLOCK_SIZE:
+            self.flush_blocks(False)
+
+    def flush_blocks(self, final):
+        data = ''.join(self.buffer)
+        end = len(data) if final else len(data) - len(data) % BGZF_BLOCK_SIZE
+        for offset in range(0, end, BGZF_BLOCK_SIZE):
+            self.write_block(data[offset:offset + BGZF_BLOCK_SIZE])
+        remainder = data[end:]
+        self.buffer = [remainder] if remainder else []
+        self.buffered_size = len(remainder)
+
+    def write_block(self, block):
+        if self.executor is None:
+            self.output_file.write(compress_block(block, self.level))
+            return
+        self.pending.append(self.executor.submit(compress_block, block, self.level))
+        while len(self.pending) > self.max_pending:
+            self.output_file.write(self.pending.popleft().result())
+
+    def close(self):
+        if self.output_file.closed:
+            return
+        try:
+            self.flush_blocks(True)
+            while self.pending:
+                self.output_file.write(self.pending.popleft().result())
+            self.output_file.write(BGZF_EOF)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+            self.output_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,57 @@
+import re, string, collections
+
+class FastqName(collections.namedtuple('FastqName', ['sample', 'barcode', 'flowcell', 'lane', 'read', 'set'])):
+    """The parts of a FASTQ file name. barcode, flowcell and lane are None when the name doesn't have them"""
+    __slots__ = ()
+
+    @property
+    def readset(self):
+        # The fastqs of one read pair share a readset, and only differ in their read
+        if self.flowcell is not None:
+            return self.sample + self.lane + self.flowcell + self.set
+        return self.sample + self.lane + self.set
+
+# The Illumina layout, like s_C_000001_T001_d_IGO_01234_1_S1_L001_R1_001.fastq.gz, and the older one with the read after
+# the set, like sample_barcode_flowcell_L001_001.R1.fastq.gz
+illumina_name = re.compile(r"(?P<sample>[^_]+)_?(?P<barcode>\S+)?_?(?P<flowcell>\S+)?_(?P<lane>\S+)_(?P<read>R[12])_(?P<set>\d\d\d).fastq.gz")
+read_after_set_name = re.compile(r"(?P<sample>[^_]+)_(?P<barcode>\S+)_(?P<flowcell>\S+)_(?P<lane>\S+)_(?P<set>\d\d\d).(?P<read>R[12]).fastq.gz")
+# Each regex can only match a name with its read and set in it like this. Their groups can split a name in many ways,
+# so searching for these first saves them from backtracking through all of them in a name that can't match
+illumina_read_set = re.compile(r"_R[12]_\d\d\d.fastq.gz")
+read_after_set_read_set = re.compile(r"_\d\d\d.R[12].fastq.gz")
+
+FASTQ_SUFFIX = '.fastq.gz'
+whitespace = frozenset(string.whitespace)
+digits = frozenset(string.digits)
+
+def split_illumina_name(base):
+    # The fast path for names in the Illumina layout, which are most of them. Returns None for any other name, which
+    # is then left to the regexes. It only accepts names that illumina_name matches in the same way: the sample is the
+    # part before the first underscore, the lane, read and set are the last three parts, and the barcode is all of the
+    # rest. Its greedy barcode never leaves anything for the flowcell in these names
+    if not base.endswith(FASTQ_SUFFIX) or not whitespace.isdisjoint(base):
+        return None
+    parts = base[:-len(FASTQ_SUFFIX)].split('_')
+    if len(parts) < 5:
+        return None
+    sample, lane, read, read_set = parts[0], parts[-3], parts[-2], parts[-1]
+    barcode = '_'.join(parts[1:-3])
+    if not sample or not lane or not barcode or read not in ('R1', 'R2') or len(read_set) != 3 or not digits.issuperset(read_set):
+        return None
+    return FastqName(sample, barcode, None, lane, read, read_set)
+
+def parse_fastq_name(base):
+    """Return the FastqName of a FASTQ file's base name, or None if it has no sample, read and set
+
+    The parts are the same as the ones found by searching the name with the illumina_name regex, and then with
+    read_after_set_name if that doesn't match
+    """
+    fastq_name = split_illumina_name(base)
+    if fastq_name is not None:
+        return fastq_name
+    m = illumina_name.search(base) if illumina_read_set.search(base) else None
+    if not m and read_after_set_read_set.search(base):
+        m = read_after_set_name.search(base)
+    if not m or not (m.group('sample') and m.group('read') and m.group('set')):
+        return None
+    return FastqName(m.group('sample'), m.group('barcode'), m.group('flowcell'), m.group('lane'), m.group('read'), m.group('set'))
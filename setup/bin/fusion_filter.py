@@ -1,44 +1,118 @@
 #!/usr/bin/env python
 
-import sys, os, csv, re, requests
-
-input_file = sys.argv[1]
-output_file = sys.argv[2]
-list_of_fusions_to_remove = []
-fixed_file_content = []
-
-# Fetch all fusions reported in clinic by DMP (Department of Molecular Pathology) at MSKCC
-dmp_fusion = {}
-with open(os.path.join(os.path.dirname(sys.argv[0]), 'known_fusions_at_mskcc.txt'),'rb') as fusions:
-    for pair in fusions:
-        pair = pair.strip('\r\n')
-        dmp_fusion[pair] = 1
-
-with open(input_file,'rb') as infile:
-    header = infile.readline().strip('\r\n').split('\t')
-    gene_position = header.index('Hugo_Symbol')
-    Entrez_Gene_Id_position = header.index('Entrez_Gene_Id')
-    Fusion_position = header.index('Fusion')
-    csv_reader = csv.reader(infile,delimiter='\t')
-    for line in csv_reader:
-        gene = line[gene_position]
-        entrez_id = int(line[Entrez_Gene_Id_position])
-        fusion = line[Fusion_position]
+import os, csv, shutil, argparse, multiprocessing
+from tempfile import mkdtemp
+import bgzf, fusion_index
+
+def read_fusion_header(input_file):
+    # The first header line of a per-pair fusion file, or None if the file has none
+    with bgzf.open_input(input_file) as input_fusions:
+        for line in input_fusions:
+            if line.startswith('Hugo'):
+                return line.strip('\r\n').split('\t')
+    return None
+
+def check_fusion_headers(input_files):
+    # Every per-pair fusion file must share the same column layout, or the merged rows would be misaligned
+    header = None
+    for input_file in input_files:
+        file_header = read_fusion_header(input_file)
+        if file_header is None:
+            continue
+        if header is None:
+            header = file_header
+        elif file_header != header:
+            raise ValueError("Header of " + input_file + " does not match the header of the other fusion files")
+    if header is None:
+        raise ValueError("None of the input fusion files have a header line")
+    return header
+
+def read_fusion_rows(input_file):
+    # Stream the rows of a per-pair fusion file, skipping its header line
+    with bgzf.open_input(input_file) as input_fusions:
+        fusion_lines = (line for line in input_fusions if not line.startswith('Hugo'))
+        for line in csv.reader(fusion_lines,delimiter='\t'):
+            yield line
+
+def find_rejected_fusions(input_file, header, known_fusions, reciprocal=False, intragenic=False):
+    entrez_id_col = header.index('Entrez_Gene_Id')
+    fusion_col = header.index('Fusion')
+    rejected_fusions = set()
+    for line in read_fusion_rows(input_file):
+        entrez_id = int(line[entrez_id_col])
+        fusion = line[fusion_col]
         # Skip fusions with genes missing Entrez IDs, because the portal can't handle those
         # Skip fusions that have not been previously reported by DMP at MSKCC
-        if entrez_id == 0 or not fusion or '-' not in fusion or fusion.replace(' fusion', '') not in dmp_fusion:
-            list_of_fusions_to_remove.append(fusion)
-        new_line_values = line
-        fixed_file_content.append(new_line_values)
-
-with open(output_file,'wb') as outfile:
-    header_line = '\t'.join(header) + '\n'
-    outfile.write(header_line)
-    for line in fixed_file_content:
-        fusion = line[Fusion_position]
-        if fusion in list_of_fusions_to_remove:
-            continue
-        new_line = '\t'.join(line) + '\n'
-        outfile.write(new_line)
+        if entrez_id == 0 or not fusion or '-' not in fusion or not known_fusions.is_known(fusion.replace(' fusion', ''), reciprocal, intragenic):
+            rejected_fusions.add(fusion)
+    return rejected_fusions
+
+def write_kept_fusions(input_file, header, output_fusions, rejected_fusions):
+    fusion_col = header.index('Fusion')
+    for line in read_fusion_rows(input_file):
+        if line[fusion_col] not in rejected_fusions:
+            output_fusions.write('\t'.join(line) + '\n')
+
+def find_rejected_fusions_task(task):
+    input_file, header, known_fusions_file, reciprocal, intragenic = task
+    known_fusions = fusion_index.load_known_fusion_index(known_fusions_file)
+    try:
+        return find_rejected_fusions(input_file, header, known_fusions, reciprocal, intragenic)
+    finally:
+        known_fusions.close()
+
+def write_kept_fusions_task(task):
+    input_file, header, rejected_fusions, fragment_file = task
+    with open(fragment_file,'wb') as fragment:
+        write_kept_fusions(input_file, header, fragment, rejected_fusions)
+    return fragment_file
+
+def map_tasks(function, tasks, pool):
+    if pool is None:
+        return (function(task) for task in tasks)
+    return pool.imap(function, tasks)
+
+def filter_fusions(input_files, output_file, known_fusions_file, reciprocal=False, intragenic=False, workers=1):
+    header = check_fusion_headers(input_files)
+    # Fetch all fusions reported in clinic by DMP (Department of Molecular Pathology) at MSKCC. Build or refresh their
+    # index once here, so that the workers only map it
+    fusion_index.load_known_fusion_index(known_fusions_file).close()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    fragment_directory = mkdtemp(dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        # A fusion that fails on any row of any pair is removed from every row it's on, so first collect the rejects
+        # of every file, and only then filter each of them
+        rejected_fusions = set()
+        for file_rejected_fusions in map_tasks(find_rejected_fusions_task, [(input_file, header, known_fusions_file, reciprocal, intragenic) for input_file in input_files], pool):
+            rejected_fusions.update(file_rejected_fusions)
+        write_tasks = []
+        for file_index, input_file in enumerate(input_files):
+            write_tasks.append((input_file, header, rejected_fusions, os.path.join(fragment_directory, 'pair_' + str(file_index) + '.txt')))
+        # imap returns the fragments in input order, so the merged file keeps the order of the input files
+        with bgzf.open_output(output_file) as output_fusions:
+            output_fusions.write('\t'.join(header) + '\n')
+            for fragment_file in map_tasks(write_kept_fusions_task, write_tasks, pool):
+                with open(fragment_file,'rb') as fragment:
+                    shutil.copyfileobj(fragment, output_fusions)
+                os.remove(fragment_file)
+        if pool is not None:
+            pool.close()
+    except:
+        if pool is not None:
+            pool.terminate()
+        raise
+    finally:
+        if pool is not None:
+            pool.join()
+        shutil.rmtree(fragment_directory)
 
-os.remove(input_file)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge per-pair fusion files, keeping only the fusions previously reported in clinic by DMP at MSKCC")
+    parser.add_argument('--input_fusions',required=True,nargs='+',help='The per-pair *.svs.pass.vep.portal.txt files to merge, in order. These can be plain text or gzipped')
+    parser.add_argument('--output_file',required=True,help='The portal fusion file to write. BGZF compressed if it ends with .gz')
+    parser.add_argument('--known_fusions',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'known_fusions_at_mskcc.txt'),help='The list of known A-B fusions, indexed on first use')
+    parser.add_argument('--reciprocal',default=False,action='store_true',help='Also keep B-A fusions when A-B is known')
+    parser.add_argument('--intragenic',default=False,action='store_true',help='Also keep A-A intragenic events of genes in a known fusion')
+    parser.add_argument('--workers',type=int,default=1,help='Number of processes to filter the per-pair files with')
+    args = parser.parse_args()
+    filter_fusions(args.input_fusions, args.output_file, args.known_fusions, args.reciprocal, args.intragenic, args.workers)
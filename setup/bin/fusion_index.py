@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+import os, sys, mmap, struct, hashlib, argparse
+import atomic_file
+
+# The index starts with a magic string, the size and mtime of the text file it was built from, and the slot counts of
+# its two hash tables, one of known A-B fusions and one of the genes in them. Each slot is a 64-bit key, or 0 if empty
+INDEX_MAGIC = 'RFUSIDX1'
+# Indexes are kept in the user's cache rather than next to the list, so that the scripts directory is never written to
+DEFAULT_INDEX_DIRECTORY = os.path.join(os.path.expanduser('~'), '.roslin', 'known_fusion_index')
+INDEX_HEADER = struct.Struct('<8sQdQQ')
+SLOT = struct.Struct('<Q')
+
+def index_key(name):
+    # The first 8 bytes of an MD5 digest, so a false match between two different names is a 1 in 2^64 chance
+    key = SLOT.unpack(hashlib.md5(name).digest()[:8])[0]
+    return key or 1
+
+def fusion_splits(fusion):
+    # Gene names can contain hyphens, like CDKN2A-CDKN2A-DT, so try every hyphen as the break between the partners
+    start = fusion.find('-')
+    while start != -1:
+        yield fusion[:start], fusion[start + 1:]
+        start = fusion.find('-', start + 1)
+
+def build_table(keys):
+    # Open addressing with linear probing, at most half full so that a lookup probes about one slot
+    slot_count = 8
+    while slot_count < len(keys) * 2:
+        slot_count *= 2
+    slots = [0] * slot_count
+    for key in keys:
+        slot = key & (slot_count - 1)
+        while slots[slot] not in (0, key):
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = key
+    return slot_count, struct.pack('<%iQ' % slot_count, *slots)
+
+def build_index(known_fusions_file):
+    with open(known_fusions_file,'rb') as fusions:
+        file_stat = os.fstat(fusions.fileno())
+        pairs = set(pair.strip('\r\n') for pair in fusions)
+    pairs.discard('')
+    genes = set()
+    for pair in pairs:
+        for gene_a, gene_b in fusion_splits(pair):
+            genes.update((gene_a, gene_b))
+    pair_slots, pair_table = build_table(set(index_key(pair) for pair in pairs))
+    gene_slots, gene_table = build_table(set(index_key(gene) for gene in genes))
+    return INDEX_HEADER.pack(INDEX_MAGIC, file_stat.st_size, file_stat.st_mtime, pair_slots, gene_slots) + pair_table + gene_table
+
+def write_index(known_fusions_file, index_file):
+    with atomic_file.atomic_write(index_file,'wb') as index_output:
+        index_output.write(build_index(known_fusions_file))
+
+def default_index_file(known_fusions_file):
+    # Lists with the same name in different places, like in two roslin installs, each get an index of their own
+    known_fusions_path = os.path.abspath(known_fusions_file)
+    return os.path.join(DEFAULT_INDEX_DIRECTORY, os.path.basename(known_fusions_path) + '.' + hashlib.md5(known_fusions_path).hexdigest()[:16] + '.idx')
+
+def index_is_current(known_fusions_file, index_file):
+    if not os.path.exists(index_file):
+        return False
+    file_stat = os.stat(known_fusions_file)
+    with open(index_file,'rb') as index_input:
+        header = index_input.read(INDEX_HEADER.size)
+    if len(header) < INDEX_HEADER.size:
+        return False
+    magic, source_size, source_mtime, _, _ = INDEX_HEADER.unpack(header)
+    return magic == INDEX_MAGIC and source_size == file_stat.st_size and source_mtime == file_stat.st_mtime
+
+class KnownFusionIndex(object):
+    """Known fusions from a prebuilt index, mapped into memory once and probed in place"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, _, _, self.pair_slots, self.gene_slots = INDEX_HEADER.unpack_from(buffer)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a known fusion index")
+        self.pair_offset = INDEX_HEADER.size
+        self.gene_offset = self.pair_offset + self.pair_slots * SLOT.size
+
+    def probe(self, table_offset, slot_count, key):
+        buffer, unpack_from = self.buffer, SLOT.unpack_from
+        slot = key & (slot_count - 1)
+        while True:
+            slot_key = unpack_from(buffer, table_offset + slot * SLOT.size)[0]
+            if slot_key == key:
+                return True
+            if slot_key == 0:
+                return False
+            slot = (slot + 1) & (slot_count - 1)
+
+    def has_pair(self, pair):
+        return self.probe(self.pair_offset, self.pair_slots, index_key(pair))
+
+    def has_gene(self, gene):
+        return self.probe(self.gene_offset, self.gene_slots, index_key(gene))
+
+    def is_known(self, fusion, reciprocal=False, intragenic=False):
+        # Match the exact A-B fusion, and optionally B-A, or an A-A intragenic event of a gene in any known fusion
+        if self.has_pair(fusion):
+            return True
+        if not reciprocal and not intragenic:
+            return False
+        for gene_a, gene_b in fusion_splits(fusion):
+            if reciprocal and self.has_pair(gene_b + '-' + gene_a):
+                return True
+            if intragenic and gene_a == gene_b and self.has_gene(gene_a):
+                return True
+        return False
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+def load_known_fusion_index(known_fusions_file, index_file=None):
+    # Rebuild the index in the user's cache when the text file has changed. If the index can't be written there, build
+    # it in memory for this run instead
+    if index_file is None:
+        index_file = default_index_file(known_fusions_file)
+    if not index_is_current(known_fusions_file, index_file):
+        try:
+            write_index(known_fusions_file, index_file)
+        except (IOError, OSError):
+            return KnownFusionIndex(build_index(known_fusions_file))
+    with open(index_file,'rb') as index_input:
+        return KnownFusionIndex(mmap.mmap(index_input.fileno(), 0, access=mmap.ACCESS_READ))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build the known fusion index that fusion_filter.py maps into memory")
+    parser.add_argument('--known_fusions',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'known_fusions_at_mskcc.txt'),help='The list of known A-B fusions, one per line')
+    parser.add_argument('--index_file',required=False,help='Where to write the index, instead of under ' + DEFAULT_INDEX_DIRECTORY)
+    args = parser.parse_args()
+    index_file = args.index_file or default_index_file(args.known_fusions)
+    write_index(args.known_fusions, index_file)
+    print >>sys.stderr, "Wrote " + index_file
@@ -0,0 +1,71 @@
+import re, functools
+
+# An intronic HGVSc position like c.123+2 or n.45-7, or a range of two of them for indels like c.123-5_123-1del
+hgvsc_intron_regex = re.compile(r'[nc]\.\d+[-+](\d+)_\d+[-+](\d+)|[nc]\.\d+[-+](\d+)')
+
+# Recurrent variants repeat the same HGVSc strings across a cohort, so this covers the distinct ones in a typical MAF
+SPLICE_DISTANCE_CACHE_SIZE = 65536
+
+def lru_memoize(maxsize):
+    """Memoize a function of one hashable argument, keeping the maxsize most recently used results
+
+    functools.lru_cache is Python 3 only, and an OrderedDict is implemented in Python on 2.7, which makes a cache hit
+    slower than the regex it saves. This keeps the results in a dict of links of a circular doubly linked list, the
+    same way lru_cache does. It isn't thread safe, so share it between processes, not threads
+    """
+    def decorator(function):
+        cache = {}
+        # Each link is [previous, next, key, value], and root sits between the newest and the oldest links
+        root = []
+        root[:] = [root, root, None, None]
+
+        @functools.wraps(function)
+        def memoized(key):
+            link = cache.get(key)
+            if link is not None:
+                # Move the link to the newest end of the list
+                link_prev, link_next, _, value = link
+                link_prev[1] = link_next
+                link_next[0] = link_prev
+                last = root[0]
+                last[1] = root[0] = link
+                link[0] = last
+                link[1] = root
+                return value
+            value = function(key)
+            if len(cache) >= maxsize:
+                # Drop the oldest link, which follows root
+                oldest = root[1]
+                root[1] = oldest[1]
+                oldest[1][0] = root
+                del cache[oldest[2]]
+            last = root[0]
+            link = [last, root, key, value]
+            last[1] = root[0] = cache[key] = link
+            return value
+
+        def cache_clear():
+            cache.clear()
+            root[:] = [root, root, None, None]
+
+        memoized.cache_size = lambda: len(cache)
+        memoized.cache_clear = cache_clear
+        return memoized
+    return decorator
+
+def intron_offsets(hgvsc):
+    # Return the distances into the intron of the positions in an HGVSc string, or None if it doesn't start at an
+    # intronic position. A range only counts both ends when both of them are intronic
+    m = hgvsc_intron_regex.match(hgvsc)
+    if m is None:
+        return None
+    return tuple(int(offset) for offset in m.groups() if offset is not None)
+
+@lru_memoize(SPLICE_DISTANCE_CACHE_SIZE)
+def splice_distance(hgvsc):
+    # Return the distance from the nearest splice junction, which for indels is the closest end, or None if the
+    # HGVSc isn't intronic
+    offsets = intron_offsets(hgvsc)
+    if offsets is None:
+        return None
+    return min(offsets)
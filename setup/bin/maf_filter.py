@@ -1,70 +1,442 @@
 #!/usr/bin/env python
 
-import sys, os, csv, re
+import os, csv, re, json, time, copy, hashlib, argparse, shutil, itertools, multiprocessing
+from tempfile import mkdtemp
+import bgzf, hgvsc, atomic_file
 
-input_file = sys.argv[1]
-roslin_version_string = sys.argv[2]
-is_impact = bool(sys.argv[3])
-analyst_file = sys.argv[4]
-portal_file = sys.argv[5]
-roslin_version_line = "# Versions: " + roslin_version_string.replace('_',' ') + "\n"
+# Bump this whenever a change to the filter code changes its output, so that cached per-pair fragments are invalidated
+MAF_FILTER_VERSION = '1'
 
-with open(input_file,'rb') as input_maf, open(analyst_file,'wb') as analyst_maf, open(portal_file,'wb') as portal_maf:
-    header = input_maf.readline().strip('\r\n').split('\t')
+def read_maf_header(input_maf):
     # Skip all comment lines, and assume that the first line after them is the header
-    while header[0].startswith("#"):
-        header = input_maf.readline().strip('\r\n').split('\t')
-    analyst_maf.write(roslin_version_line)
-    portal_maf.write(roslin_version_line)
-    # The analyst MAF needs all the same columns as the input MAF (from vcf2maf, ngs-filters, etc.)
-    analyst_maf.write('\t'.join(header) + '\n')
-    # The portal MAF can be minimized since Genome Nexus re-annotates it when HGVSp_Short column is missing
-    header[header.index('HGVSp_Short')] = 'Amino_Acid_Change'
-    portal_maf.write('\t'.join(header[0:45]) + '\n')
-    gene_col = header.index('Hugo_Symbol')
-    entrez_id_col = header.index('Entrez_Gene_Id')
-    pos_col = header.index('Start_Position')
-    hgvsc_col = header.index('HGVSc')
-    mut_status_col = header.index('Mutation_Status')
-    csq_col = header.index('Consequence')
-    filter_col = header.index('FILTER')
-    hotspot_col = header.index('hotspot_whitelist')
-    tad_col = header.index('t_alt_count')
-    tdp_col = header.index('t_depth')
-    set_col = header.index('set')
-    maf_reader = csv.reader(input_maf,delimiter='\t')
-    for line in maf_reader:
-        # Skip uncalled events and any that failed false-positive filters, except common_variant
-        if line[mut_status_col] == 'None' or line[filter_col] != 'PASS' and line[filter_col] != 'common_variant':
+    line = input_maf.readline()
+    while line.startswith("#"):
+        line = input_maf.readline()
+    if not line:
+        return None
+    return line.strip('\r\n').split('\t')
+
+def check_maf_headers(input_files):
+    # Every per-pair MAF must share the same column layout, or the merged rows would be misaligned
+    header = None
+    for input_file in input_files:
+        with bgzf.open_input(input_file) as input_maf:
+            file_header = read_maf_header(input_maf)
+        if file_header is None:
             continue
-        # Skip all events reported uniquely by Pindel
-        if line[set_col] == 'Pindel':
+        if header is None:
+            header = file_header
+        elif file_header != header:
+            raise ValueError("Header of " + input_file + " does not match the header of the other MAFs")
+    if header is None:
+        raise ValueError("None of the input MAFs have a header line")
+    return header
+
+def read_maf_lines(input_files):
+    # Stream the data lines of all per-pair MAFs in order, skipping their comment and header lines
+    for input_file in input_files:
+        with bgzf.open_input(input_file) as input_maf:
+            if read_maf_header(input_maf) is None:
+                continue
+            for line in input_maf:
+                if not line.startswith(('#','Hugo')):
+                    yield line
+
+def read_maf_shard_lines(input_maf, end):
+    # Read whole data lines up to the end offset of the shard, which is always aligned to a line boundary
+    position = input_maf.tell()
+    while position < end:
+        line = input_maf.readline()
+        if not line:
+            break
+        position += len(line)
+        if not line.startswith(('#','Hugo')):
+            yield line
+
+def plan_maf_shards(input_files, shard_count):
+    # Split the data lines of the MAFs into (file, start, end) byte ranges of roughly equal size. Small per-pair
+    # MAFs end up as one shard each, while large ones are cut at the first line boundary after each shard size.
+    # Compressed MAFs can't be cut at byte offsets, so each of them is a single shard without a range
+    file_ranges = []
+    for input_file in input_files:
+        if bgzf.is_gzipped(input_file):
+            file_ranges.append((input_file, None, None))
             continue
-        # Skip splice region variants in non-coding genes, or those that are >3bp into introns
-        splice_dist = 0
-        if re.match(r'splice_region_variant', line[csq_col]) is not None:
-            if re.search(r'non_coding_', line[csq_col]) is not None:
+        with open(input_file,'rb') as input_maf:
+            if read_maf_header(input_maf) is None:
                 continue
-            # Parse the complex HGVSc format to determine the distance from the splice junction
-            m = re.match(r'[nc]\.\d+[-+](\d+)_\d+[-+](\d+)|[nc]\.\d+[-+](\d+)', line[hgvsc_col])
-            if m is not None:
-                # For indels, use the closest distance to the nearby splice junction
-                splice_dist = min(int(d) for d in [x for x in m.group(1,2,3) if x is not None])
-                if splice_dist > 3:
+            file_ranges.append((input_file, input_maf.tell(), os.fstat(input_maf.fileno()).st_size))
+    shard_size = max(sum(end - start for _, start, end in file_ranges if start is not None) // shard_count, 1)
+    shards = []
+    for input_file, start, end in file_ranges:
+        if start is None:
+            shards.append((input_file, None, None))
+            continue
+        with open(input_file,'rb') as input_maf:
+            while start < end:
+                boundary = start + shard_size
+                if boundary < end:
+                    input_maf.seek(boundary - 1)
+                    input_maf.readline()
+                    boundary = min(input_maf.tell(), end)
+                else:
+                    boundary = end
+                shards.append((input_file, start, boundary))
+                start = boundary
+    return shards
+
+def load_filter_rules(rules_file):
+    with open(rules_file) as rules_json:
+        return json.load(rules_json)
+
+# The portal MAF keeps only the first 45 columns of the analyst MAF
+PORTAL_COLUMNS = 45
+
+# The rules that can reject a row from both MAFs, and the ones that only keep a row out of the portal MAF
+REJECTION_RULES = ['mutation_status', 'filter', 'pindel_only', 'splice_non_coding', 'splice_distance', 'non_coding_consequence', 'cutoffs']
+PORTAL_EXCLUSION_RULES = ['portal_consequence', 'portal_splice_distance']
+
+class MafFilter(object):
+    """Filter rules from the rule file, compiled against the column layout of one MAF header"""
+
+    # Matches the portal columns at the start of a raw MAF line, so the portal line is a slice instead of a join
+    portal_columns_regex = re.compile(r'(?:[^\t]*\t){' + str(PORTAL_COLUMNS - 1) + r'}[^\t]*')
+
+    def __init__(self, header, rules, is_impact):
+        self.gene_col = header.index('Hugo_Symbol')
+        self.pos_col = header.index('Start_Position')
+        self.hgvsc_col = header.index('HGVSc')
+        self.mut_status_col = header.index('Mutation_Status')
+        self.csq_col = header.index('Consequence')
+        self.filter_col = header.index('FILTER')
+        self.hotspot_col = header.index('hotspot_whitelist')
+        self.tad_col = header.index('t_alt_count')
+        self.tdp_col = header.index('t_depth')
+        self.set_col = header.index('set')
+        # Only the columns up to the last one that a rule looks at need to be split out of each line
+        self.max_split = max(self.gene_col, self.pos_col, self.hgvsc_col, self.mut_status_col, self.csq_col, self.filter_col,
+            self.hotspot_col, self.tad_col, self.tdp_col, self.set_col) + 1
+        self.mutation_status_skip = frozenset(rules['mutation_status_skip'])
+        self.filter_keep = frozenset(rules['filter_keep'])
+        self.set_skip = frozenset(rules['set_skip'])
+        splice_region = rules['splice_region']
+        self.splice_csq_prefix = str(splice_region['consequence_prefix'])
+        self.non_coding_tag = str(splice_region['non_coding_tag'])
+        self.max_splice_dist = splice_region['max_distance']
+        self.max_portal_splice_dist = splice_region['max_portal_distance']
+        self.csq_keep_prefixes = tuple(str(prefix) for prefix in rules['consequence_keep_prefixes'])
+        self.promoter_keep = {}
+        for promoter in rules['promoter_keep']:
+            self.promoter_keep.setdefault(str(promoter['gene']), []).append((promoter['start'], promoter['end']))
+        self.portal_csq_skip_prefixes = tuple(str(prefix) for prefix in rules['portal_consequence_skip_prefixes'])
+        # An empty set of cutoffs means that no depth/allele-count/VAF filtering is applied
+        self.cutoffs = rules['cutoffs']['impact' if is_impact else 'non_impact'] or None
+        # Count how many rows each rule removed, so a small portal MAF can be traced back to the rule responsible
+        self.rejections = dict.fromkeys(REJECTION_RULES, 0)
+        self.portal_exclusions = dict.fromkeys(PORTAL_EXCLUSION_RULES, 0)
+        self.analyst_rows = 0
+        self.portal_rows = 0
+
+    def split_lines(self, maf_lines):
+        # Yield (line, body) for each raw MAF line, where line holds the columns the rules need and body is the raw
+        # line without its newline. Lines with quotes or carriage returns go through csv.reader as before, which may
+        # consume more lines for a quoted newline, and are yielded with a body of None so they are re-joined on output
+        max_split = self.max_split
+        maf_lines = iter(maf_lines)
+        for raw_line in maf_lines:
+            if '"' in raw_line or '\r' in raw_line:
+                yield next(csv.reader(itertools.chain([raw_line], maf_lines),delimiter='\t')), None
+                continue
+            body = raw_line[:-1] if raw_line.endswith('\n') else raw_line
+            yield body.split('\t', max_split), body
+
+    def in_kept_promoter(self, line):
+        regions = self.promoter_keep.get(line[self.gene_col])
+        if regions is None:
+            return False
+        position = int(line[self.pos_col])
+        return any(start <= position <= end for start, end in regions)
+
+    def fails_cutoffs(self, line):
+        cutoffs = self.cutoffs
+        tumor_vaf = float(line[self.tad_col]) / float(line[self.tdp_col]) if line[self.tdp_col] else 0
+        if int(line[self.tdp_col]) < cutoffs['min_t_depth'] or int(line[self.tad_col]) < cutoffs['min_t_alt_count'] or tumor_vaf < cutoffs['min_vaf']:
+            return True
+        return line[self.hotspot_col] == 'FALSE' and (int(line[self.tad_col]) < cutoffs['non_hotspot_min_t_alt_count'] or tumor_vaf < cutoffs['non_hotspot_min_vaf'])
+
+    def candidate_rows(self, maf_rows):
+        # Apply the string-based rules, and yield (line, csq, splice_dist, body) for rows that still need the cutoffs.
+        # Bind everything used per row to locals, since this loop runs over millions of rows
+        mut_status_col, filter_col, set_col, csq_col, hgvsc_col = self.mut_status_col, self.filter_col, self.set_col, self.csq_col, self.hgvsc_col
+        mutation_status_skip, filter_keep, set_skip = self.mutation_status_skip, self.filter_keep, self.set_skip
+        splice_csq_prefix, non_coding_tag, max_splice_dist = self.splice_csq_prefix, self.non_coding_tag, self.max_splice_dist
+        csq_keep_prefixes = self.csq_keep_prefixes
+        splice_distance = hgvsc.splice_distance
+        in_kept_promoter = self.in_kept_promoter
+        rejections = self.rejections
+        for line, body in maf_rows:
+            # Skip uncalled events and any that failed false-positive filters, except common_variant
+            if line[mut_status_col] in mutation_status_skip:
+                rejections['mutation_status'] += 1
+                continue
+            if line[filter_col] not in filter_keep:
+                rejections['filter'] += 1
+                continue
+            # Skip all events reported uniquely by Pindel
+            if line[set_col] in set_skip:
+                rejections['pindel_only'] += 1
+                continue
+            # Skip splice region variants in non-coding genes, or those that are >3bp into introns
+            csq = line[csq_col]
+            splice_dist = 0
+            if csq.startswith(splice_csq_prefix):
+                if non_coding_tag in csq:
+                    rejections['splice_non_coding'] += 1
                     continue
-        # Skip all non-coding events except interesting ones like TERT promoter mutations
-        csq_keep = ['missense_', 'stop_', 'frameshift_', 'splice_', 'inframe_', 'protein_altering_',
-            'start_', 'synonymous_', 'coding_sequence_', 'transcript_', 'exon_', 'initiator_codon_',
-            'disruptive_inframe_', 'conservative_missense_', 'rare_amino_acid_', 'mature_miRNA_', 'TFBS_']
-        if re.match(r'|'.join(csq_keep), line[csq_col]) is not None or (line[gene_col] == 'TERT' and int(line[pos_col]) >= 1295141 and int(line[pos_col]) <= 1295340):
-            # For IMPACT data, apply the MSK-IMPACT depth/allele-count/VAF/indel-length cutoffs
-            tumor_vaf = float(line[tad_col]) / float(line[tdp_col]) if line[tdp_col] else 0
-            if is_impact and (int(line[tdp_col]) < 20 or int(line[tad_col]) < 8 or tumor_vaf < 0.02 or (line[hotspot_col] == 'FALSE' and (int(line[tad_col]) < 10 or tumor_vaf < 0.05))):
+                # For indels, use the closest distance to the nearby splice junction
+                hgvsc_splice_dist = splice_distance(line[hgvsc_col])
+                if hgvsc_splice_dist is not None:
+                    splice_dist = hgvsc_splice_dist
+                    if splice_dist > max_splice_dist:
+                        rejections['splice_distance'] += 1
+                        continue
+            # Skip all non-coding events except interesting ones like TERT promoter mutations
+            if not csq.startswith(csq_keep_prefixes) and not in_kept_promoter(line):
+                rejections['non_coding_consequence'] += 1
+                continue
+            yield line, csq, splice_dist, body
+
+    def cutoff_rows(self, candidates):
+        fails_cutoffs = self.fails_cutoffs
+        rejections = self.rejections
+        for candidate in candidates:
+            if fails_cutoffs(candidate[0]):
+                rejections['cutoffs'] += 1
                 continue
-            analyst_maf.write('\t'.join(line) + '\n')
-            # The portal also skips silent muts, genes without Entrez IDs, and intronic events
-            if re.match(r'synonymous_|stop_retained_', line[csq_col]) is None and line[entrez_id_col] != 0 and splice_dist <= 2:
-                portal_maf.write('\t'.join(line[0:45]) + '\n')
+            yield candidate
+
+    def filter_rows(self, maf_lines, analyst_maf, portal_maf):
+        max_portal_splice_dist, portal_csq_skip_prefixes = self.max_portal_splice_dist, self.portal_csq_skip_prefixes
+        portal_exclusions = self.portal_exclusions
+        analyst_write, portal_write = analyst_maf.write, portal_maf.write
+        portal_columns_match = self.portal_columns_regex.match
+        kept_rows = self.candidate_rows(self.split_lines(maf_lines))
+        # For IMPACT data, apply the MSK-IMPACT depth/allele-count/VAF/indel-length cutoffs
+        if self.cutoffs is not None:
+            kept_rows = self.cutoff_rows(kept_rows)
+        analyst_rows = portal_rows = 0
+        for line, csq, splice_dist, body in kept_rows:
+            # Lines split on the fast path are written back as they were read
+            if body is None:
+                analyst_write('\t'.join(line) + '\n')
+            else:
+                analyst_write(body + '\n')
+            analyst_rows += 1
+            # The portal also skips silent muts and intronic events. Genes without Entrez IDs are left to the
+            # portal importer, since the old check here compared the Entrez column to int 0 and never matched
+            if csq.startswith(portal_csq_skip_prefixes):
+                portal_exclusions['portal_consequence'] += 1
+            elif splice_dist > max_portal_splice_dist:
+                portal_exclusions['portal_splice_distance'] += 1
+            elif body is None:
+                portal_write('\t'.join(line[0:PORTAL_COLUMNS]) + '\n')
+                portal_rows += 1
+            else:
+                # Lines with fewer than the portal columns are written whole, like the slice of a short list
+                m = portal_columns_match(body)
+                portal_write((body[:m.end()] if m is not None else body) + '\n')
+                portal_rows += 1
+        self.analyst_rows += analyst_rows
+        self.portal_rows += portal_rows
+
+    def counts(self):
+        return {
+            'rows_read': sum(self.rejections.values()) + self.analyst_rows,
+            'analyst_rows': self.analyst_rows,
+            'portal_rows': self.portal_rows,
+            'rejections': dict(self.rejections),
+            'portal_exclusions': dict(self.portal_exclusions)
+        }
+
+def add_counts(total_counts, counts):
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            add_counts(total_counts[key], value)
+        else:
+            total_counts[key] += value
+
+def filter_maf_shard(shard):
+    input_file, start, end, header, rules, is_impact, analyst_fragment, portal_fragment = shard
+    maf_filter = MafFilter(header, rules, is_impact)
+    with open(analyst_fragment,'wb') as analyst_maf, open(portal_fragment,'wb') as portal_maf:
+        if start is None:
+            maf_filter.filter_rows(read_maf_lines([input_file]), analyst_maf, portal_maf)
+        else:
+            with open(input_file,'rb') as input_maf:
+                input_maf.seek(start)
+                maf_filter.filter_rows(read_maf_shard_lines(input_maf, end), analyst_maf, portal_maf)
+    return input_file, analyst_fragment, portal_fragment, maf_filter.counts()
+
+def append_fragment(fragment_path, output_file):
+    with open(fragment_path,'rb') as fragment:
+        shutil.copyfileobj(fragment, output_file)
+
+def filter_maf_shards(input_files, header, rules, is_impact, workers, fragment_directory):
+    # Filter the MAFs shard by shard into fragment files, and yield (input_file, analyst_fragment, portal_fragment, counts)
+    # for every shard. imap returns the shards in input order, so the merged MAFs are identical to a single-process run
+    shards = []
+    for shard_index, (input_file, start, end) in enumerate(plan_maf_shards(input_files, workers * 4)):
+        fragment_prefix = os.path.join(fragment_directory, 'shard_' + str(shard_index))
+        shards.append((input_file, start, end, header, rules, is_impact, fragment_prefix + '.analyst.maf', fragment_prefix + '.portal.maf'))
+    if workers <= 1:
+        for shard in shards:
+            yield filter_maf_shard(shard)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for shard_result in pool.imap(filter_maf_shard, shards):
+            yield shard_result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+def maf_cache_key(input_file, rules, is_impact):
+    # Cached fragments are reused only for the same MAF content, filter code, rules and assay type
+    file_stat = os.stat(input_file)
+    content_hash = hashlib.sha1()
+    with open(input_file,'rb') as input_maf:
+        for chunk in iter(lambda: input_maf.read(1 << 20), ''):
+            content_hash.update(chunk)
+    key_fields = [MAF_FILTER_VERSION, json.dumps(rules, sort_keys=True), str(bool(is_impact)), str(file_stat.st_size),
+        repr(file_stat.st_mtime), content_hash.hexdigest()]
+    return hashlib.sha1('\0'.join(key_fields)).hexdigest()
+
+# The files of a cache entry, by suffix to its key. The counts are written last, so an entry is complete once they exist
+CACHE_ENTRY_SUFFIXES = ['.analyst.maf', '.portal.maf', '.counts.json']
+cache_key_pattern = re.compile(r'^[0-9a-f]{40}$')
+
+def store_cache_entry(cache_prefix, analyst_fragments, portal_fragments, counts):
+    for fragments, suffix in [(analyst_fragments, '.analyst.maf'), (portal_fragments, '.portal.maf')]:
+        with atomic_file.atomic_write(cache_prefix + suffix,'wb') as cache_file:
+            for fragment in fragments:
+                append_fragment(fragment, cache_file)
+    atomic_file.write_json(cache_prefix + '.counts.json', counts)
+
+def prune_cache_entries(cache_dir, current_keys):
+    # Remove the entries of MAFs that are no longer part of the run, like pairs that were dropped or re-called, so the
+    # cache never holds more than one run's worth of filtered rows. Returns the number of entries removed
+    removed_keys = set()
+    for file_name in os.listdir(cache_dir):
+        for suffix in CACHE_ENTRY_SUFFIXES:
+            key = file_name[:-len(suffix)]
+            if file_name.endswith(suffix) and cache_key_pattern.match(key) and key not in current_keys:
+                os.remove(os.path.join(cache_dir, file_name))
+                removed_keys.add(key)
+    return len(removed_keys)
+
+def filter_mafs_with_cache(input_files, header, rules, is_impact, workers, cache_dir, fragment_directory, analyst_maf, portal_maf, total_counts):
+    # Refilter only the per-pair MAFs that changed since the last run, then concatenate every pair's cached fragments
+    cache_prefixes = {}
+    for input_file in input_files:
+        cache_prefixes[input_file] = os.path.join(cache_dir, maf_cache_key(input_file, rules, is_impact))
+    missing_files = []
+    for input_file in input_files:
+        if not os.path.exists(cache_prefixes[input_file] + '.counts.json') and input_file not in missing_files:
+            missing_files.append(input_file)
+    # The shards of a file come back one after the other, so an entry is complete when the next file starts
+    shard_results = itertools.groupby(filter_maf_shards(missing_files, header, rules, is_impact, workers, fragment_directory), lambda shard_result: shard_result[0])
+    for input_file, file_shard_results in shard_results:
+        file_shard_results = list(file_shard_results)
+        file_counts = copy.deepcopy(file_shard_results[0][3])
+        for shard_result in file_shard_results[1:]:
+            add_counts(file_counts, shard_result[3])
+        store_cache_entry(cache_prefixes[input_file], [shard_result[1] for shard_result in file_shard_results], [shard_result[2] for shard_result in file_shard_results], file_counts)
+    for input_file in input_files:
+        cache_prefix = cache_prefixes[input_file]
+        # MAFs without a header line have no rows, and so no cache entry either
+        if not os.path.exists(cache_prefix + '.counts.json'):
+            continue
+        append_fragment(cache_prefix + '.analyst.maf', analyst_maf)
+        append_fragment(cache_prefix + '.portal.maf', portal_maf)
+        with open(cache_prefix + '.counts.json') as counts_file:
+            add_counts(total_counts, json.load(counts_file))
+    prune_cache_entries(cache_dir, set(os.path.basename(cache_prefix) for cache_prefix in cache_prefixes.values()))
+    return len(input_files) - len(missing_files), len(missing_files)
+
+def filter_mafs(input_files, roslin_version_string, is_impact, analyst_file, portal_file, rules, workers=1, compression_threads=1, cache_dir=None):
+    # Returns the per-rule counts and throughput of the run, for the stats sidecar
+    start_time = time.time()
+    header = check_maf_headers(input_files)
+    header_check_time = time.time()
+    maf_filter = MafFilter(header, rules, is_impact)
+    roslin_version_line = "# Versions: " + roslin_version_string.replace('_',' ') + "\n"
+    # The portal MAF stays plain text for the cBioPortal importer, but the analyst MAF can be compressed
+    with bgzf.open_output(analyst_file, compression_threads) as analyst_maf, open(portal_file,'wb') as portal_maf:
+        analyst_maf.write(roslin_version_line)
+        portal_maf.write(roslin_version_line)
+        # The analyst MAF needs all the same columns as the input MAF (from vcf2maf, ngs-filters, etc.)
+        analyst_maf.write('\t'.join(header) + '\n')
+        # The portal MAF can be minimized since Genome Nexus re-annotates it when HGVSp_Short column is missing
+        portal_header = list(header)
+        portal_header[portal_header.index('HGVSp_Short')] = 'Amino_Acid_Change'
+        portal_maf.write('\t'.join(portal_header[0:PORTAL_COLUMNS]) + '\n')
+        counts = maf_filter.counts()
+        cache_hits = cache_misses = None
+        if cache_dir:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            fragment_directory = mkdtemp(dir=cache_dir)
+            try:
+                cache_hits, cache_misses = filter_mafs_with_cache(input_files, header, rules, is_impact, workers, cache_dir, fragment_directory, analyst_maf, portal_maf, counts)
+            finally:
+                shutil.rmtree(fragment_directory)
+        elif workers > 1:
+            fragment_directory = mkdtemp(dir=os.path.dirname(os.path.abspath(analyst_file)))
+            try:
+                for _, analyst_fragment, portal_fragment, shard_counts in filter_maf_shards(input_files, header, rules, is_impact, workers, fragment_directory):
+                    append_fragment(analyst_fragment, analyst_maf)
+                    append_fragment(portal_fragment, portal_maf)
+                    os.remove(analyst_fragment)
+                    os.remove(portal_fragment)
+                    add_counts(counts, shard_counts)
+            finally:
+                shutil.rmtree(fragment_directory)
+        else:
+            maf_filter.filter_rows(read_maf_lines(input_files), analyst_maf, portal_maf)
+            counts = maf_filter.counts()
+    end_time = time.time()
+    filter_seconds = end_time - header_check_time
+    stats = {
+        'input_files': len(input_files),
+        'cache_hits': cache_hits,
+        'cache_misses': cache_misses,
+        'workers': workers,
+        'bytes_read': sum(os.path.getsize(input_file) for input_file in input_files),
+        'bytes_written': {'analyst': os.path.getsize(analyst_file), 'portal': os.path.getsize(portal_file)},
+        'phase_seconds': {'check_headers': header_check_time - start_time, 'filter': filter_seconds, 'total': end_time - start_time},
+        'rows_per_second': counts['rows_read'] / filter_seconds if filter_seconds > 0 else None
+    }
+    stats.update(counts)
+    return stats
 
-# The concatenated MAF can be enormous, so cleanup after
-os.remove(input_file)
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge per-pair MAFs and filter them into analyst and portal MAFs")
+    parser.add_argument('--input_mafs',required=True,nargs='+',help='The per-pair MAFs to merge, in order. These can be plain text or gzipped')
+    parser.add_argument('--version_string',required=True,help='The roslin version string, with spaces replaced by underscores')
+    parser.add_argument('--is_impact',default=False,action='store_true',help='Apply the MSK-IMPACT depth/allele-count/VAF cutoffs')
+    parser.add_argument('--analyst_file',required=True,help='The analyst MAF to write, with all input columns. BGZF compressed if it ends with .gz')
+    parser.add_argument('--portal_file',required=True,help='The portal MAF to write, with the first 45 columns')
+    parser.add_argument('--rules_file',default=os.path.join(os.path.dirname(os.path.abspath(__file__)),'maf_filter_rules.json'),help='The JSON file with the filter rules and cutoffs')
+    parser.add_argument('--workers',type=int,default=1,help='Number of processes to filter the MAFs with')
+    parser.add_argument('--compression_threads',type=int,default=1,help='Number of threads to compress a .gz analyst MAF with')
+    parser.add_argument('--cache_dir',required=False,help='Reuse the filtered rows of per-pair MAFs that are unchanged since the last run with this cache. Entries of MAFs that are not in this run are removed, so use one cache per project')
+    parser.add_argument('--stats_file',required=False,help='Write per-rule rejection counts and throughput to this JSON file')
+    args = parser.parse_args()
+    rules = load_filter_rules(args.rules_file)
+    stats = filter_mafs(args.input_mafs, args.version_string, args.is_impact, args.analyst_file, args.portal_file, rules, args.workers, args.compression_threads, args.cache_dir)
+    if args.stats_file:
+        with open(args.stats_file,'w') as stats_file:
+            json.dump(stats, stats_file, indent=4, sort_keys=True)
@@ -0,0 +1,58 @@
+import os, json, time, logging, requests
+import atomic_file
+
+# The flattened table of current OncoTree tumor types
+ONCOTREE_URL = 'http://oncotree.mskcc.org/oncotree/api/tumorTypes?flat=true&deprecated=false'
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.roslin', 'oncotree_tumor_types.json')
+# Tumor types change rarely, so a day old table is still current
+DEFAULT_TTL = 24 * 60 * 60
+
+logger = logging.getLogger("roslin_analysis_helper.oncotree")
+
+def fetch_tumor_types(url=ONCOTREE_URL, timeout=30):
+    # Return the tumor types from the OncoTree API, indexed by their code
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    tumor_types = {}
+    for single_onco_info in response.json()['data']:
+        tumor_types[single_onco_info['code']] = single_onco_info
+    return tumor_types
+
+def read_cache(cache_file):
+    # Return (fetched_at, tumor_types) from the cache file, or None if there is no usable cache
+    try:
+        with open(cache_file) as cache_json:
+            cache = json.load(cache_json)
+        return cache['fetched_at'], cache['tumor_types']
+    except (IOError, OSError, ValueError, KeyError):
+        return None
+
+def write_cache(cache_file, tumor_types, url):
+    atomic_file.write_json(cache_file, {'fetched_at': time.time(), 'url': url, 'tumor_types': tumor_types})
+
+def load_tumor_types(cache_file=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL, offline=False, url=ONCOTREE_URL, timeout=30):
+    """Return the OncoTree tumor types indexed by code, from the cache file while it is younger than ttl seconds
+
+    An expired or missing cache is refreshed from the API. If the API can't be reached, an expired cache is used
+    anyway. In offline mode the API is never queried, and the cache is used whatever its age
+    """
+    cache = read_cache(cache_file)
+    if cache is not None:
+        fetched_at, tumor_types = cache
+        if offline or time.time() - fetched_at < ttl:
+            return tumor_types
+    elif offline:
+        raise Exception("OncoTree is in offline mode, but there is no cache at " + cache_file)
+    try:
+        tumor_types = fetch_tumor_types(url, timeout)
+    except (requests.RequestException, ValueError, KeyError) as error:
+        if cache is None:
+            raise
+        logger.warning("Could not refresh the OncoTree cache at %s, so using the one from %s: %s"
+            % (cache_file, time.ctime(cache[0]), error))
+        return cache[1]
+    try:
+        write_cache(cache_file, tumor_types, url)
+    except (IOError, OSError) as error:
+        logger.warning("Could not write the OncoTree cache at %s: %s" % (cache_file, error))
+    return tumor_types
@@ -0,0 +1,85 @@
+import os, shutil, hashlib, logging, collections
+from concurrent.futures import ThreadPoolExecutor
+import atomic_file
+
+logger = logging.getLogger("roslin_analysis_helper.sync")
+
+# Paths relative to the synced directories, by what the sync did with them. Files in the destination that aren't in
+# the source are left alone, as copy_tree did, and listed as extra
+SyncReport = collections.namedtuple('SyncReport', ['added', 'updated', 'unchanged', 'extra'])
+
+def file_digest(path, block_size=1024 * 1024):
+    digest = hashlib.md5()
+    with open(path,'rb') as input_file:
+        for block in iter(lambda: input_file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def list_files(directory):
+    # Relative paths of every file under directory, or an empty set if it doesn't exist yet
+    relative_paths = set()
+    for root, dirs, files in os.walk(directory):
+        for file_name in files:
+            relative_paths.add(os.path.relpath(os.path.join(root, file_name), directory))
+    return relative_paths
+
+def files_match(source_file, destination_file):
+    # The content hash is only computed when the sizes match, which they rarely do for a changed data file
+    if os.path.getsize(source_file) != os.path.getsize(destination_file):
+        return False
+    return file_digest(source_file) == file_digest(destination_file)
+
+def copy_file_atomically(source_file, destination_file):
+    # Copy into a hidden temp file next to the destination and rename it into place, so readers of the repo never see
+    # a partly written file. The copy keeps the source's mode and times, like shutil.copy2
+    with open(source_file, 'rb') as source, atomic_file.atomic_write(destination_file, 'wb', hidden=True) as destination:
+        shutil.copyfileobj(source, destination)
+        destination.flush()
+        shutil.copystat(source_file, destination.name)
+
+def sync_file(source_directory, destination_directory, relative_path):
+    # Returns 'added', 'updated' or 'unchanged'
+    source_file = os.path.join(source_directory, relative_path)
+    destination_file = os.path.join(destination_directory, relative_path)
+    if not os.path.exists(destination_file):
+        change = 'added'
+    elif files_match(source_file, destination_file):
+        return 'unchanged'
+    else:
+        change = 'updated'
+    copy_file_atomically(source_file, destination_file)
+    return change
+
+def sync_tree(source_directory, destination_directory, workers=4):
+    """Copy the files of source_directory that are missing or different in destination_directory, in parallel
+
+    A file is unchanged if it has the same size and content hash in both, and is then not rewritten. Returns a
+    SyncReport of what changed
+    """
+    source_files = sorted(list_files(source_directory))
+    destination_files = list_files(destination_directory)
+    # Directories are created up front, so the workers only ever write files
+    for relative_directory in sorted(set(os.path.dirname(relative_path) for relative_path in source_files)):
+        directory = os.path.join(destination_directory, relative_directory)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    changes = {'added': [], 'updated': [], 'unchanged': []}
+    pool = ThreadPoolExecutor(workers)
+    try:
+        jobs = [pool.submit(sync_file, source_directory, destination_directory, relative_path) for relative_path in source_files]
+        for relative_path, job in zip(source_files, jobs):
+            changes[job.result()].append(relative_path)
+    finally:
+        pool.shutdown()
+    extra = sorted(destination_files - set(source_files))
+    return SyncReport(changes['added'], changes['updated'], changes['unchanged'], extra)
+
+def log_sync_report(report, destination_directory):
+    for relative_path in report.added:
+        logger.info("Added " + relative_path)
+    for relative_path in report.updated:
+        logger.info("Updated " + relative_path)
+    for relative_path in report.extra:
+        logger.warning("Left " + relative_path + ", which is no longer in the portal files")
+    logger.info("Synced portal files to %s: %i added, %i updated, %i unchanged" % (destination_directory,
+        len(report.added), len(report.updated), len(report.unchanged)))
@@ -0,0 +1,184 @@
+import os, re, json, time, shutil, hashlib, logging, argparse, tempfile, yaml
+import portal_sync, atomic_file
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.roslin', 'portal_validation_cache.json')
+CASE_LISTS_DIRECTORY = 'case_lists'
+# Meta files are meta_*.txt, or <stable_id>_meta_*.txt for the segmented data
+meta_file_name = re.compile(r'(^|_)meta_.*\.txt$')
+
+logger = logging.getLogger("roslin_analysis_helper.validation")
+
+def combine_exit_statuses(exit_statuses):
+    # The validator exits with 0 if the study is valid, 3 if it is valid with warnings, 1 if it is invalid and 2 if
+    # it could not be validated. The combined status is the worst of them
+    for exit_status in (1, 2, 3):
+        if exit_status in exit_statuses:
+            return exit_status
+    return 0
+
+def read_meta_files(study_directory):
+    # Return {meta file name: fields}, with None as the fields of a meta file that isn't valid YAML
+    meta_files = {}
+    for file_name in sorted(os.listdir(study_directory)):
+        if not meta_file_name.search(file_name):
+            continue
+        try:
+            with open(os.path.join(study_directory, file_name)) as meta_file:
+                meta_files[file_name] = yaml.safe_load(meta_file)
+        except yaml.YAMLError:
+            meta_files[file_name] = None
+    return meta_files
+
+def is_study_meta(fields):
+    return 'type_of_cancer' in fields
+
+def check_meta_files(meta_files):
+    # The checks that don't need any data file, so they can run while the data is still being generated. Returns a
+    # list of errors
+    errors = []
+    study_ids = set()
+    study_meta_files = []
+    for file_name, fields in sorted(meta_files.items()):
+        if not isinstance(fields, dict):
+            errors.append(file_name + " is not a YAML mapping")
+            continue
+        if 'cancer_study_identifier' not in fields:
+            errors.append(file_name + " has no cancer_study_identifier")
+        else:
+            study_ids.add(str(fields['cancer_study_identifier']))
+        if is_study_meta(fields):
+            study_meta_files.append(file_name)
+        elif 'data_filename' not in fields:
+            errors.append(file_name + " has no data_filename")
+    if len(study_meta_files) != 1:
+        errors.append("Expected one study meta file, but found %i" % len(study_meta_files))
+    if len(study_ids) > 1:
+        errors.append("Meta files have different cancer_study_identifier values: " + ', '.join(sorted(study_ids)))
+    return errors
+
+def split_study_files(meta_files):
+    # Split the study into the files every validation needs, which are the study meta, clinical files and case lists,
+    # and the {meta file name: data file name} of each genetic profile
+    core_files = []
+    profiles = {}
+    for file_name, fields in sorted(meta_files.items()):
+        if is_study_meta(fields):
+            core_files.append(file_name)
+        elif fields.get('genetic_alteration_type') == 'CLINICAL':
+            core_files.extend([file_name, fields['data_filename']])
+        else:
+            profiles[file_name] = fields['data_filename']
+    return core_files, profiles
+
+def digest_files(study_directory, file_names):
+    # A content hash over several files, including every case list when the case lists directory is one of them
+    digest = hashlib.md5()
+    for file_name in sorted(file_names):
+        path = os.path.join(study_directory, file_name)
+        paths = [os.path.join(path, case_list) for case_list in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        for path in paths:
+            digest.update(os.path.relpath(path, study_directory) + '\0' + portal_sync.file_digest(path) + '\0')
+    return digest.hexdigest()
+
+class PortalValidator(object):
+    """Run the cBioPortal validator on a study in parts, so that its metadata can be checked before its data exists
+
+    The result of each genetic profile is cached under a hash of its meta and data files, the study's clinical files
+    and case lists, and the validator itself, so a re-run only revalidates the profiles whose content changed
+    """
+
+    def __init__(self, validator, cache_file=DEFAULT_CACHE_FILE):
+        self.validator = validator
+        self.cache_file = cache_file
+        validator_file = os.path.abspath(validator.__file__)
+        self.validator_id = validator_file + ':' + str(os.path.getmtime(validator_file))
+
+    def run_validator(self, study_directory):
+        validator_args = argparse.Namespace(
+            study_directory=study_directory,
+            no_portal_checks=True,
+            url_server=None,
+            portal_info_dir=None,
+            html_table=None,
+            portal_properties=None,
+            error_file=None,
+            verbose=None,
+            relaxed_clinical_definitions=None
+        )
+        # ::TODO:: The stdout from the validator itself needs to be captured and saved somewhere
+        return self.validator.main_validate(validator_args)
+
+    def validate_files(self, study_directory, file_names):
+        # Validate a part of the study, by linking its files into a directory of their own
+        staging_directory = tempfile.mkdtemp(prefix='portal_validation.')
+        try:
+            for file_name in file_names:
+                os.symlink(os.path.abspath(os.path.join(study_directory, file_name)), os.path.join(staging_directory, file_name))
+            return self.run_validator(staging_directory)
+        finally:
+            shutil.rmtree(staging_directory)
+
+    def validate_metadata(self, study_directory):
+        """Check the meta files, and validate the study meta, clinical files and case lists
+
+        This is meant to run while the data files are still being generated, so it doesn't read any of them
+        """
+        logger.info('---------- Validating portal metadata ----------')
+        meta_files = read_meta_files(study_directory)
+        errors = check_meta_files(meta_files)
+        for error in errors:
+            logger.error(error)
+        if errors:
+            return 1
+        core_files = split_study_files(meta_files)[0]
+        if os.path.isdir(os.path.join(study_directory, CASE_LISTS_DIRECTORY)):
+            core_files.append(CASE_LISTS_DIRECTORY)
+        return self.validate_files(study_directory, core_files)
+
+    def validate_data(self, study_directory):
+        """Validate each genetic profile of the study whose result isn't cached, once its data files exist
+
+        The study meta, clinical files and case lists are validated along with the profiles, since the validator
+        needs them, but their own result is that of validate_metadata
+        """
+        logger.info('---------- Validating portal data ----------')
+        meta_files = read_meta_files(study_directory)
+        core_files, profiles = split_study_files(meta_files)
+        if os.path.isdir(os.path.join(study_directory, CASE_LISTS_DIRECTORY)):
+            core_files.append(CASE_LISTS_DIRECTORY)
+        core_digest = digest_files(study_directory, core_files)
+        cache = self.read_cache()
+        cached_statuses = []
+        profile_keys = {}
+        for meta_file, data_file in sorted(profiles.items()):
+            key = hashlib.md5('\0'.join([self.validator_id, core_digest, digest_files(study_directory, [meta_file, data_file])])).hexdigest()
+            if key in cache:
+                logger.info("Skipping validation of unchanged " + data_file)
+                cached_statuses.append(cache[key]['exit_status'])
+            else:
+                profile_keys[meta_file] = key
+        if not profile_keys:
+            return combine_exit_statuses(cached_statuses)
+        profile_files = []
+        for meta_file in sorted(profile_keys):
+            profile_files.extend([meta_file, profiles[meta_file]])
+        exit_status = self.validate_files(study_directory, core_files + profile_files)
+        # Only valid results are cached, so that an invalid profile is reported again on every run until it is fixed
+        if exit_status in (0, 3):
+            for meta_file, key in profile_keys.items():
+                cache[key] = {'exit_status': exit_status, 'data_filename': profiles[meta_file], 'validated_at': time.time()}
+            self.write_cache(cache)
+        return combine_exit_statuses(cached_statuses + [exit_status])
+
+    def read_cache(self):
+        try:
+            with open(self.cache_file) as cache_json:
+                return json.load(cache_json)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def write_cache(self, cache):
+        try:
+            atomic_file.write_json(self.cache_file, cache)
+        except (IOError, OSError) as error:
+            logger.warning("Could not write the portal validation cache at %s: %s" % (self.cache_file, error))
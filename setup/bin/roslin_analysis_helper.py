@@ -1,10 +1,9 @@
 #!/usr/bin/env python
 
-import argparse, os, sys, requests, yaml, json, subprocess, re, time, io, csv, shutil, logging
+import argparse, os, sys, yaml, json, re, io, csv, shutil, logging, itertools, time
 from tempfile import mkdtemp
 from datetime import date
-from distutils.dir_util import copy_tree
-import genPortalUUID
+import genPortalUUID, roslin_executor, oncotree_cache, portal_sync, portal_validation, run_profile, roslin_request
 
 logger = logging.getLogger("roslin_analysis_helper")
 logger.setLevel(logging.INFO)
@@ -15,27 +14,33 @@ log_file_handler.setFormatter(log_formatter)
 
 logger.addHandler(log_file_handler)
 
-def get_oncotree_info():
-    oncotree = requests.get('http://oncotree.mskcc.org/oncotree/api/tumorTypes?flat=true&deprecated=false').json()
-    oncotree_dict = {}
-    for single_onco_info in oncotree['data']:
-        oncotree_code = single_onco_info['code']
-        oncotree_dict[oncotree_code] = single_onco_info
-    return oncotree_dict
+# The timings of each stage of the run, written next to the log when it ends. Summarize them with run_profile.py
+profile = run_profile.RunProfile()
+profile_file = 'roslin_analysis_helper.profile.json'
+
+# Runs the cBioPortal validator imported from the importer path in roslin_resources.json, set by load_roslin_resources
+portal_validator = None
+
+# The JSON sidecar that maf_filter.py writes into the analysis log directory
+maf_filter_stats_file = 'maf_filter_stats.json'
+# Filtered rows of each project's per-pair MAFs, kept out of the delivered analysis directory
+maf_filter_cache_directory = os.path.join(os.path.expanduser('~'),'.roslin','maf_filter_cache')
+
+def get_oncotree_info(cache_file=oncotree_cache.DEFAULT_CACHE_FILE,offline=False):
+    # The tumor types are kept in an on-disk cache for a day, so repeated portal runs don't wait on the API
+    return oncotree_cache.load_tumor_types(cache_file,offline=offline)
 
 def generate_legacy_clinical_data(clinical_data_path,clinical_output_path,coverage_values):
     with open(clinical_data_path) as input_file, open(clinical_output_path,'w') as output_file:
         writer = csv.writer(output_file, lineterminator='\n',dialect='excel-tab')
         reader = csv.reader(input_file,dialect='excel-tab')
-        clinical_data = []
         row = reader.next()
         row.append('SAMPLE_COVERAGE')
-        clinical_data.append(row)
+        writer.writerow(row)
         for row in reader:
             coverage_value = coverage_values[row[0]]
             row.append(coverage_value)
-            clinical_data.append(row)
-        writer.writerows(clinical_data)
+            writer.writerow(row)
 
 def get_sample_list(clinical_data_path):
     sample_list = []
@@ -46,60 +51,70 @@ def get_sample_list(clinical_data_path):
     sample_list.pop(0)
     return sample_list
 
-def generate_maf_data(maf_directory,output_directory,maf_file_name,analysis_maf_file,log_directory,script_path,pipeline_version_str,is_impact):
+def generate_maf_data(maf_directory,output_directory,maf_file_name,analysis_maf_file,log_directory,script_path,pipeline_version_str,is_impact,project_id,executor):
     maf_files_query = os.path.join(maf_directory,'*.muts.maf')
-    combined_output = maf_file_name.replace('.txt','.combined.txt')
-    combined_output_file = os.path.join(output_directory,combined_output)
     pipeline_version_str_arg = pipeline_version_str.replace(' ','_')
     portal_file = os.path.join(output_directory,maf_file_name)
     maf_log = os.path.join(log_directory,'generate_maf.log')
-    regexp_string = "--regexp='^(Hugo|#)'"
+    maf_stats = os.path.join(log_directory,maf_filter_stats_file)
+    # Filtered rows of unchanged per-pair MAFs are reused when the project is rerun after some pairs are re-called
+    maf_cache = os.path.join(maf_filter_cache_directory,project_id)
     maf_filter_script = os.path.join(script_path,'maf_filter.py')
-
-    maf_command = ('bsub -We 0:59 -oo ' + maf_log + ' "grep -h --regexp=^Hugo ' + maf_files_query + ' | head -n1 > ' + combined_output_file
-        + '; grep -hEv ' + regexp_string + ' ' + maf_files_query + ' >> ' + combined_output_file
-        + '; python ' + ' '.join([maf_filter_script, combined_output_file, pipeline_version_str_arg, str(is_impact), analysis_maf_file, portal_file]) + '"')
-    bsub_stdout = subprocess.check_output(maf_command,shell=True)
-    return re.findall(r'Job <(\d+)>',bsub_stdout)[0]
-
-def generate_fusion_data(fusion_directory,output_directory,data_filename,log_directory,script_path):
+    impact_arg = ' --is_impact' if is_impact else ''
+    maf_filter_workers = 4
+
+    # The filter merges the per-pair MAFs itself, so no combined intermediate file is written
+    maf_command = ('python ' + maf_filter_script + ' --workers ' + str(maf_filter_workers) + ' --stats_file ' + maf_stats
+        + ' --cache_dir ' + maf_cache + ' --version_string ' + pipeline_version_str_arg + impact_arg + ' --analyst_file ' + analysis_maf_file
+        + ' --portal_file ' + portal_file + ' --input_mafs ' + maf_files_query)
+    return executor.submit('MAF data generation',maf_command,maf_log,cores=maf_filter_workers)
+
+def log_maf_filter_stats(log_directory):
+    maf_stats = os.path.join(log_directory,maf_filter_stats_file)
+    if not os.path.exists(maf_stats):
+        logger.warning("MAF filter stats not found at " + maf_stats)
+        return
+    with open(maf_stats) as maf_stats_file:
+        stats = json.load(maf_stats_file)
+    logger.info("MAF filter kept %i of %i rows in the analyst MAF and %i in the portal MAF, at %i rows/sec"
+        % (stats['analyst_rows'], stats['rows_read'], stats['portal_rows'], stats['rows_per_second'] or 0))
+    for rule, count in sorted(stats['rejections'].items()) + sorted(stats['portal_exclusions'].items()):
+        logger.info("MAF filter rule %s removed %i rows" % (rule, count))
+
+def generate_fusion_data(fusion_directory,output_directory,data_filename,log_directory,script_path,executor):
     fusion_files_query = os.path.join(fusion_directory,'*.svs.pass.vep.portal.txt')
-    combined_output = data_filename.replace('.txt','.combined.txt')
-    combined_output_path = os.path.join(output_directory,combined_output)
     output_path = os.path.join(output_directory,data_filename)
     fusion_log = os.path.join(log_directory,'generate_fusion.log')
     fusion_filter_script = os.path.join(script_path,'fusion_filter.py')
+    fusion_filter_workers = 4
 
+    # The filter merges the per-pair fusion files itself, so no combined intermediate file is written
+    fusion_command = ('python ' + fusion_filter_script + ' --workers ' + str(fusion_filter_workers) + ' --output_file ' + output_path
+        + ' --input_fusions ' + fusion_files_query)
     # This needs access to the internet because it queries the OncoKB API
-    fusion_command = ('bsub -R select[internet] -We 0:59 -oo ' + fusion_log + ' "grep -h --regexp=^Hugo ' + fusion_files_query + ' | head -n1 > ' + combined_output_path
-        + '; grep -hv --regexp=^Hugo ' + fusion_files_query + ' >> ' + combined_output_path
-        + '; python ' + fusion_filter_script + ' ' + combined_output_path + ' ' + output_path + '"')
-    bsub_stdout = subprocess.check_output(fusion_command,shell=True)
-    return re.findall(r'Job <(\d+)>',bsub_stdout)[0]
+    return executor.submit('fusion data generation',fusion_command,fusion_log,cores=fusion_filter_workers,resources='select[internet]')
 
-def generate_discrete_copy_number_data(data_directory,output_directory,data_filename,gene_cna_file,log_directory):
+def generate_discrete_copy_number_data(data_directory,output_directory,data_filename,gene_cna_file,log_directory,executor):
     discrete_copy_number_files_query = os.path.join(data_directory,'*_hisens.cncf.txt')
     output_path = os.path.join(output_directory,data_filename)
     discrete_copy_number_log = os.path.join(log_directory,'generate_discrete_copy_number.log')
     scna_output_path = output_path.replace('.txt','.scna.txt')
 
-    cna_command = ('bsub -We 0:59 -oo ' + discrete_copy_number_log + ' "cmo_facets --suite-version 1.5.6 geneLevel -f '
-        + discrete_copy_number_files_query + ' -m scna -o ' + output_path + '; mv ' + output_path + ' ' + gene_cna_file
-        + '; mv ' + scna_output_path + ' ' + output_path + '"')
-    bsub_stdout = subprocess.check_output(cna_command,shell=True)
-    return re.findall(r'Job <(\d+)>',bsub_stdout)[0]
+    cna_command = ('cmo_facets --suite-version 1.5.6 geneLevel -f ' + discrete_copy_number_files_query + ' -m scna -o ' + output_path
+        + '; mv ' + output_path + ' ' + gene_cna_file + '; mv ' + scna_output_path + ' ' + output_path)
+    return executor.submit('discrete copy number data generation',cna_command,discrete_copy_number_log)
 
-def generate_segmented_copy_number_data(data_directory,output_directory,data_filename,analysis_seg_file,log_directory):
+def generate_segmented_copy_number_data(data_directory,output_directory,data_filename,analysis_seg_file,log_directory,script_path,executor):
     segmented_files_query = os.path.join(data_directory,'*_hisens.seg')
     output_path = os.path.join(output_directory,data_filename)
     segmented_log = os.path.join(log_directory,'generate_segmented_copy_number.log')
+    seg_merge_script = os.path.join(script_path,'seg_merge.py')
+    seg_merge_workers = 4
 
-    # ::TODO:: Using a weird awk here to reduce log-ratio significant digits. Do it in facets.
-    seg_command = ('bsub -We 0:59 -oo ' + segmented_log + ' "grep -h --regexp=^ID ' + segmented_files_query + ' | head -n1 > ' + output_path
-        + '; grep -hv --regexp=^ID ' + segmented_files_query + ' | awk \'OFS=\\"\\t\\" {\$6=sprintf(\\"%.4f\\",\$6); print}\' >> ' + output_path
-        + '; cp ' + output_path + ' ' + analysis_seg_file + '"')
-    bsub_stdout = subprocess.check_output(seg_command,shell=True)
-    return re.findall(r'Job <(\d+)>',bsub_stdout)[0]
+    # ::TODO:: seg_merge.py rounds seg.mean to 4 decimals to reduce log-ratio significant digits. Do it in facets.
+    seg_command = ('python ' + seg_merge_script + ' --workers ' + str(seg_merge_workers) + ' --portal_file ' + output_path
+        + ' --analysis_file ' + analysis_seg_file + ' --input_segs ' + segmented_files_query)
+    return executor.submit('segmented copy number data generation',seg_command,segmented_log,cores=seg_merge_workers)
 
 def create_case_list_file(cases_path,cases_data):
     with open(cases_path,'w') as cases_file:
@@ -210,39 +225,6 @@ def generate_fusion_meta(portal_config_data,data_filename):
     fusion_meta_data['data_filename'] = data_filename
     return fusion_meta_data
 
-# ::TODO:: Remove dependency on LSF somehow, possibly by just running everything baremetal
-def wait_for_jobs_to_finish(bjob_ids,name):
-    job_string = name + ' [' + ','.join(bjob_ids) + ']'
-    logger.info("Monitoring " + job_string)
-    bjob_command = "bjobs " + ' '.join(bjob_ids) + " | awk '{printf $3}'"
-    prev_job_status = ''
-    while True:
-        job_status = subprocess.check_output(bjob_command,shell=True).strip()
-        if 'PEND' in job_status:
-            logger.info(name + " pending") if prev_job_status != job_status else None
-            time.sleep(8)
-        elif 'RUN' in job_status:
-            logger.info(name + " running") if prev_job_status != job_status else None
-            time.sleep(6)
-        elif 'EXIT' in job_status:
-            logger.warning(name + " exit with error")
-            return 1
-        elif 'DONE' in job_status:
-            logger.info(name + " done")
-            return 0
-        else:
-            logger.warning(name + " status unknown")
-            return 2
-        prev_job_status = job_status
-
-def check_if_impact(request_file_path):
-    is_impact = False
-    with open(request_file_path) as request_file:
-        for single_line in request_file:
-            if "Assay:" in single_line and ("IMPACT" in single_line or "HemePACT" in single_line):
-                is_impact = True
-    return is_impact
-
 def create_meta_clinical_files_new_format(datatype, filepath, filename, study_id):
     with open(filepath, 'wb') as output_file:
         output_file.write('cancer_study_identifier: %s\n' % study_id)
@@ -250,20 +232,19 @@ def create_meta_clinical_files_new_format(datatype, filepath, filename, study_id
         output_file.write('datatype: %s\n' % datatype)
         output_file.write('data_filename: %s\n' % filename)
 
-def create_data_clinical_files_new_format(data_clinical_file):
-    samples_file_txt = ""
-    patients_file_txt = ""
-    with open(data_clinical_file, 'rb') as f:
+def create_data_clinical_files_new_format(data_clinical_file, samples_output_path, patients_output_path):
+    # Fill the sample and patient files in a single read of the legacy file, writing each row as it is read
+    with open(data_clinical_file, 'rb') as f, open(samples_output_path, 'wb') as samples_file, open(patients_output_path, 'wb') as patients_file:
         reader = csv.DictReader(f, delimiter='\t')
-        data = list(reader)
-        header = data[0].keys()
-        samples_header = get_samples_header(header)
-        patients_header = get_patients_header(header)
+        # The column order comes from the keys of the first row, as it always has
+        first_row = reader.next()
+        header = first_row.keys()
         data_attr = set_attributes(header)
-        samples_file_txt = generate_file_txt(data, data_attr, samples_header)
-        patients_file_txt = generate_file_txt(data, data_attr, patients_header)
-
-    return samples_file_txt, patients_file_txt
+        samples_writer = ClinicalFileWriter(samples_file, data_attr, get_samples_header(header))
+        patients_writer = ClinicalFileWriter(patients_file, data_attr, get_patients_header(header))
+        for row in itertools.chain([first_row], reader):
+            samples_writer.write_row(row)
+            patients_writer.write_row(row)
 
 def get_samples_header(header):
     temp_header = set(header)
@@ -292,59 +273,26 @@ def set_attributes(data):
         d[key]["priority"] = "0" if key in ZERO_PRIORITY else "1"
     return d
 
-# Convert this stuff into an object later, because this is MESSY AS HELL
-def generate_file_txt(data, attr, header):
-    order = list()
-    row1 = "#"
-    row2 = "#"
-    row3 = "#"
-    row4 = "#"
-
-    row2_values = list()
-    row3_values = list()
-    row4_values = list()
-
-    for heading in header:
-        order.append(heading)
-        row2_values.append(attr[heading]['desc'])
-        row3_values.append(attr[heading]['datatype'])
-        row4_values.append(attr[heading]['priority'])
-
-    row1 = "#" + "\t".join(order) + "\n"
-    row2 = "#" + "\t".join(row2_values) + "\n"
-    row3 = "#" + "\t".join(row3_values) + "\n"
-    row4 = "#" + "\t".join(row4_values) + "\n"
-
-    metadata = row1 + row2 + row3 + row4
-
-    data_str = "\t".join(order) + "\n"
-    for row in data:
-        temp_list = list()
-        for heading in order:
-            row_value = row[heading].strip()
-            temp_list.append(row_value)
-        data_str += "\t".join(temp_list) + "\n"
-
-    file_txt = metadata + data_str
-    return file_txt
+class ClinicalFileWriter(object):
+    """Write a clinical file in the new format: four metadata rows and the column header, then one row at a time"""
+
+    def __init__(self, output_file, attr, header):
+        self.output_file = output_file
+        self.order = list(header)
+        output_file.write("#" + "\t".join(self.order) + "\n")
+        output_file.write("#" + "\t".join(attr[heading]['desc'] for heading in self.order) + "\n")
+        output_file.write("#" + "\t".join(attr[heading]['datatype'] for heading in self.order) + "\n")
+        output_file.write("#" + "\t".join(attr[heading]['priority'] for heading in self.order) + "\n")
+        output_file.write("\t".join(self.order) + "\n")
+
+    def write_row(self, row):
+        self.output_file.write("\t".join(row[heading].strip() for heading in self.order) + "\n")
 
 # Replicate parameters expected by cBioPortal validator subroutine, and call it
-def validate_portal_data(portal_output_directory):
-    logger.info('---------- Running portal validator ----------')
-    validator_args = argparse.Namespace(
-        study_directory=portal_output_directory,
-        no_portal_checks=True,
-        url_server=None,
-        portal_info_dir=None,
-        html_table=None,
-        portal_properties=None,
-        error_file=None,
-        verbose=None,
-        relaxed_clinical_definitions=None
-    )
-    # ::TODO:: The stdout from the validator itself needs to be captured and saved somewhere
-    exit_status = validateData.main_validate(validator_args)
-    return exit_status
+def get_portal_validator():
+    if portal_validator is None:
+        raise Exception("Portal validator is not configured in roslin_resources.json")
+    return portal_validator
 
 def make_dirs_from_stable_id(mercurial_path, stable_id, project_name):
     subdirs = stable_id.split("_")
@@ -357,64 +305,26 @@ def make_dirs_from_stable_id(mercurial_path, stable_id, project_name):
     logger.info("Creating directories in mercurial repo: %s" % full_path)
     return full_path
 
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(add_help= True, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument('--clinical_data',required=True,help='The clinical file located with Roslin manifests')
-    parser.add_argument('--sample_summary',required=True,help='The sample summary file generated from Roslin QC')
-    parser.add_argument('--request_file',required=True, help='The request file for the roslin run')
-    parser.add_argument('--roslin_output',required=True, help='The stdout of the roslin run')
-    parser.add_argument('--maf_directory',required=True,help='The directory containing the maf files')
-    parser.add_argument('--facets_directory',required=True,help='The directory containing the facets files')
-    parser.add_argument('--output_directory',required=False,help='Set the output directory for portal files')
-    parser.add_argument('--script_path',required=True,help='Path for the portal helper scripts')
-    parser.add_argument('--disable_portal_repo_update', default=False, action='store_true', help='If not updating cbioportal, skips submitting request to update the Mercurial repo.')
-    args = parser.parse_args()
-    current_working_directory = os.getcwd()
-    roslin_resources_path = os.path.join(args.script_path,'roslin_resources.json')
+def load_roslin_resources(script_path):
+    # Read roslin_resources.json and import the cBioPortal validator once, so that a batch of projects shares them.
+    # Returns the path of the mercurial repo. Every project is validated, so a run without a portal configuration fails
+    # here, before any of its jobs are submitted
+    global portal_validator
+    roslin_resources_path = os.path.join(script_path,'roslin_resources.json')
     with open(roslin_resources_path) as roslin_resources_json:
         roslin_resources_data = json.load(roslin_resources_json)
-    mercurial_path = None
-    if "portal" in roslin_resources_data["config"]:
-        importer_path = roslin_resources_data["config"]["portal"]["importer"]
-        mercurial_path = roslin_resources_data["config"]["portal"]["path"]
-        sys.path.append(importer_path)
-        import validateData
-    else:
-        logger.warning("Portal validator/repo configuration not set in roslin_resources.json")
-    project_is_impact = check_if_impact(args.request_file)
-    # Get roslin config
-    with open(args.request_file,'r') as portal_config_file:
-        portal_config_data = {}
-        single_value = ''
-        single_key = ''
-        for single_line in portal_config_file:
-            stripped_single_line = single_line.strip("\n\r")
-            split_stripped_single_line = stripped_single_line.split(':')
-            if ':' in single_line:
-                if single_key:
-                    portal_config_data[single_key] = single_value
-                    single_key = None
-                single_key = split_stripped_single_line[0]
-                single_value = split_stripped_single_line[1].strip()
-            else:
-                single_value = single_value + stripped_single_line
-            #if stripped_single_line.contains(':'):
-                #new_value = single_value.replace('"','')
-                #portal_config_data[single_key] = new_value
-                #single_value = ''
-                #single_key = ''
-        portal_config_data[single_key] = single_value
-    log_directory = os.path.join(os.getcwd(),'analysis-log',portal_config_data['ProjectID'])
-    if os.path.exists(log_directory):
-        shutil.rmtree(log_directory)
-    os.makedirs(log_directory)
-    #os.chdir(log_directory)
-
-    logger.info('---------- Creating Portal files for project: '+portal_config_data['ProjectID'] + ' ----------')
-
-    # Read the Sample Summary
+    if "portal" not in roslin_resources_data["config"]:
+        raise Exception("Portal validator/repo configuration not set in " + roslin_resources_path)
+    importer_path = roslin_resources_data["config"]["portal"]["importer"]
+    mercurial_path = roslin_resources_data["config"]["portal"]["path"]
+    sys.path.append(importer_path)
+    import validateData
+    portal_validator = portal_validation.PortalValidator(validateData)
+    return mercurial_path
+
+def read_coverage_values(sample_summary):
     coverage_values = {}
-    with open(args.sample_summary,'r') as input_file:
+    with open(sample_summary,'r') as input_file:
         header = input_file.readline().strip('\r\n').split('\t')
         coverage_position = header.index('Coverage')
         sample_position = header.index('Sample')
@@ -426,6 +336,37 @@ if __name__ == '__main__':
                 if sample_value in coverage_values:
                     raise Exception("Duplicate coverages on sample " + sample_value + " of " + coverage_values[sample_value] + " and " + coverage_value)
                 coverage_values[sample_value] = coverage_value
+    return coverage_values
+
+def prepare_project(project,script_path,executor):
+    # Write the clinical data, case lists and meta files of a project, and submit its data generation jobs. The
+    # project has the same fields as the command line arguments of a single run. If anything fails once jobs are out,
+    # they are cancelled, so that they don't run on for nothing and hold the slots of a batch's job group
+    job_ids = []
+    try:
+        return submit_project(project,script_path,executor,job_ids)
+    except:
+        if job_ids:
+            logger.error('Could not prepare the project of ' + project.request_file + '; cancelling its data generation jobs.')
+            executor.cancel(job_ids)
+        raise
+
+def submit_project(project,script_path,executor,job_ids):
+    # The body of prepare_project, which adds each job to job_ids as soon as it is submitted
+    request = roslin_request.load_request_file(project.request_file)
+    project_is_impact = request.is_impact
+    # Get roslin config
+    portal_config_data = dict(request.fields)
+    log_directory = os.path.join(os.getcwd(),'analysis-log',portal_config_data['ProjectID'])
+    if os.path.exists(log_directory):
+        shutil.rmtree(log_directory)
+    os.makedirs(log_directory)
+    #os.chdir(log_directory)
+
+    logger.info('---------- Creating Portal files for project: '+portal_config_data['ProjectID'] + ' ----------')
+
+    # Read the Sample Summary
+    coverage_values = read_coverage_values(project.sample_summary)
 
     stable_id = genPortalUUID.generateIGOBasedPortalUUID(portal_config_data['ProjectID'])[1]
     maf_file_name =  'data_mutations_extended.txt'
@@ -449,10 +390,10 @@ if __name__ == '__main__':
 
     # Set work directory space to tmp or a specified ouput path
     output_directory = None
-    if not args.output_directory:
+    if not project.output_directory:
         output_directory = mkdtemp()
     else:
-        output_directory = args.output_directory
+        output_directory = project.output_directory
 
     analysis_dir = os.path.abspath(os.path.join(output_directory,os.pardir,'analysis'))
     if not os.path.exists(analysis_dir):
@@ -462,26 +403,27 @@ if __name__ == '__main__':
     analysis_arm_cna_file = os.path.join(analysis_dir, portal_config_data['ProjectID'] + '.arm.cna.txt')
     analysis_seg_file = os.path.join(analysis_dir, portal_config_data['ProjectID'] + '.seg.cna.txt')
 
-    clinical_data_path = os.path.join(output_directory,clinical_data_file)
-    generate_legacy_clinical_data(args.clinical_data,clinical_data_path,coverage_values)
-    # writing new format of data clinical files using legacy data in 'clinical_data_path'
-    data_clinical_sample_txt, data_clinical_patient_txt = create_data_clinical_files_new_format(clinical_data_path)
-    clinical_data_samples_output_path = os.path.join(output_directory, clinical_data_samples_file)
-    clinical_data_patients_output_path = os.path.join(output_directory, clinical_data_patients_file)
-    with open(clinical_data_samples_output_path, 'wb') as out:
-        out.write(data_clinical_sample_txt)
-    with open(clinical_data_patients_output_path, 'wb') as out:
-        out.write(data_clinical_patient_txt)
-    logger.info('Finished generating clinical data, including in the new format')
-    logger.info('Removing legacy data_clinical.txt file.')
-    os.remove(clinical_data_path)
-
-    sample_list = get_sample_list(args.clinical_data)
-    generate_case_lists(portal_config_data,sample_list,output_directory)
-    logger.info('Finished generating case lists')
+    project_id = portal_config_data['ProjectID']
+    with profile.span('clinical data', project_id) as span:
+        clinical_data_path = os.path.join(output_directory,clinical_data_file)
+        generate_legacy_clinical_data(project.clinical_data,clinical_data_path,coverage_values)
+        # writing new format of data clinical files using legacy data in 'clinical_data_path'
+        clinical_data_samples_output_path = os.path.join(output_directory, clinical_data_samples_file)
+        clinical_data_patients_output_path = os.path.join(output_directory, clinical_data_patients_file)
+        create_data_clinical_files_new_format(clinical_data_path, clinical_data_samples_output_path, clinical_data_patients_output_path)
+        logger.info('Finished generating clinical data, including in the new format')
+        logger.info('Removing legacy data_clinical.txt file.')
+        os.remove(clinical_data_path)
+        span['bytes'] = os.path.getsize(clinical_data_samples_output_path) + os.path.getsize(clinical_data_patients_output_path)
+
+    with profile.span('case lists', project_id) as span:
+        sample_list = get_sample_list(project.clinical_data)
+        generate_case_lists(portal_config_data,sample_list,output_directory)
+        logger.info('Finished generating case lists')
+        span['samples'] = len(sample_list)
 
     # Extract the roslin version from the stdout log file
-    with open(args.roslin_output) as roslin_output_file:
+    with open(project.roslin_output) as roslin_output_file:
         roslin_output_file.readline()
         roslin_output_file.readline()
         version_str = re.findall(r'^VERSIONS: (.*)$',roslin_output_file.readline())[0].rstrip('\r\n')
@@ -495,13 +437,22 @@ if __name__ == '__main__':
     segmented_data_meta = generate_segmented_meta(portal_config_data,segmented_data_file)
     logger.info('Finished generating segmented meta')
 
-    job_ids = []
-    job_ids.append(generate_maf_data(args.maf_directory,output_directory,maf_file_name,analysis_maf_file,log_directory,args.script_path,version_str,project_is_impact))
-    logger.info('Submitted job to generate maf data')
-    job_ids.append(generate_discrete_copy_number_data(args.facets_directory,output_directory,discrete_copy_number_file,analysis_gene_cna_file,log_directory))
-    logger.info('Submitted job to generate discrete copy number data')
-    job_ids.append(generate_segmented_copy_number_data(args.facets_directory,output_directory,segmented_data_file,analysis_seg_file,log_directory))
-    logger.info('Submitted job to generate segmented copy number data')
+    # The portal file that each job writes, so that the profile has its size
+    job_outputs = {}
+    with profile.span('job submission', project_id) as span:
+        maf_job_id = generate_maf_data(project.maf_directory,output_directory,maf_file_name,analysis_maf_file,log_directory,script_path,version_str,project_is_impact,project_id,executor)
+        job_ids.append(maf_job_id)
+        job_outputs[maf_job_id] = os.path.join(output_directory,maf_file_name)
+        logger.info('Submitted job to generate maf data')
+        discrete_copy_number_job_id = generate_discrete_copy_number_data(project.facets_directory,output_directory,discrete_copy_number_file,analysis_gene_cna_file,log_directory,executor)
+        job_ids.append(discrete_copy_number_job_id)
+        job_outputs[discrete_copy_number_job_id] = os.path.join(output_directory,discrete_copy_number_file)
+        logger.info('Submitted job to generate discrete copy number data')
+        segmented_job_id = generate_segmented_copy_number_data(project.facets_directory,output_directory,segmented_data_file,analysis_seg_file,log_directory,script_path,executor)
+        job_ids.append(segmented_job_id)
+        job_outputs[segmented_job_id] = os.path.join(output_directory,segmented_data_file)
+        logger.info('Submitted job to generate segmented copy number data')
+        span['job_ids'] = list(job_ids)
 
     study_meta_path = os.path.join(output_directory,study_meta_file)
     clinical_meta_samples_path = os.path.join(output_directory, clinical_meta_samples_file)
@@ -512,6 +463,7 @@ if __name__ == '__main__':
     segmented_data_meta_path = os.path.join(output_directory,segmented_data_meta_file)
 
     logger.info('Writing meta files')
+    meta_start_time = time.time()
 
     with open(study_meta_path,'w') as study_meta_path_file:
         yaml.dump(study_meta,study_meta_path_file,default_flow_style=False,width=float("inf"))
@@ -531,33 +483,156 @@ if __name__ == '__main__':
     if project_is_impact:
         fusion_meta = generate_fusion_meta(portal_config_data,fusion_file_name)
         logger.info('Finished generating fusion meta')
-        job_ids.append(generate_fusion_data(args.maf_directory,output_directory,fusion_file_name,log_directory,args.script_path))
+        fusion_job_start_time = time.time()
+        fusion_job_id = generate_fusion_data(project.maf_directory,output_directory,fusion_file_name,log_directory,script_path,executor)
+        profile.add_span('job submission', fusion_job_start_time, time.time(), project_id, job_ids=[fusion_job_id])
+        job_ids.append(fusion_job_id)
+        job_outputs[fusion_job_id] = os.path.join(output_directory,fusion_file_name)
         logger.info('Submitted job to generate fusion data')
         fusion_meta_path = os.path.join(output_directory,fusion_meta_file)
         logger.info('Writing fusion meta file')
         with open(fusion_meta_path,'w') as fusion_meta_path_file:
             yaml.dump(fusion_meta,fusion_meta_path_file,default_flow_style=False,width=float("inf"))
-
-    # Now wait for any of the jobs submitted earlier to complete
-    if wait_for_jobs_to_finish(job_ids, 'Data generation jobs') != 0:
+    profile.add_span('meta files', meta_start_time, time.time(), project_id)
+
+    # The metadata is validated while the data generation jobs run, so a bad meta file or case list fails the project
+    # without waiting on them
+    with profile.span('metadata validation', project_id) as span:
+        metadata_exit_status = get_portal_validator().validate_metadata(output_directory)
+        span['exit_status'] = metadata_exit_status
+    logger.info("Portal metadata validator exit status: %i" % metadata_exit_status)
+
+    return {'project_id': project_id, 'stable_id': stable_id, 'output_directory': output_directory,
+        'log_directory': log_directory, 'job_ids': job_ids, 'job_outputs': job_outputs, 'metadata_exit_status': metadata_exit_status}
+
+def finish_project(prepared_project,executor,mercurial_path,disable_portal_repo_update):
+    # Wait for the data generation jobs of a project, then validate its portal files and copy them to the mercurial
+    # repo. Returns 0 on success, 1 if any of its jobs failed, and 2 if its portal files are invalid
+    project_id = prepared_project['project_id']
+    output_directory = prepared_project['output_directory']
+    if prepared_project['metadata_exit_status'] not in (0, 3):
+        logger.error('Portal metadata is invalid; cancelling the data generation jobs.')
+        executor.cancel(prepared_project['job_ids'])
+        return 2
+    # Now wait for all of the jobs submitted earlier to complete
+    with profile.span('data generation wait', project_id) as span:
+        jobs_exit_status = executor.wait(prepared_project['job_ids'], project_id + ' data generation jobs')
+        span['exit_status'] = jobs_exit_status
+    profile.add_job_spans([executor.results[job_id] for job_id in prepared_project['job_ids']], project_id, prepared_project['job_outputs'])
+    if jobs_exit_status != 0:
         logger.error('One or more of the analysis/portal jobs failed.')
-        sys.exit(1)
+        return 1
+    log_maf_filter_stats(prepared_project['log_directory'])
+
+    with profile.span('data validation', project_id) as span:
+        data_exit_status = get_portal_validator().validate_data(output_directory)
+        span['exit_status'] = data_exit_status
+    validation_exit_status = portal_validation.combine_exit_statuses([prepared_project['metadata_exit_status'], data_exit_status])
+    logger.info("Portal validator exit status: %i" % validation_exit_status)
+    if validation_exit_status == 0 or validation_exit_status == 3:
+        logger.info('Portal files are valid for upload.')
+        if disable_portal_repo_update:
+            logger.info("Skipping update of portal files in mercurial repo")
+        else:
+            copy_to_location = make_dirs_from_stable_id(mercurial_path, prepared_project['stable_id'], project_id)
+            # Only the files that changed since the last upload are rewritten, so the repo isn't churned by re-runs
+            with profile.span('repo sync', project_id) as span:
+                sync_report = portal_sync.sync_tree(output_directory, copy_to_location)
+                portal_sync.log_sync_report(sync_report, copy_to_location)
+                span['files_copied'] = len(sync_report.added) + len(sync_report.updated)
+                span['bytes'] = sum(os.path.getsize(os.path.join(copy_to_location, relative_path)) for relative_path in sync_report.added + sync_report.updated)
+        return 0
+    logger.error('Portal files are invalid; they will not be uploaded.')
+    return 2
+
+# The per-project arguments of a single run, which are the fields of each project in a batch manifest
+project_arguments = ['clinical_data', 'sample_summary', 'request_file', 'roslin_output', 'maf_directory', 'facets_directory']
+project_exit_messages = {0: 'success', 1: 'data generation jobs failed', 2: 'portal files are invalid'}
+
+def read_batch_manifest(manifest_file):
+    # The manifest is a JSON list of projects, or an object with the list under "projects". Each project has the
+    # per-project arguments of a single run as its fields, and optionally an output_directory
+    with open(manifest_file) as manifest_json:
+        manifest = json.load(manifest_json)
+    if isinstance(manifest, dict):
+        manifest = manifest['projects']
+    projects = []
+    for project_index, project_fields in enumerate(manifest):
+        missing_fields = [field for field in project_arguments if field not in project_fields]
+        if missing_fields:
+            raise Exception("Project %i of %s is missing %s" % (project_index + 1, manifest_file, ', '.join(missing_fields)))
+        project = argparse.Namespace(output_directory=None)
+        for field, value in project_fields.items():
+            setattr(project, str(field), value)
+        projects.append(project)
+    return projects
+
+def run_batch(manifest_file,script_path,executor,mercurial_path,disable_portal_repo_update,report_file=None):
+    # Submit the data generation jobs of every project before waiting on any of them, so that they all run side by side
+    # within the executor's concurrency cap. A failure in one project is reported without stopping the others
+    projects = read_batch_manifest(manifest_file)
+    results = []
+    prepared_projects = []
+    for project in projects:
+        try:
+            prepared_projects.append((project, prepare_project(project,script_path,executor)))
+        except Exception as error:
+            logger.exception('Could not prepare the project of ' + project.request_file)
+            results.append({'request_file': project.request_file, 'project_id': None, 'exit_status': 1, 'result': 'preparation failed: ' + str(error)})
+    for project, prepared_project in prepared_projects:
+        try:
+            exit_status = finish_project(prepared_project,executor,mercurial_path,disable_portal_repo_update)
+            result = project_exit_messages[exit_status]
+        except Exception as error:
+            logger.exception('Could not finish project ' + prepared_project['project_id'])
+            exit_status, result = 1, 'failed: ' + str(error)
+        results.append({'request_file': project.request_file, 'project_id': prepared_project['project_id'],
+            'output_directory': prepared_project['output_directory'], 'exit_status': exit_status, 'result': result})
+    failed_projects = [project_result for project_result in results if project_result['exit_status'] != 0]
+    for result in results:
+        message = "%s (%s): %s" % (result['project_id'] or 'unknown project', result['request_file'], result['result'])
+        logger.info(message) if result['exit_status'] == 0 else logger.error(message)
+    logger.info("%i of %i projects succeeded" % (len(results) - len(failed_projects), len(results)))
+    if report_file:
+        with open(report_file,'w') as report_json:
+            json.dump(results, report_json, indent=4)
+    return 1 if failed_projects else 0
 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(add_help= True, formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--clinical_data',required=False,help='The clinical file located with Roslin manifests')
+    parser.add_argument('--sample_summary',required=False,help='The sample summary file generated from Roslin QC')
+    parser.add_argument('--request_file',required=False, help='The request file for the roslin run')
+    parser.add_argument('--roslin_output',required=False, help='The stdout of the roslin run')
+    parser.add_argument('--maf_directory',required=False,help='The directory containing the maf files')
+    parser.add_argument('--facets_directory',required=False,help='The directory containing the facets files')
+    parser.add_argument('--output_directory',required=False,help='Set the output directory for portal files')
+    parser.add_argument('--script_path',required=True,help='Path for the portal helper scripts')
+    parser.add_argument('--executor',default='lsf',choices=sorted(roslin_executor.EXECUTORS),help='Submit the data generation jobs to LSF, or run them locally on this node')
+    parser.add_argument('--max_concurrent_jobs',type=int,required=False,help='Number of data generation jobs to run at a time, across all projects. Defaults to the number of CPUs with the local executor, and no limit with LSF')
+    parser.add_argument('--batch_manifest',required=False,help='A JSON manifest of projects to create portal files for in one run, instead of the per-project arguments')
+    parser.add_argument('--batch_report',required=False,help='Write the success or failure of each project in the batch to this JSON file')
+    parser.add_argument('--disable_portal_repo_update', default=False, action='store_true', help='If not updating cbioportal, skips submitting request to update the Mercurial repo.')
+    args = parser.parse_args()
+    if args.batch_manifest is None:
+        missing_arguments = [argument for argument in project_arguments if getattr(args, argument) is None]
+        if missing_arguments:
+            parser.error("the following arguments are required without --batch_manifest: --" + ", --".join(missing_arguments))
     try:
-        validation_exit_status = validate_portal_data(output_directory)
-        logger.info("Portal validator exit status: %i" % validation_exit_status)
-        if validation_exit_status == 0 or validation_exit_status == 3:
-            logger.info('Portal files are valid for upload.')
-            if args.disable_portal_repo_update:
-                logger.info("Skipping update of portal files in mercurial repo")
+        with profile.span('load resources'):
+            mercurial_path = load_roslin_resources(args.script_path)
+        executor = roslin_executor.get_executor(args.executor,args.max_concurrent_jobs)
+        try:
+            if args.batch_manifest is not None:
+                exit_status = run_batch(args.batch_manifest,args.script_path,executor,mercurial_path,args.disable_portal_repo_update,args.batch_report)
             else:
-                project_id = portal_config_data['ProjectID']
-                copy_to_location = make_dirs_from_stable_id(mercurial_path, stable_id, project_id)
-                copy_tree(output_directory, copy_to_location)
-                logger.info("Copied portal files to %s" % copy_to_location)
-        else:
-            logger.error('Portal files are invalid; they will not be uploaded.')
-            sys.exit(2)
+                prepared_project = prepare_project(args,args.script_path,executor)
+                exit_status = finish_project(prepared_project,executor,mercurial_path,args.disable_portal_repo_update)
+        finally:
+            executor.shutdown()
+        if exit_status != 0:
+            sys.exit(exit_status)
     finally:
+        profile.write(profile_file)
         logging.shutdown()
         del logging._handlerList[:]  # workaround for harmless exceptions on exit
@@ -0,0 +1,225 @@
+import os, re, time, subprocess, logging, itertools, multiprocessing, collections
+from concurrent.futures import ThreadPoolExecutor
+
+# A child of the helper's logger, so job messages go to roslin_analysis_helper.log with the rest
+logger = logging.getLogger("roslin_analysis_helper.executor")
+
+# The outcome of one job. Times are epoch seconds as seen by this process, and start_time is None if the job was never
+# seen running
+JobResult = collections.namedtuple('JobResult', ['job_id', 'name', 'state', 'exit_code', 'submit_time', 'start_time', 'end_time'])
+
+# LSF job states, grouped by what they mean for the wait
+LSF_ACTIVE_STATES = frozenset(['PEND', 'PROV', 'WAIT', 'RUN', 'PSUSP', 'USUSP', 'SSUSP'])
+LSF_FINAL_STATES = frozenset(['DONE', 'EXIT'])
+
+def jobs_exit_status(results):
+    # 0 if every job is done, 1 if any exited with an error, and 2 if any ended in an unknown state
+    states = set(result.state for result in results)
+    if 'EXIT' in states:
+        return 1
+    if states - set(['DONE']):
+        return 2
+    return 0
+
+def log_job_results(results, name):
+    for result in results:
+        run_time = '%.0fs' % (result.end_time - result.start_time) if result.start_time is not None else 'unknown'
+        queue_time = '%.0fs' % ((result.start_time if result.start_time is not None else result.end_time) - result.submit_time)
+        message = "%s (%s) %s with exit code %s after %s queued and %s running" % (result.name, result.job_id, result.state, result.exit_code, queue_time, run_time)
+        logger.info(message) if result.state == 'DONE' else logger.warning(message)
+    exit_status = jobs_exit_status(results)
+    if exit_status == 0:
+        logger.info(name + " done")
+    elif exit_status == 1:
+        logger.warning(name + " exit with error")
+    else:
+        logger.warning(name + " status unknown")
+    return exit_status
+
+class LsfJobMonitor(object):
+    """Track the state of each LSF job, with a single bjobs query per poll for all the jobs still active
+
+    The poll interval starts at min_interval, and grows by backoff after every poll where no job changed state, up to
+    max_interval. Any change resets it, so finished jobs are noticed quickly without polling the scheduler every few
+    seconds through a long run
+    """
+
+    def __init__(self, jobs, min_interval=2, max_interval=60, backoff=1.5):
+        # jobs maps each job id to a (name, submit_time) tuple
+        self.jobs = jobs
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.states = dict((job_id, 'PEND') for job_id in jobs)
+        self.exit_codes = {}
+        self.start_times = {}
+        self.end_times = {}
+
+    def query(self, job_ids):
+        # Return {job_id: (state, exit_code)}. Jobs that LSF no longer knows about, like ones cleaned from its
+        # history, are reported as UNKNOWN
+        bjobs_command = ['bjobs', '-noheader', '-o', "jobid stat exit_code delimiter=','"] + list(job_ids)
+        bjobs_process = subprocess.Popen(bjobs_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        bjobs_stdout, bjobs_stderr = bjobs_process.communicate()
+        statuses = {}
+        for line in bjobs_stdout.splitlines():
+            fields = line.strip().split(',')
+            if len(fields) == 3 and fields[0] in self.jobs:
+                statuses[fields[0]] = (fields[1], fields[2] if fields[2] not in ('', '-') else None)
+        for job_id in re.findall(r'Job <(\d+)> is not found', bjobs_stderr):
+            statuses[job_id] = ('UNKNOWN', None)
+        return statuses
+
+    def update(self, statuses, now):
+        # Record the new states, and return whether any job changed
+        changed = False
+        for job_id, (state, exit_code) in statuses.items():
+            if state == self.states[job_id]:
+                continue
+            changed = True
+            logger.info("%s (%s) %s" % (self.jobs[job_id][0], job_id, state))
+            self.states[job_id] = state
+            if state == 'RUN' and job_id not in self.start_times:
+                self.start_times[job_id] = now
+            if state not in LSF_ACTIVE_STATES:
+                self.exit_codes[job_id] = exit_code if exit_code is not None else ('0' if state == 'DONE' else None)
+                self.end_times[job_id] = now
+        return changed
+
+    def active_jobs(self):
+        return [job_id for job_id in self.jobs if self.states[job_id] in LSF_ACTIVE_STATES]
+
+    def wait(self):
+        interval = self.min_interval
+        while True:
+            active_jobs = self.active_jobs()
+            if not active_jobs:
+                break
+            now = time.time()
+            if self.update(self.query(active_jobs), now):
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            if self.active_jobs():
+                time.sleep(interval)
+        return self.results()
+
+    def results(self):
+        results = []
+        for job_id, (name, submit_time) in sorted(self.jobs.items(), key=lambda job: job[1][1]):
+            results.append(JobResult(job_id, name, self.states[job_id], self.exit_codes.get(job_id), submit_time,
+                self.start_times.get(job_id), self.end_times.get(job_id)))
+        return results
+
+class LsfExecutor(object):
+    """Submit each job to LSF with bsub, and wait on them by polling bjobs
+
+    With max_jobs, the jobs are submitted into a job group of this run, limited to that many running jobs at a time, so
+    that a batch of projects doesn't flood the cluster. The group is deleted on shutdown
+    """
+
+    def __init__(self, walltime='0:59', max_jobs=None):
+        self.walltime = walltime
+        self.jobs = {}
+        self.results = {}
+        self.job_group = None
+        if max_jobs:
+            self.job_group = '/roslin_analysis_helper/' + str(os.getpid())
+            subprocess.check_call(['bgadd', '-L', str(max_jobs), self.job_group])
+            logger.info("Created LSF job group " + self.job_group + " limited to " + str(max_jobs) + " running jobs")
+
+    def submit(self, name, command, log_file, cores=1, resources=None):
+        # The command is passed to bsub as one argument, which LSF runs with a shell on the execution host, so its
+        # globs are expanded there. Jobs with several cores are kept on one host, since they run a process pool
+        resource_requirements = [resources] if resources else []
+        bsub_command = ['bsub', '-We', self.walltime, '-oo', log_file]
+        if self.job_group:
+            bsub_command[1:1] = ['-g', self.job_group]
+        if cores > 1:
+            resource_requirements.append('span[hosts=1]')
+            bsub_command[1:1] = ['-n', str(cores)]
+        if resource_requirements:
+            bsub_command[1:1] = ['-R', ' '.join(resource_requirements)]
+        bsub_stdout = subprocess.check_output(bsub_command + [command])
+        job_id = re.findall(r'Job <(\d+)>',bsub_stdout)[0]
+        self.jobs[job_id] = (name, time.time())
+        logger.info("Submitted " + name + " as LSF job " + job_id)
+        return job_id
+
+    def wait(self, job_ids, name):
+        # Wait until every job has finished, not just the first one, and return the exit status of jobs_exit_status.
+        # The per-job results and timings are kept in self.results
+        logger.info("Monitoring " + name + ' [' + ','.join(job_ids) + ']')
+        # Jobs that finished during an earlier wait aren't queried again
+        monitor = LsfJobMonitor(dict((job_id, self.jobs[job_id]) for job_id in job_ids if job_id not in self.results))
+        for result in monitor.wait():
+            self.results[result.job_id] = result
+        return log_job_results([self.results[job_id] for job_id in job_ids], name)
+
+    def cancel(self, job_ids):
+        # Jobs that have already finished are reported by bkill, but that isn't an error here
+        bkill_process = subprocess.Popen(['bkill'] + list(job_ids), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        bkill_process.communicate()
+        logger.info("Cancelled LSF jobs " + ','.join(job_ids))
+
+    def shutdown(self):
+        if self.job_group:
+            # Only empty groups can be deleted, which they are once every job has been waited on
+            if subprocess.call(['bgdel', self.job_group]) != 0:
+                logger.warning("Could not delete LSF job group " + self.job_group)
+            self.job_group = None
+
+def run_local_job(command, log_file):
+    # Like bsub -oo, the log gets both stdout and stderr and is overwritten by each run. Returns the start time, end
+    # time and exit code of the job
+    start_time = time.time()
+    with open(log_file,'w') as job_log:
+        return_code = subprocess.call(command, shell=True, stdout=job_log, stderr=subprocess.STDOUT)
+    return start_time, time.time(), return_code
+
+class LocalExecutor(object):
+    """Run each job as a child process on this node, at most workers of them at a time, with no scheduler queue"""
+
+    def __init__(self, workers=None):
+        self.pool = ThreadPoolExecutor(workers or multiprocessing.cpu_count())
+        self.job_counter = itertools.count(1)
+        self.jobs = {}
+        self.results = {}
+
+    def submit(self, name, command, log_file, cores=1, resources=None):
+        # Resource requirements are for the LSF scheduler, so they don't apply here
+        job_id = 'local-' + str(next(self.job_counter))
+        self.jobs[job_id] = (name, time.time(), self.pool.submit(run_local_job, command, log_file))
+        logger.info("Started " + name + " as local job " + job_id)
+        return job_id
+
+    def wait(self, job_ids, name):
+        logger.info("Monitoring " + name + ' [' + ','.join(job_ids) + ']')
+        results = []
+        for job_id in job_ids:
+            job_name, submit_time, job = self.jobs[job_id]
+            start_time, end_time, return_code = job.result()
+            result = JobResult(job_id, job_name, 'DONE' if return_code == 0 else 'EXIT', str(return_code), submit_time, start_time, end_time)
+            self.results[job_id] = result
+            results.append(result)
+        return log_job_results(results, name)
+
+    def cancel(self, job_ids):
+        # Only jobs still waiting for a worker can be cancelled, and running ones are left to finish
+        for job_id in job_ids:
+            self.jobs[job_id][2].cancel()
+        logger.info("Cancelled local jobs " + ','.join(job_ids))
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+EXECUTORS = {'lsf': LsfExecutor, 'local': LocalExecutor}
+
+def get_executor(name, max_jobs=None):
+    # max_jobs caps how many jobs run at a time. For the local executor it is the pool size, and defaults to the
+    # number of CPUs
+    if name not in EXECUTORS:
+        raise ValueError("Unknown executor " + name + ", expected one of " + ', '.join(sorted(EXECUTORS)))
+    if name == 'local':
+        return LocalExecutor(max_jobs)
+    return EXECUTORS[name](max_jobs=max_jobs)
@@ -0,0 +1,49 @@
+import os, collections
+
+class Request(collections.namedtuple('Request', ['path', 'fields', 'assay', 'project_id', 'pi', 'tumor_type'])):
+    """The fields of a *_request.txt file, with the ones the scripts use as attributes
+
+    fields has every key of the file. The attributes are None when the file doesn't have that key
+    """
+    __slots__ = ()
+
+    @property
+    def is_impact(self):
+        return self.assay is not None and ('IMPACT' in self.assay or 'HemePACT' in self.assay)
+
+def parse_request_lines(lines):
+    # This format looks like YAML, but sometimes has trailing garbage, so it can't be read with a YAML parser. Each
+    # line with a colon starts a key, whose value is what follows it up to any second colon. Lines without a colon
+    # continue the value of the key before them, like a multi-line ProjectDesc
+    fields = collections.OrderedDict()
+    key = None
+    for line in lines:
+        stripped_line = line.strip('\n\r')
+        if ':' in stripped_line:
+            split_line = stripped_line.split(':')
+            key = split_line[0].strip()
+            fields[key] = split_line[1].strip()
+        elif key is not None:
+            fields[key] += stripped_line
+    return fields
+
+def parse_request_file(request_file):
+    with open(request_file) as request:
+        fields = parse_request_lines(request)
+    def field(key):
+        return fields[key].strip() if key in fields else None
+    return Request(request_file, fields, field('Assay'), field('ProjectID'), field('PI'), field('TumorType'))
+
+# Parsed requests by absolute path, with the mtime and size they were parsed at
+request_cache = {}
+
+def load_request_file(request_file):
+    """Return the Request of a request file, parsing it only once for as long as it isn't modified"""
+    request_path = os.path.abspath(request_file)
+    request_stat = os.stat(request_path)
+    cached_request = request_cache.get(request_path)
+    if cached_request is not None and cached_request[0] == (request_stat.st_mtime, request_stat.st_size):
+        return cached_request[1]
+    request = parse_request_file(request_path)
+    request_cache[request_path] = ((request_stat.st_mtime, request_stat.st_size), request)
+    return request
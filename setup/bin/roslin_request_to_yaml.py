@@ -2,21 +2,35 @@
 
 import sys
 import os
-import re
 import argparse
 import yaml
 import copy
 import csv
-import glob
+import fnmatch
 import uuid
 import json
 import subprocess
 from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+import roslin_request
+import fastq_names
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 mapping_headers = ["library_suffix", "sample_id", "run_id", "fastq_directory", "runtype"]
 pairing_headers = ['normal_id', 'tumor_id']
 grouping_headers = ['sample_id', 'group_id']
 new_yaml_object = []
+fastq_pattern = "*R[12]*.fastq.gz"
+# Listing a directory of a large sequencing run can take seconds on a shared filesystem, so the listings are done
+# concurrently, and once per directory however many mapping rows point at it
+fastq_listing_workers = 16
+fastq_listings = dict()
 
 def read_pipeline_settings(pipeline_name_version):
     "read the Roslin Pipeline settings"
@@ -30,18 +44,44 @@ def read_pipeline_settings(pipeline_name_version):
     proc.communicate()
     return source_env
 
+def list_fastq_directory(fastq_directory):
+    "the fastqs in a directory, like glob.glob of fastq_pattern in it, which skips hidden files and missing directories"
+    try:
+        if scandir is not None:
+            names = [entry.name for entry in scandir(fastq_directory)]
+        else:
+            names = os.listdir(fastq_directory)
+    except OSError:
+        return []
+    return [os.path.join(fastq_directory, name) for name in names if not name.startswith(".") and fnmatch.fnmatch(name, fastq_pattern)]
+
+def list_fastq_directories(fastq_directories):
+    "list the directories not listed yet, concurrently, into fastq_listings"
+    unlisted_directories = sorted(set(fastq_directories) - set(fastq_listings))
+    if not unlisted_directories:
+        return
+    pool = ThreadPool(min(fastq_listing_workers, len(unlisted_directories)))
+    try:
+        for fastq_directory, fastqs in zip(unlisted_directories, pool.map(list_fastq_directory, unlisted_directories)):
+            fastq_listings[fastq_directory] = fastqs
+    finally:
+        pool.close()
+        pool.join()
+
 def parse_mapping_file(mfile):
     mapping_dict = dict()
     fh = open(mfile, "r")
     csvreader = csv.DictReader(fh, delimiter="\t", fieldnames=mapping_headers)
-    for row in csvreader:
+    rows = list(csvreader)
+    list_fastq_directories(row['fastq_directory'] for row in rows)
+    for row in rows:
         #take all hyphens out, these will be word separators in fastq chunks
         row['sample_id'] = row['sample_id'].replace("-", "_")
         new_row = copy.deepcopy(row)
         rg_id = row['sample_id'].replace("-","_") + new_row['library_suffix'].replace("-","_") + "-" + new_row['run_id'].replace("-","_")
         new_row['run_id'] = new_row['run_id'].replace("-","_")
         #hyphens suck
-        fastqs = sort_fastqs_into_dict(glob.glob(os.path.join(new_row['fastq_directory'], "*R[12]*.fastq.gz")))
+        fastqs = sort_fastqs_into_dict(fastq_listings[new_row['fastq_directory']])
         new_row['rg_id'] = []
         for fastq in fastqs['R1']:
             new_row['rg_id'].append(rg_id)
@@ -81,26 +121,6 @@ def parse_grouping_file(gfile):
     return grouping_dict
 
 
-def parse_request_file(rfile):
-    stream = open(rfile, "r")
-    # this format looks like yaml, but sometimes has trailling garbage, so we cant use yaml parser.
-    # thumbs up
-    assay = None
-    project = None
-
-    while(1):
-        line = stream.readline()
-        if not line:
-            break
-        if line.find("Assay:") == 0:
-            (key, value) = line.strip().split(":")
-            assay = value.strip()
-        if line.find("ProjectID:") > -1:
-            (key, value) = line.strip().split(":")
-            project = value.strip()
-    return (assay, project)
-
-
 def get_curated_bams(assay,REQUEST_FILES):
     # Default to AgilentExon_51MB_b37_v3 BAMs for all assays except those specified below
     json_curated_bams = REQUEST_FILES['curated_bams']['AgilentExon_51MB_b37_v3']
@@ -157,23 +177,18 @@ def sort_fastqs_into_dict(files):
     readgroup_tags = dict()
     paired_by_sample = {"R1": list(), "R2": list()}
     for file in files:
-        base = os.path.basename(file)
-        m = re.search("(?P<sample>[^_]+)_?(?P<barcode>\S+)?_?(?P<flowcell>\S+)?_(?P<lane>\S+)_(?P<read>R[12])_(?P<set>\d\d\d).fastq.gz", base)
-        if not m:
-            m = re.search("(?P<sample>[^_]+)_(?P<barcode>\S+)_(?P<flowcell>\S+)_(?P<lane>\S+)_(?P<set>\d\d\d).(?P<read>R[12]).fastq.gz", base)
-        if not m or not (m.group('sample') and m.group('read') and m.group('set')):
+        fastq_name = fastq_names.parse_fastq_name(os.path.basename(file))
+        if fastq_name is None:
             # FIXME LOGGING instead of CRITICAL fail?
             print >>sys.stderr, "ERROR: Can't find filename parts (Sample/Barcode, R1/2, group) for this fastq: %s" % file
             sys.exit(1)
         # fastq file large sample and barcode prefix
-        readset = "_".join([m.group('sample') + m.group('lane') + m.group('set')])
-        if (m.group('flowcell') != None):
-            readset = "_".join([m.group('sample') + m.group('lane') + m.group('flowcell') + m.group('set')])
-        if m.group('sample') not in sorted:
-            sorted[m.group('sample')] = dict()
-        if readset not in sorted[m.group('sample')]:
-            sorted[m.group('sample')][readset] = dict()
-        sorted[m.group('sample')][readset][m.group('read')] = file
+        readset = fastq_name.readset
+        if fastq_name.sample not in sorted:
+            sorted[fastq_name.sample] = dict()
+        if readset not in sorted[fastq_name.sample]:
+            sorted[fastq_name.sample][readset] = dict()
+        sorted[fastq_name.sample][readset][fastq_name.read] = file
     for sample in sorted:
         for readset in sorted[sample]:
             for read in ["R1", "R2"]:
@@ -206,7 +221,8 @@ if __name__ == "__main__":
     ROSLIN_PATH = pipeline_settings['ROSLIN_PIPELINE_BIN_PATH']
     ROSLIN_RESOURCES = json.load(open(ROSLIN_PATH + os.sep + "scripts" + os.sep + "roslin_resources.json", 'r'))
     REQUEST_FILES = ROSLIN_RESOURCES["request_files"]
-    (assay, project_id) = parse_request_file(args.request)
+    request = roslin_request.load_request_file(args.request)
+    (assay, project_id) = (request.assay, request.project_id)
     intervals = get_baits_and_targets(assay,ROSLIN_RESOURCES)
     curated_bams = get_curated_bams(assay,REQUEST_FILES)
     mapping_dict = parse_mapping_file(args.mapping)
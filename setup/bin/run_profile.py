@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import os, sys, json, time, argparse, contextlib, collections
+
+class RunProfile(object):
+    """Record how long each stage of a run took, as spans with start and end times, and write them as JSON
+
+    Each span has a stage name, the project it belongs to if any, and any other attributes of the stage, like its
+    byte counts or job IDs
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.spans = []
+
+    def add_span(self, stage, start_time, end_time, project=None, status='ok', **attributes):
+        span = dict(attributes)
+        span.update({'stage': stage, 'project': project, 'start': start_time, 'end': end_time,
+            'duration': end_time - start_time if start_time is not None and end_time is not None else None, 'status': status})
+        self.spans.append(span)
+        return span
+
+    @contextlib.contextmanager
+    def span(self, stage, project=None, **attributes):
+        # Time the body of the with statement. It gets the span's attributes as a dict, to add its own to
+        start_time = time.time()
+        status = 'failed'
+        try:
+            yield attributes
+            status = 'ok'
+        finally:
+            self.add_span(stage, start_time, time.time(), project, status, **attributes)
+
+    def add_job_spans(self, results, project=None, output_files=None):
+        # A span for each roslin_executor.JobResult, from when the job started running, with the time it spent queued
+        for result in results:
+            start_time = result.start_time if result.start_time is not None else result.submit_time
+            span = self.add_span('job: ' + result.name, start_time, result.end_time, project,
+                'ok' if result.state == 'DONE' else 'failed', job_id=result.job_id, state=result.state,
+                exit_code=result.exit_code, queued=start_time - result.submit_time)
+            if output_files and result.job_id in output_files:
+                span['bytes'] = file_size(output_files[result.job_id])
+
+    def write(self, profile_file):
+        with open(profile_file,'w') as profile_json:
+            json.dump({'command': sys.argv, 'started_at': self.started_at, 'ended_at': time.time(), 'spans': self.spans},
+                profile_json, indent=4)
+
+def file_size(path):
+    # The size of a file, or None if it wasn't written
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+# The totals of one stage across profiles
+StageSummary = collections.namedtuple('StageSummary', ['stage', 'count', 'failed', 'total', 'mean', 'max', 'queued', 'bytes'])
+
+def summarize_stages(profiles):
+    # Return a StageSummary per stage, slowest total first. Spans without a duration, like jobs that were never seen
+    # ending, count towards the stage but not its times
+    spans_by_stage = collections.defaultdict(list)
+    for profile in profiles:
+        for span in profile['spans']:
+            spans_by_stage[span['stage']].append(span)
+    summaries = []
+    for stage, spans in spans_by_stage.items():
+        durations = [span['duration'] for span in spans if span['duration'] is not None]
+        total = sum(durations)
+        queued = [span['queued'] for span in spans if span.get('queued') is not None]
+        summaries.append(StageSummary(stage, len(spans), len([span for span in spans if span['status'] != 'ok']), total,
+            total / len(durations) if durations else None, max(durations) if durations else None,
+            sum(queued) / len(queued) if queued else None, sum(span.get('bytes') or 0 for span in spans)))
+    return sorted(summaries, key=lambda summary: summary.total, reverse=True)
+
+def format_seconds(seconds):
+    return '%.1f' % seconds if seconds is not None else '-'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarize the stage timings of roslin_analysis_helper run profiles, slowest stages first")
+    parser.add_argument('--profiles',required=True,nargs='+',help='The roslin_analysis_helper.profile.json files to summarize')
+    parser.add_argument('--top',type=int,required=False,help='Only show this many of the slowest stages')
+    args = parser.parse_args()
+    profiles = []
+    for profile_file in args.profiles:
+        with open(profile_file) as profile_json:
+            profiles.append(json.load(profile_json))
+    summaries = summarize_stages(profiles)[:args.top]
+    print '\t'.join(['stage', 'count', 'failed', 'total_s', 'mean_s', 'max_s', 'mean_queued_s', 'bytes'])
+    for summary in summaries:
+        print '\t'.join([summary.stage, str(summary.count), str(summary.failed), format_seconds(summary.total),
+            format_seconds(summary.mean), format_seconds(summary.max), format_seconds(summary.queued), str(summary.bytes)])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+import re, argparse, multiprocessing
+
+# The seg.mean column, which is rounded to 4 decimals to reduce the log-ratio significant digits
+SEG_MEAN_COL = 5
+
+# awk splits a record into fields on runs of spaces, tabs and newlines, ignoring them at either end
+awk_field_separator = re.compile(r'[ \t\n]+')
+# awk reads the leading decimal number of a string as its value, and a string without one as 0
+awk_number = re.compile(r'[ \t\n]*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+
+def split_seg_line(line):
+    stripped_line = line.strip(' \t\n')
+    if not stripped_line:
+        return []
+    return awk_field_separator.split(stripped_line)
+
+def round_seg_line(line):
+    # The same as awk 'OFS="\t" {$6=sprintf("%.4f",$6); print}', which rejoins the fields with tabs and adds empty
+    # fields to lines with fewer than 6
+    fields = split_seg_line(line)
+    while len(fields) <= SEG_MEAN_COL:
+        fields.append('')
+    m = awk_number.match(fields[SEG_MEAN_COL])
+    fields[SEG_MEAN_COL] = '%.4f' % (float(m.group(1)) if m is not None else 0)
+    return '\t'.join(fields) + '\n'
+
+def read_seg_header(input_file):
+    # The first header line of a per-tumor seg file, or None if the file has none
+    with open(input_file,'rb') as input_seg:
+        for line in input_seg:
+            if line.startswith('ID'):
+                return line if line.endswith('\n') else line + '\n'
+    return None
+
+def check_seg_headers(input_files):
+    # Every seg file must share the same columns, with seg.mean where it is rounded, or the merged rows would be
+    # misaligned
+    header = None
+    for input_file in input_files:
+        file_header = read_seg_header(input_file)
+        if file_header is None:
+            continue
+        if header is None:
+            header = file_header
+            header_fields = split_seg_line(header)
+            if len(header_fields) <= SEG_MEAN_COL or header_fields[SEG_MEAN_COL] != 'seg.mean':
+                raise ValueError("Header of " + input_file + " does not have seg.mean as column " + str(SEG_MEAN_COL + 1))
+        elif split_seg_line(file_header) != header_fields:
+            raise ValueError("Header of " + input_file + " does not match the header of the other seg files")
+    if header is None:
+        raise ValueError("None of the input seg files have a header line")
+    return header
+
+def round_seg_file(input_file):
+    # Return the rounded data lines of a seg file as one string, skipping its header line
+    with open(input_file,'rb') as input_seg:
+        return ''.join(round_seg_line(line) for line in input_seg if not line.startswith('ID'))
+
+def merge_seg_files(input_files, output_files, workers=1):
+    header = check_seg_headers(input_files)
+    outputs = [open(output_file,'wb') for output_file in output_files]
+    try:
+        for output in outputs:
+            output.write(header)
+        # The per-tumor files are small, so each is rounded whole in a worker, and imap returns them in input order
+        if workers > 1:
+            pool = multiprocessing.Pool(workers)
+            try:
+                rounded_files = pool.imap(round_seg_file, input_files)
+                for rounded_lines in rounded_files:
+                    for output in outputs:
+                        output.write(rounded_lines)
+                pool.close()
+            except:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        else:
+            for input_file in input_files:
+                rounded_lines = round_seg_file(input_file)
+                for output in outputs:
+                    output.write(rounded_lines)
+    finally:
+        for output in outputs:
+            output.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Merge per-tumor seg files into the portal and analysis seg files, rounding seg.mean to 4 decimals")
+    parser.add_argument('--input_segs',required=True,nargs='+',help='The per-tumor *_hisens.seg files to merge, in order')
+    parser.add_argument('--portal_file',required=True,help='The portal seg file to write')
+    parser.add_argument('--analysis_file',required=False,help='Also write the same merged seg file here, for the analysis folder')
+    parser.add_argument('--workers',type=int,default=1,help='Number of processes to read and round the seg files with')
+    args = parser.parse_args()
+    output_files = [args.portal_file] + ([args.analysis_file] if args.analysis_file else [])
+    merge_seg_files(args.input_segs, output_files, args.workers)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os, re, sys, time, random, argparse
+
+benchmark_directory = os.path.dirname(os.path.abspath(__file__))
+default_script_path = os.path.abspath(os.path.join(benchmark_directory, os.pardir, os.pardir, 'setup', 'bin'))
+
+def legacy_parse_fastq_name(base):
+    # How roslin_request_to_yaml parsed names before fastq_names, with two uncompiled regex searches per name
+    m = re.search("(?P<sample>[^_]+)_?(?P<barcode>\S+)?_?(?P<flowcell>\S+)?_(?P<lane>\S+)_(?P<read>R[12])_(?P<set>\d\d\d).fastq.gz", base)
+    if not m:
+        m = re.search("(?P<sample>[^_]+)_(?P<barcode>\S+)_(?P<flowcell>\S+)_(?P<lane>\S+)_(?P<set>\d\d\d).(?P<read>R[12]).fastq.gz", base)
+    if not m or not (m.group('sample') and m.group('read') and m.group('set')):
+        return None
+    return (m.group('sample'), m.group('barcode'), m.group('flowcell'), m.group('lane'), m.group('read'), m.group('set'))
+
+def random_sample_id(rng):
+    # The sample ID styles seen in IGO and DMP deliveries
+    style = rng.random()
+    if style < 0.6:
+        return 's_C_%06X_%s%03i_d' % (rng.randrange(16 ** 6), rng.choice('TN'), rng.randint(1, 3))
+    if style < 0.8:
+        return 'P-%07i-%s01-IM6' % (rng.randrange(10 ** 7), rng.choice('TN'))
+    return 'Proj_%05i_%s' % (rng.randrange(10 ** 5), rng.choice(['A', 'B', 'C', 'D1', 'DNA']))
+
+def generate_fastq_names(count, seed):
+    # Mostly the current IGO layout, some older names with an index barcode and flowcell, and a few with the read after
+    # the set, which only the regexes parse
+    rng = random.Random(seed)
+    names = []
+    for index in range(count):
+        sample_id = random_sample_id(rng)
+        lane = 'L%03i' % rng.randint(1, 8)
+        read = rng.choice(['R1', 'R2'])
+        layout = rng.random()
+        if layout < 0.85:
+            names.append('%s_IGO_%05i_%s_%i_S%i_%s_%s_001.fastq.gz' % (sample_id, rng.randrange(10 ** 5), rng.choice('ABCDEFG'),
+                rng.randint(1, 400), rng.randint(1, 96), lane, read))
+        else:
+            barcode = ''.join(rng.choice('ACGT') for _ in range(8))
+            flowcell = 'H%sBBXX' % ''.join(rng.choice('ABCDEFGHJKLMNPQRSTUVWXY0123456789') for _ in range(4))
+            if layout < 0.95:
+                names.append('%s_%s_%s_%s_%s_001.fastq.gz' % (sample_id, barcode, flowcell, lane, read))
+            else:
+                names.append('%s_%s_%s_%s_001.%s.fastq.gz' % (sample_id, barcode, flowcell, lane, read))
+    return names
+
+def time_parser(parse, names):
+    start_time = time.time()
+    results = [parse(name) for name in names]
+    return time.time() - start_time, results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the FASTQ file name parser of roslin_request_to_yaml against the regexes it replaced")
+    parser.add_argument('--count', type=int, default=100000, help='Number of synthetic names to parse')
+    parser.add_argument('--names_file', help='Parse the names in this file instead, one path or name per line, like a find listing of a sequencing run')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic names')
+    parser.add_argument('--script_path', default=default_script_path, help='Path for the setup/bin scripts')
+    args = parser.parse_args()
+    sys.path.insert(0, args.script_path)
+    import fastq_names
+
+    if args.names_file:
+        with open(args.names_file) as names_file:
+            names = [os.path.basename(line.rstrip('\r\n')) for line in names_file if line.strip()]
+    else:
+        names = generate_fastq_names(args.count, args.seed)
+    legacy_seconds, legacy_results = time_parser(legacy_parse_fastq_name, names)
+    seconds, results = time_parser(fastq_names.parse_fastq_name, names)
+    mismatches = [name for name, legacy_result, result in zip(names, legacy_results, results)
+        if legacy_result != (tuple(result) if result is not None else None)]
+    fast_path_names = len([name for name in names if fastq_names.split_illumina_name(name) is not None])
+
+    print "%-22s %10s %10s %12s" % ('parser', 'names', 'seconds', 'names/sec')
+    print "%-22s %10i %10.2f %12.0f" % ('legacy regexes', len(names), legacy_seconds, len(names) / legacy_seconds)
+    print "%-22s %10i %10.2f %12.0f" % ('fastq_names', len(names), seconds, len(names) / seconds)
+    print "%.1fx faster, with %i of %i names on the fast path" % (legacy_seconds / seconds, fast_path_names, len(names))
+    if mismatches:
+        print >>sys.stderr, "ERROR: %i names parsed differently from the legacy regexes, like %s" % (len(mismatches), mismatches[0])
+        sys.exit(1)
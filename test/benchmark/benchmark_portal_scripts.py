@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+import os, sys, csv, json, time, shutil, argparse, subprocess
+from tempfile import mkdtemp
+import synthetic_data
+
+benchmark_directory = os.path.dirname(os.path.abspath(__file__))
+default_script_path = os.path.abspath(os.path.join(benchmark_directory, os.pardir, os.pardir, 'setup', 'bin'))
+
+def measure(command, cwd=None):
+    # Run one benchmark in its own process, so that wait4 reports the peak RSS of that process alone
+    start_time = time.time()
+    with open(os.devnull, 'w') as devnull:
+        process = subprocess.Popen(command, cwd=cwd, stdout=devnull)
+        _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.time() - start_time
+    if status != 0:
+        raise Exception("Benchmark command failed with status %i: %s" % (status, ' '.join(command)))
+    # ru_maxrss is in kilobytes on Linux
+    return seconds, usage.ru_maxrss / 1024.0
+
+def run_clinical_generation(script_path, clinical_data, sample_summary, output_directory):
+    # The clinical steps of roslin_analysis_helper, run in a child process of the benchmark
+    sys.path.insert(0, script_path)
+    os.chdir(output_directory)
+    import roslin_analysis_helper
+    coverage_values = {}
+    with open(sample_summary) as summary_file:
+        for row in csv.DictReader(summary_file, delimiter='\t'):
+            coverage_values[row['Sample']] = row['Coverage']
+    clinical_data_path = os.path.join(output_directory, 'data_clinical.txt')
+    roslin_analysis_helper.generate_legacy_clinical_data(clinical_data, clinical_data_path, coverage_values)
+    roslin_analysis_helper.create_data_clinical_files_new_format(clinical_data_path, os.path.join(output_directory, 'data_clinical_sample.txt'),
+        os.path.join(output_directory, 'data_clinical_patient.txt'))
+
+def benchmark_size(rows, pairs, seed, script_path, work_directory, maf_filter_args):
+    data_directory = os.path.join(work_directory, 'data')
+    output_directory = os.path.join(work_directory, 'output')
+    os.makedirs(data_directory)
+    os.makedirs(output_directory)
+    maf_files = synthetic_data.generate_maf(os.path.join(data_directory, 'synthetic.muts.maf'), rows, seed, pairs)
+    fusion_file = os.path.join(data_directory, 'synthetic.svs.pass.vep.portal.txt')
+    synthetic_data.generate_fusions(fusion_file, rows, seed, os.path.join(script_path, 'known_fusions_at_mskcc.txt'))
+    clinical_rows = max(rows // 100, 1)
+    clinical_data = os.path.join(data_directory, 'synthetic_data_clinical.txt')
+    sample_summary = os.path.join(data_directory, 'synthetic_SampleSummary.txt')
+    synthetic_data.generate_clinical(clinical_data, sample_summary, clinical_rows, seed)
+    results = []
+
+    maf_command = [sys.executable, os.path.join(script_path, 'maf_filter.py'), '--version_string', 'benchmark', '--is_impact',
+        '--analyst_file', os.path.join(output_directory, 'analyst.muts.maf'), '--portal_file', os.path.join(output_directory, 'data_mutations_extended.txt')]
+    maf_command += maf_filter_args + ['--input_mafs'] + maf_files
+    results.append(('maf_filter.py', rows) + measure(maf_command))
+
+    fusion_command = [sys.executable, os.path.join(script_path, 'fusion_filter.py'), '--output_file', os.path.join(output_directory, 'data_fusions.txt'),
+        '--input_fusions', fusion_file]
+    results.append(('fusion_filter.py', rows) + measure(fusion_command))
+
+    clinical_command = [sys.executable, os.path.abspath(__file__), '--run_clinical_generation', clinical_data, sample_summary,
+        output_directory, '--script_path', script_path]
+    results.append(('clinical generation', clinical_rows) + measure(clinical_command))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the portal post-processing scripts on seeded synthetic data")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 1000000, 10000000], help='MAF and fusion row counts to benchmark')
+    parser.add_argument('--pairs', type=int, default=1, help='Number of per-pair MAFs to spread the MAF rows over')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the synthetic data')
+    parser.add_argument('--script_path', default=default_script_path, help='Path for the portal helper scripts')
+    parser.add_argument('--work_directory', help='Where to write the synthetic data, instead of a temporary directory')
+    parser.add_argument('--maf_filter_args', default='', help='Extra arguments for maf_filter.py, like "--workers 4"')
+    parser.add_argument('--output_json', help='Also write the results to this JSON file, to compare releases')
+    parser.add_argument('--run_clinical_generation', nargs=3, metavar=('CLINICAL_DATA', 'SAMPLE_SUMMARY', 'OUTPUT_DIRECTORY'),
+        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run_clinical_generation:
+        run_clinical_generation(args.script_path, *args.run_clinical_generation)
+        sys.exit(0)
+
+    all_results = []
+    print "%-22s %10s %10s %12s %12s" % ('script', 'rows', 'seconds', 'rows/sec', 'peak RSS MB')
+    for rows in args.sizes:
+        work_directory = mkdtemp(dir=args.work_directory)
+        try:
+            for script, script_rows, seconds, peak_rss in benchmark_size(rows, args.pairs, args.seed, args.script_path, work_directory, args.maf_filter_args.split()):
+                print "%-22s %10i %10.2f %12.0f %12.1f" % (script, script_rows, seconds, script_rows / seconds, peak_rss)
+                all_results.append({'script': script, 'rows': script_rows, 'seconds': seconds, 'rows_per_second': script_rows / seconds, 'peak_rss_mb': peak_rss})
+        finally:
+            shutil.rmtree(work_directory)
+    if args.output_json:
+        with open(args.output_json, 'w') as output_json:
+            json.dump(all_results, output_json, indent=4)
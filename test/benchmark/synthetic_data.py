@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+import os, random, argparse
+
+# Column layout of a vcf2maf + ngs-filters MAF as the pipeline writes it. The portal keeps the first 45 columns
+maf_columns = ['Hugo_Symbol', 'Entrez_Gene_Id', 'Center', 'NCBI_Build', 'Chromosome', 'Start_Position', 'End_Position', 'Strand',
+    'Variant_Classification', 'Variant_Type', 'Reference_Allele', 'Tumor_Seq_Allele1', 'Tumor_Seq_Allele2', 'dbSNP_RS',
+    'dbSNP_Val_Status', 'Tumor_Sample_Barcode', 'Matched_Norm_Sample_Barcode', 'Match_Norm_Seq_Allele1', 'Match_Norm_Seq_Allele2',
+    'Tumor_Validation_Allele1', 'Tumor_Validation_Allele2', 'Match_Norm_Validation_Allele1', 'Match_Norm_Validation_Allele2',
+    'Verification_Status', 'Validation_Status', 'Mutation_Status', 'Sequencing_Phase', 'Sequence_Source', 'Validation_Method',
+    'Score', 'BAM_File', 'Sequencer', 'Tumor_Sample_UUID', 'Matched_Norm_Sample_UUID', 'HGVSc', 'HGVSp', 'HGVSp_Short',
+    'Transcript_ID', 'Exon_Number', 't_depth', 't_ref_count', 't_alt_count', 'n_depth', 'n_ref_count', 'n_alt_count',
+    'all_effects', 'Allele', 'Gene', 'Feature', 'Feature_type', 'Consequence', 'cDNA_position', 'CDS_position', 'Protein_position',
+    'Amino_acids', 'Codons', 'Existing_variation', 'ALLELE_NUM', 'DISTANCE', 'STRAND_VEP', 'SYMBOL', 'SYMBOL_SOURCE', 'HGNC_ID',
+    'BIOTYPE', 'CANONICAL', 'CCDS', 'ENSP', 'SWISSPROT', 'TREMBL', 'UNIPARC', 'RefSeq', 'SIFT', 'PolyPhen', 'EXON', 'INTRON',
+    'DOMAINS', 'GMAF', 'AFR_MAF', 'AMR_MAF', 'ASN_MAF', 'EAS_MAF', 'EUR_MAF', 'SAS_MAF', 'AA_MAF', 'EA_MAF', 'CLIN_SIG', 'SOMATIC',
+    'PUBMED', 'MOTIF_NAME', 'MOTIF_POS', 'HIGH_INF_POS', 'MOTIF_SCORE_CHANGE', 'IMPACT', 'PICK', 'VARIANT_CLASS', 'TSL',
+    'HGVS_OFFSET', 'PHENO', 'MINIMISED', 'ExAC_AF', 'ExAC_AF_AFR', 'ExAC_AF_AMR', 'ExAC_AF_EAS', 'ExAC_AF_FIN', 'ExAC_AF_NFE',
+    'ExAC_AF_OTH', 'ExAC_AF_SAS', 'GENE_PHENO', 'FILTER', 'flanking_bps', 'variant_id', 'variant_qual', 'ExAC_AF_Adj', 'ExAC_AC_AN_Adj',
+    'ExAC_AC_AN', 'ExAC_AC_AN_AFR', 'ExAC_AC_AN_AMR', 'ExAC_AC_AN_EAS', 'ExAC_AC_AN_FIN', 'ExAC_AC_AN_NFE', 'ExAC_AC_AN_OTH',
+    'ExAC_AC_AN_SAS', 'ExAC_FILTER', 'set', 'fillout_t_depth', 'fillout_t_ref', 'fillout_t_alt', 'fillout_n_depth', 'fillout_n_ref',
+    'fillout_n_alt', 'hotspot_whitelist']
+
+# (Consequence, Variant_Classification, weight), roughly as seen in IMPACT and exome projects
+consequences = [
+    ('missense_variant', 'Missense_Mutation', 30),
+    ('synonymous_variant', 'Silent', 12),
+    ('intron_variant', 'Intron', 14),
+    ('stop_gained', 'Nonsense_Mutation', 4),
+    ('frameshift_variant', 'Frame_Shift_Del', 4),
+    ('inframe_deletion', 'In_Frame_Del', 2),
+    ('splice_acceptor_variant', 'Splice_Site', 2),
+    ('splice_region_variant,intron_variant', 'Splice_Region', 5),
+    ('splice_region_variant,synonymous_variant', 'Silent', 2),
+    ('splice_region_variant,non_coding_transcript_exon_variant', 'RNA', 1),
+    ('upstream_gene_variant', "5'Flank", 6),
+    ('downstream_gene_variant', "3'Flank", 4),
+    ('3_prime_UTR_variant', "3'UTR", 5),
+    ('5_prime_UTR_variant', "5'UTR", 2),
+    ('stop_retained_variant', 'Silent', 1),
+    ('non_coding_transcript_exon_variant', 'RNA', 2),
+]
+splice_hgvsc = ['c.{0}+1G>A', 'c.{0}+2T>C', 'c.{0}-2A>G', 'c.{0}+3A>G', 'c.{0}-5T>C', 'c.{0}+8C>T', 'c.{0}-3_{0}-1del',
+    'c.{0}+4_{0}+9del', 'c.{0}-12_{0}-2delinsA', 'n.{0}-1G>T']
+genes = [('TP53', '7157', '17', 7577120), ('KRAS', '3845', '12', 25398284), ('EGFR', '1956', '7', 55259515),
+    ('PIK3CA', '5290', '3', 178936091), ('BRAF', '673', '7', 140453136), ('TERT', '7015', '5', 1295228),
+    ('APC', '324', '5', 112175211), ('PTEN', '5728', '10', 89692905), ('ARID1A', '8289', '1', 27106356),
+    ('LINC00001', '0', '2', 1500000)]
+callers = ['MuTect', 'VarDict', 'MuTect-VarDict', 'Pindel', 'VarDict-Pindel']
+
+def weighted_choice(rng, choices):
+    total = sum(choice[-1] for choice in choices)
+    point = rng.uniform(0, total)
+    for choice in choices:
+        point -= choice[-1]
+        if point <= 0:
+            return choice
+    return choices[-1]
+
+def generate_maf_row(rng, tumor_id, normal_id):
+    gene, entrez_id, chromosome, gene_start = rng.choice(genes)
+    csq, variant_classification, _ = weighted_choice(rng, consequences)
+    position = gene_start + rng.randint(-500, 500)
+    if gene == 'TERT' and rng.random() < 0.5:
+        # TERT promoter mutations are kept even though they are non-coding
+        csq, variant_classification, position = 'upstream_gene_variant', "5'Flank", rng.randint(1295100, 1295400)
+    ref, alt = rng.sample('ACGT', 2)
+    cds_position = rng.randint(1, 3000)
+    if csq.startswith('splice_region_variant'):
+        hgvsc = rng.choice(splice_hgvsc).format(cds_position)
+    else:
+        hgvsc = 'c.%i%s>%s' % (cds_position, ref, alt)
+    t_depth = int(rng.lognormvariate(5, 1)) + 1
+    t_alt_count = min(t_depth, int(t_depth * rng.betavariate(1, 6)))
+    n_depth = int(rng.lognormvariate(4.5, 0.8)) + 1
+    n_alt_count = int(n_depth * rng.random() * 0.01)
+    values = dict.fromkeys(maf_columns, '')
+    values.update({
+        'Hugo_Symbol': gene, 'Entrez_Gene_Id': entrez_id, 'Center': 'mskcc.org', 'NCBI_Build': 'GRCh37', 'Chromosome': chromosome,
+        'Start_Position': str(position), 'End_Position': str(position), 'Strand': '+', 'Variant_Classification': variant_classification,
+        'Variant_Type': 'SNP', 'Reference_Allele': ref, 'Tumor_Seq_Allele1': ref, 'Tumor_Seq_Allele2': alt,
+        'dbSNP_RS': 'rs%i' % rng.randint(1, 10**8) if rng.random() < 0.2 else 'novel', 'Tumor_Sample_Barcode': tumor_id,
+        'Matched_Norm_Sample_Barcode': normal_id, 'Match_Norm_Seq_Allele1': ref, 'Match_Norm_Seq_Allele2': ref,
+        'Mutation_Status': 'None' if rng.random() < 0.05 else 'SOMATIC', 'HGVSc': hgvsc, 'HGVSp': 'p.Gly%iAsp' % (cds_position // 3),
+        'HGVSp_Short': 'p.G%iD' % (cds_position // 3), 'Transcript_ID': 'ENST%011i' % rng.randint(1, 10**6), 'Exon_Number': '%i/11' % rng.randint(1, 11),
+        't_depth': str(t_depth), 't_ref_count': str(t_depth - t_alt_count), 't_alt_count': str(t_alt_count),
+        'n_depth': str(n_depth), 'n_ref_count': str(n_depth - n_alt_count), 'n_alt_count': str(n_alt_count),
+        'all_effects': '%s,%s,p.G%iD,ENST00000269305,NM_000546.5' % (gene, csq.split(',')[0], cds_position // 3),
+        'Allele': alt, 'Gene': 'ENSG%011i' % rng.randint(1, 10**6), 'Feature_type': 'Transcript', 'Consequence': csq,
+        'SYMBOL': gene, 'BIOTYPE': 'protein_coding', 'CANONICAL': 'YES', 'IMPACT': 'MODERATE', 'PICK': '1', 'VARIANT_CLASS': 'SNV',
+        'FILTER': rng.choice(['PASS'] * 8 + ['common_variant', 'normal_panel;LowTotalDepth']),
+        'variant_id': '.', 'variant_qual': '.', 'set': rng.choice(callers), 'fillout_t_depth': str(t_depth),
+        'fillout_t_ref': str(t_depth - t_alt_count), 'fillout_t_alt': str(t_alt_count),
+        'hotspot_whitelist': 'TRUE' if rng.random() < 0.1 else 'FALSE'
+    })
+    return '\t'.join(values[column] for column in maf_columns) + '\n'
+
+def generate_maf(path, rows, seed, pairs=1):
+    # Rows are spread over per-pair MAFs when pairs > 1, named like the pipeline's *.muts.maf outputs
+    rng = random.Random(seed)
+    paths = [path] if pairs == 1 else [path.replace('.muts.maf', '.%03i.muts.maf' % pair) for pair in range(pairs)]
+    for pair, pair_path in enumerate(paths):
+        tumor_id, normal_id = 's_C_%06i_T001_d' % pair, 's_C_%06i_N001_d' % pair
+        with open(pair_path, 'w') as maf_file:
+            maf_file.write('#version 2.4\n')
+            maf_file.write('\t'.join(maf_columns) + '\n')
+            for row_index in xrange(pair, rows, pairs):
+                maf_file.write(generate_maf_row(rng, tumor_id, normal_id))
+    return paths
+
+def generate_fusions(path, rows, seed, known_fusions_path):
+    # Two rows per fusion event, one for each partner gene, like the *.svs.pass.vep.portal.txt files
+    rng = random.Random(seed)
+    with open(known_fusions_path) as known_fusions_file:
+        known_fusions = [line.strip('\r\n') for line in known_fusions_file if line.strip()]
+    with open(path, 'w') as fusion_file:
+        fusion_file.write('\t'.join(['Hugo_Symbol', 'Entrez_Gene_Id', 'Center', 'Tumor_Sample_Barcode', 'Fusion', 'DNA_support',
+            'RNA_support', 'Method', 'Frame', 'Comments']) + '\n')
+        for event in xrange(rows // 2):
+            draw = rng.random()
+            if draw < 0.4:
+                fusion = rng.choice(known_fusions)
+            elif draw < 0.5:
+                fusion = '-'.join(reversed(rng.choice(known_fusions).split('-', 1)))
+            else:
+                fusion = 'GENE%i-GENE%i' % (rng.randint(0, 2000), rng.randint(0, 2000))
+            gene_a, _, gene_b = fusion.partition('-')
+            tumor_id = 's_C_%06i_T001_d' % (event % 500)
+            for gene in (gene_a, gene_b):
+                entrez_id = '0' if rng.random() < 0.05 else str(rng.randint(1, 100000))
+                fusion_file.write('\t'.join([gene, entrez_id, 'MSKCC-DMP', tumor_id, fusion + ' fusion', 'yes', 'unknown', 'Delly',
+                    rng.choice(['in frame', 'out of frame', 'unknown']), 'Note: ' + fusion]) + '\n')
+
+def generate_clinical(clinical_path, sample_summary_path, rows, seed):
+    # A sample data_clinical file as found with the Roslin manifests, plus the QC sample summary with coverages
+    rng = random.Random(seed)
+    with open(clinical_path, 'w') as clinical_file, open(sample_summary_path, 'w') as summary_file:
+        clinical_file.write('\t'.join(['SAMPLE_ID', 'PATIENT_ID', 'COLLAB_ID', 'SAMPLE_TYPE', 'GENE_PANEL', 'ONCOTREE_CODE',
+            'SAMPLE_CLASS', 'SPECIMEN_PRESERVATION_TYPE', 'SEX', 'TISSUE_SITE']) + '\n')
+        summary_file.write('\t'.join(['Sample', 'Coverage', 'Duplication', 'Library_Size']) + '\n')
+        for sample in range(rows):
+            sample_id = 's_C_%06i_T001_d' % sample
+            clinical_file.write('\t'.join([sample_id, 'p_C_%06i' % (sample // 2), 'COLLAB-%i' % sample,
+                rng.choice(['Primary', 'Metastasis']), 'IMPACT468', rng.choice(['LUAD', 'BRCA', 'COADREAD', 'PAAD']), 'Tumor',
+                rng.choice(['FFPE', 'Frozen']), rng.choice(['M', 'F']), rng.choice(['Lung', 'Breast', 'Colon', 'Liver'])]) + '\n')
+            summary_file.write('\t'.join([sample_id, str(rng.randint(100, 900)), '%.3f' % rng.random(), str(rng.randint(10**6, 10**8))]) + '\n')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic MAF, fusion and clinical files for benchmarks")
+    parser.add_argument('--output_directory', required=True, help='Directory to write the synthetic files to')
+    parser.add_argument('--rows', type=int, required=True, help='Number of MAF and fusion rows to generate')
+    parser.add_argument('--pairs', type=int, default=1, help='Number of per-pair MAFs to spread the MAF rows over')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the random generator')
+    parser.add_argument('--known_fusions', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+        'setup', 'bin', 'known_fusions_at_mskcc.txt'), help='The list of known fusions to draw fusion partners from')
+    args = parser.parse_args()
+    if not os.path.exists(args.output_directory):
+        os.makedirs(args.output_directory)
+    generate_maf(os.path.join(args.output_directory, 'synthetic.muts.maf'), args.rows, args.seed, args.pairs)
+    generate_fusions(os.path.join(args.output_directory, 'synthetic.svs.pass.vep.portal.txt'), args.rows, args.seed, args.known_fusions)
+    generate_clinical(os.path.join(args.output_directory, 'synthetic_data_clinical.txt'),
+        os.path.join(args.output_directory, 'synthetic_SampleSummary.txt'), max(args.rows // 100, 1), args.seed)
@@ -0,0 +1,15 @@
+import shutil
+import tempfile
+
+# A scratch directory for each test, set up with @with_setup(make_work_dir, remove_work_dir). Tests read it as
+# fixtures.work_dir, since it is rebound for every test
+work_dir = None
+
+
+def make_work_dir():
+    global work_dir
+    work_dir = tempfile.mkdtemp()
+
+
+def remove_work_dir():
+    shutil.rmtree(work_dir)
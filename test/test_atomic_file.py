@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+from nose.tools import with_setup
+import fixtures
+from fixtures import make_work_dir
+from fixtures import remove_work_dir
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import atomic_file
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_write_json_creates_directory_and_replaces_file():
+    "write_json creates the missing directory, replaces an older file, and leaves no temp file behind"
+
+    cache_file = os.path.join(fixtures.work_dir, ".roslin", "cache.json")
+    atomic_file.write_json(cache_file, {"version": 1})
+    atomic_file.write_json(cache_file, {"version": 2})
+    assert_equals(json.load(open(cache_file)), {"version": 2})
+    assert_equals(os.listdir(os.path.dirname(cache_file)), ["cache.json"])
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_failed_write_keeps_old_file():
+    "a with block that raises leaves the old file as it was, and removes its temp file"
+
+    output_path = os.path.join(fixtures.work_dir, "index.idx")
+    with open(output_path, "wb") as output_file:
+        output_file.write("old")
+
+    def write_partly():
+        with atomic_file.atomic_write(output_path, "wb") as output_file:
+            output_file.write("partial")
+            raise IOError("disk full")
+
+    assert_raises(IOError, write_partly)
+    assert_equals(open(output_path).read(), "old")
+    assert_equals(os.listdir(fixtures.work_dir), ["index.idx"])
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_hidden_temp_file():
+    "a hidden write goes through a dot-prefixed temp file in the same directory"
+
+    output_path = os.path.join(fixtures.work_dir, "data_CNA.txt")
+    with atomic_file.atomic_write(output_path, "wb", hidden=True) as output_file:
+        assert_equals(output_file.name, os.path.join(fixtures.work_dir, ".data_CNA.txt.%i.tmp" % os.getpid()))
+        output_file.write("Hugo_Symbol\n")
+    assert_equals(os.listdir(fixtures.work_dir), ["data_CNA.txt"])
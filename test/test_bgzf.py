@@ -0,0 +1,63 @@
+import os
+import sys
+import zlib
+import gzip
+import random
+import struct
+from nose.tools import assert_equals
+from nose.tools import with_setup
+import fixtures
+from fixtures import make_work_dir
+from fixtures import remove_work_dir
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import bgzf
+
+
+def mixed_data(size, seed=7):
+    # Random bytes that deflate can't shrink, alternating with repetitive MAF-like lines that it shrinks a lot
+    rng = random.Random(seed)
+    chunks = []
+    while sum(len(chunk) for chunk in chunks) < size:
+        chunks.append("".join(chr(rng.randint(0, 255)) for _ in range(rng.randint(1000, 30000))))
+        chunks.append("TP53\t7157\tmskcc.org\tGRCh37\t17\t7577120\tMissense_Mutation\n" * rng.randint(10, 500))
+    return "".join(chunks)[:size]
+
+
+def read_blocks(path):
+    # Walk the file block by block through the BSIZE of each block's BC extra field. Returns (size, data) per block
+    with open(path, "rb") as bgzf_file:
+        content = bgzf_file.read()
+    blocks = []
+    offset = 0
+    while offset < len(content):
+        magic, flags, extra_length, subfield_id, subfield_length, bsize = struct.unpack("<3sB6xH2sHH", content[offset:offset + 18])
+        assert_equals((magic, flags, extra_length, subfield_id, subfield_length), ("\x1f\x8b\x08", 4, 6, "BC", 2))
+        block = content[offset:offset + bsize + 1]
+        data = zlib.decompress(block[18:-8], -15)
+        assert_equals(struct.unpack("<2I", block[-8:]), (zlib.crc32(data) & 0xffffffff, len(data)))
+        blocks.append((len(block), data))
+        offset += bsize + 1
+    assert_equals(offset, len(content))
+    return content, blocks
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_blocks_fit_bgzf_limit():
+    "every block of a BGZF file fits in 64KB, the file ends with the EOF block, and it decompresses to the input"
+
+    data = mixed_data(5 * bgzf.BGZF_BLOCK_SIZE + 12345)
+    for threads in (1, 3):
+        path = os.path.join(fixtures.work_dir, "analyst.maf.gz")
+        with bgzf.open_output(path, threads) as output_file:
+            # Uneven writes, so blocks are cut across write boundaries
+            for offset in range(0, len(data), 40000):
+                output_file.write(data[offset:offset + 40000])
+        content, blocks = read_blocks(path)
+        assert_equals(content.endswith(bgzf.BGZF_EOF), True)
+        assert_equals(blocks[-1], (len(bgzf.BGZF_EOF), ""))
+        assert_equals(len(blocks), 6 + 1)
+        assert_equals(max(size for size, block_data in blocks) <= 65536, True)
+        assert_equals([len(block_data) for size, block_data in blocks[:-2]], [bgzf.BGZF_BLOCK_SIZE] * 5)
+        assert_equals("".join(block_data for size, block_data in blocks), data)
+        assert_equals(gzip.open(path, "rb").read(), data)
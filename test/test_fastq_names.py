@@ -0,0 +1,43 @@
+import os
+import sys
+from nose.tools import assert_equals
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import fastq_names
+
+
+def test_illumina_names_take_the_fast_path():
+    "names in the Illumina layout are split without the regexes"
+
+    fastq_name = fastq_names.split_illumina_name("s_C_000001_T001_d_IGO_01234_B_1_S12_L003_R2_001.fastq.gz")
+    assert_equals(fastq_name, ("s", "C_000001_T001_d_IGO_01234_B_1_S12", None, "L003", "R2", "001"))
+    assert_equals(fastq_name.readset, "sL003001")
+    assert_equals(fastq_names.parse_fastq_name("s_C_000001_T001_d_IGO_01234_B_1_S12_L003_R2_001.fastq.gz"), fastq_name)
+
+
+def test_other_names_fall_back_to_the_regexes():
+    "names in the layout with the read after the set, or in no known layout, are left to the regexes"
+
+    base = "PITT_0123_ACGTACGT_H3KCLBBXX_L004_001.R1.fastq.gz"
+    assert_equals(fastq_names.split_illumina_name(base), None)
+    fastq_name = fastq_names.parse_fastq_name(base)
+    assert_equals(fastq_name, ("PITT", "0123_ACGTACGT", "H3KCLBBXX", "L004", "R1", "001"))
+    assert_equals(fastq_name.readset, "PITTL004H3KCLBBXX001")
+    assert_equals(fastq_names.parse_fastq_name("P1_R1.fastq.gz"), None)
+    assert_equals(fastq_names.parse_fastq_name("s_C_000001_T001_d_L001_R1_0001.fastq.gz"), None)
+
+
+def test_fast_path_matches_the_regexes():
+    "the fast path gives the same parts as the regexes, or declines the name"
+
+    fast_path_names = 0
+    for base in ["a_b_R1_R2_001.fastq.gz", "s___L001_R1_001.fastq.gz", "s_x.fastq.gz_L001_R1_001.fastq.gz",
+                 "s_b_L001_R1_001_L002_R2_002.fastq.gz", "s_b_L 001_R1_001.fastq.gz", "_s_b_L001_R1_001.fastq.gz",
+                 "s_b_L001_R1_00a.fastq.gz", "s_L001_R1_001.fastq.gz"]:
+        m = fastq_names.illumina_name.search(base)
+        expected = tuple(m.group(part) for part in fastq_names.FastqName._fields) if m and m.group("set") else None
+        fastq_name = fastq_names.split_illumina_name(base)
+        if fastq_name is not None:
+            assert_equals(fastq_name, expected)
+            fast_path_names += 1
+    assert_equals(fast_path_names, 4)
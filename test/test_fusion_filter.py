@@ -0,0 +1,62 @@
+import os
+import sys
+from nose.tools import assert_equals
+from nose.tools import with_setup
+import fixtures
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import fusion_filter
+import fusion_index
+
+HEADER = "Hugo_Symbol\tEntrez_Gene_Id\tTumor_Sample_Barcode\tFusion\tMethod\n"
+
+default_index_directory = fusion_index.DEFAULT_INDEX_DIRECTORY
+
+
+def make_work_dir():
+    # Keep the indexes of the test's known fusion lists out of the user's cache
+    fixtures.make_work_dir()
+    fusion_index.DEFAULT_INDEX_DIRECTORY = os.path.join(fixtures.work_dir, "index")
+
+
+def remove_work_dir():
+    fusion_index.DEFAULT_INDEX_DIRECTORY = default_index_directory
+    fixtures.remove_work_dir()
+
+
+def write_file(file_name, lines):
+    path = os.path.join(fixtures.work_dir, file_name)
+    with open(path, "w") as output_file:
+        output_file.write("".join(lines))
+    return path
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_rejected_fusion_is_dropped_from_every_pair():
+    "a fusion rejected on one row of one pair is removed from the rows of every pair, in any worker count"
+
+    known_fusions_file = write_file("known_fusions_at_mskcc.txt", ["EML4-ALK\n", "KIF5B-RET\n"])
+    # EML4-ALK has a gene without an Entrez ID in the first pair, which rejects it in the second pair too
+    first_pair = write_file("p1.svs.pass.vep.portal.txt", [HEADER,
+        "EML4\t0\tt1\tEML4-ALK fusion\tDelly\n",
+        "ALK\t238\tt1\tEML4-ALK fusion\tDelly\n",
+        "KIF5B\t3799\tt1\tKIF5B-RET fusion\tDelly\n",
+        "RET\t5979\tt1\tKIF5B-RET fusion\tDelly\n"])
+    second_pair = write_file("p2.svs.pass.vep.portal.txt", [HEADER,
+        "EML4\t27436\tt2\tEML4-ALK fusion\tDelly\n",
+        "ALK\t238\tt2\tEML4-ALK fusion\tDelly\n",
+        "TP53\t7157\tt2\tTP53-GENE1 fusion\tDelly\n",
+        "KIF5B\t3799\tt2\tKIF5B-RET fusion\tDelly\n"])
+    expected = (HEADER
+        + "KIF5B\t3799\tt1\tKIF5B-RET fusion\tDelly\n"
+        + "RET\t5979\tt1\tKIF5B-RET fusion\tDelly\n"
+        + "KIF5B\t3799\tt2\tKIF5B-RET fusion\tDelly\n")
+    for workers in (1, 2):
+        output_file = os.path.join(fixtures.work_dir, "data_fusions.txt")
+        fusion_filter.filter_fusions([first_pair, second_pair], output_file, known_fusions_file, workers=workers)
+        assert_equals(open(output_file).read(), expected)
+        fusion_filter.filter_fusions([second_pair, first_pair], output_file, known_fusions_file, workers=workers)
+        assert_equals(open(output_file).read(), HEADER
+            + "KIF5B\t3799\tt2\tKIF5B-RET fusion\tDelly\n"
+            + "KIF5B\t3799\tt1\tKIF5B-RET fusion\tDelly\n"
+            + "RET\t5979\tt1\tKIF5B-RET fusion\tDelly\n")
@@ -0,0 +1,88 @@
+import os
+import sys
+from nose.tools import assert_equals
+from nose.tools import with_setup
+import fixtures
+from fixtures import make_work_dir
+from fixtures import remove_work_dir
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import fusion_index
+
+
+def write_known_fusions(path, fusions, mtime):
+    with open(path, "w") as known_fusions:
+        known_fusions.write("".join(fusion + "\n" for fusion in fusions))
+    os.utime(path, (mtime, mtime))
+
+
+def is_known(known_fusions_file, index_file, fusion, reciprocal=False, intragenic=False):
+    index = fusion_index.load_known_fusion_index(known_fusions_file, index_file)
+    try:
+        return index.is_known(fusion, reciprocal, intragenic)
+    finally:
+        index.close()
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_stale_index_is_rebuilt():
+    "an index built from an older list is rebuilt once the list changes, even when its size stays the same"
+
+    known_fusions_file = os.path.join(fixtures.work_dir, "known_fusions_at_mskcc.txt")
+    index_file = os.path.join(fixtures.work_dir, "cache", "known_fusions.idx")
+    write_known_fusions(known_fusions_file, ["EML4-ALK"], 1000000000)
+    assert_equals(is_known(known_fusions_file, index_file, "EML4-ALK"), True)
+    assert_equals(fusion_index.index_is_current(known_fusions_file, index_file), True)
+
+    write_known_fusions(known_fusions_file, ["KIF5B-RET"], 1000000100)
+    assert_equals(fusion_index.index_is_current(known_fusions_file, index_file), False)
+    assert_equals(is_known(known_fusions_file, index_file, "EML4-ALK"), False)
+    assert_equals(is_known(known_fusions_file, index_file, "KIF5B-RET"), True)
+    assert_equals(fusion_index.index_is_current(known_fusions_file, index_file), True)
+    assert_equals(os.listdir(os.path.dirname(index_file)), ["known_fusions.idx"])
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_unwritable_index_is_built_in_memory():
+    "when the index can't be written, lookups still work from an index built in memory"
+
+    known_fusions_file = os.path.join(fixtures.work_dir, "known_fusions_at_mskcc.txt")
+    write_known_fusions(known_fusions_file, ["EML4-ALK"], 1000000000)
+    # A file where the index directory should be makes the write fail, even when running as root
+    blocking_file = os.path.join(fixtures.work_dir, "cache")
+    open(blocking_file, "w").close()
+    assert_equals(is_known(known_fusions_file, os.path.join(blocking_file, "known_fusions.idx"), "EML4-ALK"), True)
+
+
+def test_default_index_file_is_per_list():
+    "lists with the same name in different installs get different indexes in the user's cache"
+
+    first_index = fusion_index.default_index_file("/opt/roslin/2.4/bin/known_fusions_at_mskcc.txt")
+    second_index = fusion_index.default_index_file("/opt/roslin/2.5/bin/known_fusions_at_mskcc.txt")
+    assert_equals(os.path.dirname(first_index), fusion_index.DEFAULT_INDEX_DIRECTORY)
+    assert_equals(os.path.basename(first_index).startswith("known_fusions_at_mskcc.txt."), True)
+    assert_equals(first_index == second_index, False)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_hyphenated_gene_names():
+    "reciprocal and intragenic lookups try every hyphen as the break between partners like CDKN2A and CDKN2A-DT"
+
+    known_fusions_file = os.path.join(fixtures.work_dir, "known_fusions_at_mskcc.txt")
+    index_file = os.path.join(fixtures.work_dir, "known_fusions.idx")
+    write_known_fusions(known_fusions_file, ["CDKN2A-CDKN2A-DT", "EML4-ALK"], 1000000000)
+
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-CDKN2A-DT"), True)
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-DT-CDKN2A"), False)
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-DT-CDKN2A", reciprocal=True), True)
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-DT-CDKN2A", intragenic=True), False)
+
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-DT-CDKN2A-DT"), False)
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-DT-CDKN2A-DT", intragenic=True), True)
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-CDKN2A", intragenic=True), True)
+    assert_equals(is_known(known_fusions_file, index_file, "CDKN2A-CDKN2A", reciprocal=True), False)
+
+    assert_equals(is_known(known_fusions_file, index_file, "ALK-EML4", reciprocal=True), True)
+    assert_equals(is_known(known_fusions_file, index_file, "ALK-ALK", intragenic=True), True)
+    assert_equals(is_known(known_fusions_file, index_file, "TP53-TP53", intragenic=True), False)
+    assert_equals(is_known(known_fusions_file, index_file, "ALK-EML4", intragenic=True), False)
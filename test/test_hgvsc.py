@@ -0,0 +1,67 @@
+import os
+import sys
+from nose.tools import assert_equals
+from nose.tools import assert_is_none
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import hgvsc
+
+
+def test_intronic_snv():
+    "donor and acceptor side SNVs give their own offset"
+
+    assert_equals(hgvsc.splice_distance("c.1234+2T>G"), 2)
+    assert_equals(hgvsc.splice_distance("c.1234-5A>G"), 5)
+    assert_equals(hgvsc.splice_distance("n.45-7C>T"), 7)
+
+
+def test_indel_ranges():
+    "indels with both ends in the intron use the end nearest the splice junction"
+
+    assert_equals(hgvsc.intron_offsets("c.1234-5_1234-2delAGTC"), (5, 2))
+    assert_equals(hgvsc.splice_distance("c.1234-5_1234-2delAGTC"), 2)
+    assert_equals(hgvsc.splice_distance("c.1234+1_1234+4del"), 1)
+    assert_equals(hgvsc.splice_distance("c.1234+2_1234+3insA"), 2)
+    assert_equals(hgvsc.splice_distance("c.1234+3_1234+3dup"), 3)
+    assert_equals(hgvsc.splice_distance("c.1234-12_1234-10delinsTT"), 10)
+
+
+def test_indel_ranges_into_exon():
+    "ranges from an intronic start into the exon only use the start, and exonic starts don't parse"
+
+    assert_equals(hgvsc.intron_offsets("c.1234+2_1235del"), (2,))
+    assert_equals(hgvsc.splice_distance("c.1234+2_1235del"), 2)
+    assert_is_none(hgvsc.splice_distance("c.1233_1234+2del"))
+
+
+def test_non_intronic():
+    "exonic, UTR and empty HGVSc values have no splice distance"
+
+    assert_is_none(hgvsc.splice_distance("c.1234A>G"))
+    assert_is_none(hgvsc.splice_distance("c.-14+3G>A"))
+    assert_is_none(hgvsc.splice_distance("c.*12+3G>A"))
+    assert_is_none(hgvsc.splice_distance(""))
+
+
+def test_lru_memoize_evicts_least_recently_used():
+    "a hit keeps a key in the cache, and the oldest unused key is evicted"
+
+    calls = []
+
+    @hgvsc.lru_memoize(2)
+    def square(value):
+        calls.append(value)
+        return value * value
+
+    assert_equals(square(2), 4)
+    assert_equals(square(3), 9)
+    assert_equals(square(2), 4)
+    assert_equals(square(4), 16)
+    assert_equals(square.cache_size(), 2)
+    assert_equals(square(2), 4)
+    assert_equals(square(3), 9)
+    assert_equals(calls, [2, 3, 4, 3])
+    square.cache_clear()
+    assert_equals(square.cache_size(), 0)
+    assert_equals(square(2), 4)
+    assert_equals(calls, [2, 3, 4, 3, 2])
@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+from nose.tools import assert_equals
+from nose.tools import with_setup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import roslin_executor
+
+# Stand-ins for the LSF commands. bsub numbers its jobs from 101 and logs its arguments. bjobs logs the job ids it
+# is asked about, and prints poll.<n>.out and poll.<n>.err on its nth call, like a scheduler whose jobs move on
+# between polls
+BSUB_STUB = """#!/bin/sh
+dir=$(dirname "$0")
+job_id=$(($(cat "$dir/bsub.count" 2>/dev/null || echo 100) + 1))
+echo $job_id > "$dir/bsub.count"
+echo "$@" >> "$dir/bsub.log"
+echo "Job <$job_id> is submitted to default queue <normal>."
+"""
+BJOBS_STUB = """#!/bin/sh
+dir=$(dirname "$0")
+poll=$(($(cat "$dir/bjobs.count" 2>/dev/null || echo 0) + 1))
+echo $poll > "$dir/bjobs.count"
+shift 3
+echo "$@" >> "$dir/bjobs.log"
+cat "$dir/poll.$poll.out" 2>/dev/null
+cat "$dir/poll.$poll.err" >&2 2>/dev/null
+exit 0
+"""
+
+work_dir = None
+stub_dir = None
+original_path = None
+original_sleep = time.sleep
+sleeps = []
+
+
+def record_sleep(seconds):
+    # The monitor's sleeps are recorded instead of slept, and a monitor that never finishes fails the test
+    sleeps.append(seconds)
+    if len(sleeps) > 20:
+        raise AssertionError("The monitor is still waiting after 20 polls")
+
+
+def setup_stubs():
+    global work_dir, stub_dir, original_path
+    work_dir = tempfile.mkdtemp()
+    stub_dir = os.path.join(work_dir, "bin")
+    os.mkdir(stub_dir)
+    for command, stub in (("bsub", BSUB_STUB), ("bjobs", BJOBS_STUB)):
+        with open(os.path.join(stub_dir, command), "w") as stub_file:
+            stub_file.write(stub)
+        os.chmod(os.path.join(stub_dir, command), 0o755)
+    original_path = os.environ["PATH"]
+    os.environ["PATH"] = stub_dir + os.pathsep + original_path
+    del sleeps[:]
+    time.sleep = record_sleep
+
+
+def remove_stubs():
+    time.sleep = original_sleep
+    os.environ["PATH"] = original_path
+    shutil.rmtree(work_dir)
+
+
+def schedule_polls(polls):
+    # polls is a list of (stdout, stderr) of each bjobs call
+    for poll, (stdout, stderr) in enumerate(polls, 1):
+        with open(os.path.join(stub_dir, "poll.%i.out" % poll), "w") as out_file:
+            out_file.write(stdout)
+        with open(os.path.join(stub_dir, "poll.%i.err" % poll), "w") as err_file:
+            err_file.write(stderr)
+
+
+def read_log(log_name):
+    with open(os.path.join(stub_dir, log_name)) as log_file:
+        return [line.rstrip("\n") for line in log_file]
+
+
+@with_setup(setup_stubs, remove_stubs)
+def test_monitor_waits_for_every_job():
+    "wait returns once every job is final, with a result per job, only querying jobs that are still active"
+
+    schedule_polls([
+        ("101,PEND,-\n102,PEND,-\n103,PEND,-\n", ""),
+        ("101,RUN,-\n102,RUN,-\n", "Job <103> is not found\n"),
+        ("101,DONE,-\n102,RUN,-\n", ""),
+        ("102,EXIT,3\n", ""),
+    ])
+    jobs = {"101": ("MAF data generation", 1000.0), "102": ("Fusion data generation", 1001.0), "103": ("Segmented data", 1002.0)}
+    monitor = roslin_executor.LsfJobMonitor(jobs, min_interval=2, max_interval=60, backoff=1.5)
+    results = monitor.wait()
+    assert_equals([sorted(query.split()) for query in read_log("bjobs.log")],
+                  [["101", "102", "103"], ["101", "102", "103"], ["101", "102"], ["102"]])
+    assert_equals([(result.job_id, result.name, result.state, result.exit_code) for result in results], [
+        ("101", "MAF data generation", "DONE", "0"),
+        ("102", "Fusion data generation", "EXIT", "3"),
+        ("103", "Segmented data", "UNKNOWN", None)])
+    for result in results:
+        assert_equals(result.end_time is not None, True)
+    assert_equals([result.start_time is not None for result in results], [True, True, False])
+    assert_equals(roslin_executor.jobs_exit_status(results), 1)
+
+
+@with_setup(setup_stubs, remove_stubs)
+def test_monitor_backs_off_while_nothing_changes():
+    "the poll interval grows by the backoff up to its maximum while no job changes, and resets on any change"
+
+    schedule_polls([("101,PEND,-\n", "")] * 4 + [("101,RUN,-\n", ""), ("101,RUN,-\n", ""), ("101,DONE,-\n", "")])
+    monitor = roslin_executor.LsfJobMonitor({"101": ("MAF data generation", 1000.0)}, min_interval=2, max_interval=5, backoff=2)
+    results = monitor.wait()
+    assert_equals(sleeps, [4, 5, 5, 5, 2, 4])
+    assert_equals([result.state for result in results], ["DONE"])
+
+
+@with_setup(setup_stubs, remove_stubs)
+def test_not_found_job_is_unknown():
+    "a job that LSF no longer knows about ends the wait as UNKNOWN, which is reported as an unknown status"
+
+    schedule_polls([("", "Job <101> is not found\n")])
+    monitor = roslin_executor.LsfJobMonitor({"101": ("MAF data generation", 1000.0)})
+    results = monitor.wait()
+    assert_equals([(result.state, result.exit_code, result.start_time) for result in results], [("UNKNOWN", None, None)])
+    assert_equals(roslin_executor.jobs_exit_status(results), 2)
+    assert_equals(sleeps, [])
+
+
+@with_setup(setup_stubs, remove_stubs)
+def test_executor_submits_and_waits_with_bsub_and_bjobs():
+    "jobs are submitted with bsub, and a later wait doesn't query the jobs an earlier one saw finish"
+
+    schedule_polls([("101,RUN,-\n102,RUN,-\n", ""), ("101,DONE,-\n102,RUN,-\n", ""), ("102,DONE,-\n", "")])
+    executor = roslin_executor.LsfExecutor(walltime="0:30")
+    first = executor.submit("MAF data generation", "python maf_filter.py", os.path.join(work_dir, "maf.log"), cores=4)
+    second = executor.submit("Fusion data generation", "python fusion_filter.py", os.path.join(work_dir, "fusion.log"))
+    assert_equals((first, second), ("101", "102"))
+    assert_equals(read_log("bsub.log"), [
+        "-R span[hosts=1] -n 4 -We 0:30 -oo %s python maf_filter.py" % os.path.join(work_dir, "maf.log"),
+        "-We 0:30 -oo %s python fusion_filter.py" % os.path.join(work_dir, "fusion.log")])
+    assert_equals(executor.wait([first], "MAF data"), 0)
+    assert_equals(executor.wait([first, second], "all data"), 0)
+    assert_equals(read_log("bjobs.log"), ["101", "101", "102"])
+    assert_equals([executor.results[job_id].state for job_id in (first, second)], ["DONE", "DONE"])
+    executor.shutdown()
@@ -0,0 +1,187 @@
+import os
+import re
+import csv
+import sys
+import gzip
+import shutil
+from StringIO import StringIO
+from nose.tools import assert_equals
+from nose.tools import with_setup
+import fixtures
+from fixtures import make_work_dir
+from fixtures import remove_work_dir
+
+test_directory = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(test_directory, os.pardir, "setup", "bin"))
+sys.path.insert(0, os.path.join(test_directory, "benchmark"))
+import maf_filter
+import synthetic_data
+
+VERSION_STRING = "roslin:_2.4.0"
+RULES = maf_filter.load_filter_rules(os.path.join(test_directory, os.pardir, "setup", "bin", "maf_filter_rules.json"))
+
+
+def legacy_filter_maf(input_files, is_impact):
+    # How maf_filter.py filtered the MAFs before the rules were moved into MafFilter, on the per-pair MAFs combined
+    # with grep like roslin_analysis_helper did, and returning the (analyst, portal) MAFs as strings
+    combined_lines = []
+    for input_file in input_files:
+        with open(input_file, "rb") as input_maf:
+            for line in input_maf:
+                if line.startswith("Hugo") and not combined_lines or not line.startswith(("Hugo", "#")):
+                    combined_lines.append(line)
+    input_maf, analyst_maf, portal_maf = StringIO("".join(combined_lines)), StringIO(), StringIO()
+    roslin_version_line = "# Versions: " + VERSION_STRING.replace('_', ' ') + "\n"
+    header = input_maf.readline().strip('\r\n').split('\t')
+    analyst_maf.write(roslin_version_line)
+    portal_maf.write(roslin_version_line)
+    analyst_maf.write('\t'.join(header) + '\n')
+    header[header.index('HGVSp_Short')] = 'Amino_Acid_Change'
+    portal_maf.write('\t'.join(header[0:45]) + '\n')
+    gene_col = header.index('Hugo_Symbol')
+    entrez_id_col = header.index('Entrez_Gene_Id')
+    pos_col = header.index('Start_Position')
+    hgvsc_col = header.index('HGVSc')
+    mut_status_col = header.index('Mutation_Status')
+    csq_col = header.index('Consequence')
+    filter_col = header.index('FILTER')
+    hotspot_col = header.index('hotspot_whitelist')
+    tad_col = header.index('t_alt_count')
+    tdp_col = header.index('t_depth')
+    set_col = header.index('set')
+    for line in csv.reader(input_maf, delimiter='\t'):
+        if line[mut_status_col] == 'None' or line[filter_col] != 'PASS' and line[filter_col] != 'common_variant':
+            continue
+        if line[set_col] == 'Pindel':
+            continue
+        splice_dist = 0
+        if re.match(r'splice_region_variant', line[csq_col]) is not None:
+            if re.search(r'non_coding_', line[csq_col]) is not None:
+                continue
+            m = re.match(r'[nc]\.\d+[-+](\d+)_\d+[-+](\d+)|[nc]\.\d+[-+](\d+)', line[hgvsc_col])
+            if m is not None:
+                splice_dist = min(int(d) for d in [x for x in m.group(1, 2, 3) if x is not None])
+                if splice_dist > 3:
+                    continue
+        csq_keep = ['missense_', 'stop_', 'frameshift_', 'splice_', 'inframe_', 'protein_altering_',
+            'start_', 'synonymous_', 'coding_sequence_', 'transcript_', 'exon_', 'initiator_codon_',
+            'disruptive_inframe_', 'conservative_missense_', 'rare_amino_acid_', 'mature_miRNA_', 'TFBS_']
+        if re.match(r'|'.join(csq_keep), line[csq_col]) is not None or (line[gene_col] == 'TERT' and int(line[pos_col]) >= 1295141 and int(line[pos_col]) <= 1295340):
+            tumor_vaf = float(line[tad_col]) / float(line[tdp_col]) if line[tdp_col] else 0
+            if is_impact and (int(line[tdp_col]) < 20 or int(line[tad_col]) < 8 or tumor_vaf < 0.02 or (line[hotspot_col] == 'FALSE' and (int(line[tad_col]) < 10 or tumor_vaf < 0.05))):
+                continue
+            analyst_maf.write('\t'.join(line) + '\n')
+            if re.match(r'synonymous_|stop_retained_', line[csq_col]) is None and line[entrez_id_col] != 0 and splice_dist <= 2:
+                portal_maf.write('\t'.join(line[0:45]) + '\n')
+    return analyst_maf.getvalue(), portal_maf.getvalue()
+
+
+def generate_pair_mafs(rows=900, pairs=3, seed=7):
+    return synthetic_data.generate_maf(os.path.join(fixtures.work_dir, "synthetic.muts.maf"), rows, seed, pairs)
+
+
+def run_filter(input_files, is_impact, analyst_name="analyst.maf", **options):
+    # Returns the (analyst, portal) MAFs as strings, and the stats of the run
+    analyst_file = os.path.join(fixtures.work_dir, analyst_name)
+    portal_file = os.path.join(fixtures.work_dir, "portal.maf")
+    stats = maf_filter.filter_mafs(input_files, VERSION_STRING, is_impact, analyst_file, portal_file, RULES, **options)
+    open_analyst = gzip.open if analyst_file.endswith(".gz") else open
+    with open_analyst(analyst_file, "rb") as analyst_maf, open(portal_file, "rb") as portal_maf:
+        return (analyst_maf.read(), portal_maf.read()), stats
+
+
+def rewrite_lines(path, rewrite):
+    # Apply rewrite to each data line of a MAF, like a MAF from another tool would differ in quoting or line endings
+    with open(path, "rb") as input_maf:
+        lines = input_maf.readlines()
+    with open(path, "wb") as output_maf:
+        for line_index, line in enumerate(lines):
+            output_maf.write(line if line.startswith(("#", "Hugo")) else rewrite(line_index, line))
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_matches_legacy_filter():
+    "the analyst and portal MAFs match the legacy filter, with and without the IMPACT cutoffs"
+
+    input_files = generate_pair_mafs()
+    for is_impact in (True, False):
+        outputs, stats = run_filter(input_files, is_impact)
+        assert_equals(outputs, legacy_filter_maf(input_files, is_impact))
+        assert_equals(stats["rows_read"], 900)
+        assert_equals(stats["analyst_rows"], outputs[0].count("\n") - 2)
+        assert_equals(stats["portal_rows"], outputs[1].count("\n") - 2)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_workers_match_legacy_filter():
+    "filtering the MAFs in shards over several processes gives the same MAFs and counts as one process"
+
+    input_files = generate_pair_mafs()
+    outputs, stats = run_filter(input_files, True, workers=3)
+    assert_equals(outputs, legacy_filter_maf(input_files, True))
+    single_process_stats = run_filter(input_files, True)[1]
+    for key in ("rows_read", "analyst_rows", "portal_rows", "rejections", "portal_exclusions"):
+        assert_equals(stats[key], single_process_stats[key])
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_cache_reuses_and_prunes_entries():
+    "a cached rerun only refilters the changed MAFs, and drops the entries of MAFs that left the run"
+
+    input_files = generate_pair_mafs()
+    cache_dir = os.path.join(fixtures.work_dir, "cache")
+    expected = legacy_filter_maf(input_files, True)
+    outputs, stats = run_filter(input_files, True, cache_dir=cache_dir)
+    assert_equals(outputs, expected)
+    assert_equals((stats["cache_hits"], stats["cache_misses"]), (0, 3))
+
+    outputs, stats = run_filter(input_files, True, cache_dir=cache_dir, workers=2)
+    assert_equals(outputs, expected)
+    assert_equals((stats["cache_hits"], stats["cache_misses"]), (3, 0))
+    assert_equals(stats["rows_read"], 900)
+
+    rewrite_lines(input_files[1], lambda line_index, line: line.replace("\tSOMATIC\t", "\tNone\t"))
+    outputs, stats = run_filter(input_files, True, cache_dir=cache_dir)
+    assert_equals(outputs, legacy_filter_maf(input_files, True))
+    assert_equals((stats["cache_hits"], stats["cache_misses"]), (2, 1))
+    assert_equals(len(os.listdir(cache_dir)), 3 * len(maf_filter.CACHE_ENTRY_SUFFIXES))
+
+    outputs, stats = run_filter(input_files[:1], True, cache_dir=cache_dir)
+    assert_equals(outputs, legacy_filter_maf(input_files[:1], True))
+    assert_equals((stats["cache_hits"], stats["cache_misses"]), (1, 0))
+    assert_equals(len(os.listdir(cache_dir)), len(maf_filter.CACHE_ENTRY_SUFFIXES))
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_gzipped_input_and_output():
+    "gzipped per-pair MAFs are read like plain ones, and a .gz analyst MAF holds the same rows"
+
+    input_files = generate_pair_mafs()
+    expected = legacy_filter_maf(input_files, False)
+    gzipped_file = input_files[0] + ".gz"
+    with open(input_files[0], "rb") as plain_maf, gzip.open(gzipped_file, "wb") as gzipped_maf:
+        shutil.copyfileobj(plain_maf, gzipped_maf)
+    outputs = run_filter([gzipped_file] + input_files[1:], False, analyst_name="analyst.maf.gz", workers=2)[0]
+    assert_equals(outputs, expected)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_crlf_and_quoted_lines():
+    "lines with carriage returns or quoted fields are parsed like the csv module did, on every code path"
+
+    input_files = generate_pair_mafs()
+
+    def rewrite(line_index, line):
+        if line_index % 5 == 0:
+            return line[:-1] + "\r\n"
+        if line_index % 7 == 0:
+            return line.replace("\tmskcc.org\t", '\t"mskcc.org"\t')
+        return line
+
+    for input_file in input_files:
+        rewrite_lines(input_file, rewrite)
+    for is_impact in (True, False):
+        expected = legacy_filter_maf(input_files, is_impact)
+        assert_equals(run_filter(input_files, is_impact)[0], expected)
+        assert_equals(run_filter(input_files, is_impact, workers=3)[0], expected)
+        assert_equals(run_filter(input_files, is_impact, cache_dir=os.path.join(fixtures.work_dir, "cache"))[0], expected)
@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import BaseHTTPServer
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+from nose.tools import with_setup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import oncotree_cache
+
+TUMOR_TYPES = {"data": [{"code": "LUAD", "name": "Lung Adenocarcinoma", "mainType": {"name": "Non-Small Cell Lung Cancer"}},
+                        {"code": "BRCA", "name": "Invasive Breast Carcinoma", "mainType": {"name": "Breast Cancer"}}]}
+
+
+class OncoTreeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    "stands in for the OncoTree API, counting its requests"
+
+    requests = 0
+
+    def do_GET(self):
+        OncoTreeHandler.requests += 1
+        body = json.dumps(TUMOR_TYPES)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+server = None
+server_url = None
+work_dir = None
+
+
+def start_server():
+    global server, server_url, work_dir
+    server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), OncoTreeHandler)
+    server_url = "http://127.0.0.1:%i/oncotree/api/tumorTypes?flat=true&deprecated=false" % server.server_port
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+    OncoTreeHandler.requests = 0
+    work_dir = tempfile.mkdtemp()
+
+
+def stop_server():
+    if server is not None:
+        server.shutdown()
+        server.server_close()
+    shutil.rmtree(work_dir)
+
+
+def stop_server_now():
+    "take the stand-in server down, so that any request to it fails"
+
+    global server
+    server.shutdown()
+    server.server_close()
+    server = None
+
+
+@with_setup(start_server, stop_server)
+def test_fetch_indexes_by_code_and_writes_cache():
+    "the first lookup fetches the table, indexes it by code, and caches it"
+
+    cache_file = os.path.join(work_dir, "cache", "oncotree.json")
+    tumor_types = oncotree_cache.load_tumor_types(cache_file, url=server_url)
+    assert_equals(sorted(tumor_types), ["BRCA", "LUAD"])
+    assert_equals(tumor_types["LUAD"]["name"], "Lung Adenocarcinoma")
+    assert_equals(OncoTreeHandler.requests, 1)
+    assert_equals(json.load(open(cache_file))["tumor_types"], tumor_types)
+
+
+@with_setup(start_server, stop_server)
+def test_cache_is_used_within_ttl():
+    "lookups within the TTL don't touch the network, and an expired cache is refreshed"
+
+    cache_file = os.path.join(work_dir, "oncotree.json")
+    oncotree_cache.load_tumor_types(cache_file, url=server_url)
+    oncotree_cache.load_tumor_types(cache_file, url=server_url)
+    assert_equals(OncoTreeHandler.requests, 1)
+    oncotree_cache.load_tumor_types(cache_file, ttl=0, url=server_url)
+    assert_equals(OncoTreeHandler.requests, 2)
+
+
+@with_setup(start_server, stop_server)
+def test_offline_mode():
+    "offline mode reads any cache without the network, and fails without one"
+
+    cache_file = os.path.join(work_dir, "oncotree.json")
+    assert_raises(Exception, oncotree_cache.load_tumor_types, cache_file, offline=True, url=server_url)
+    oncotree_cache.load_tumor_types(cache_file, url=server_url)
+    tumor_types = oncotree_cache.load_tumor_types(cache_file, ttl=0, offline=True, url=server_url)
+    assert_equals(sorted(tumor_types), ["BRCA", "LUAD"])
+    assert_equals(OncoTreeHandler.requests, 1)
+
+
+@with_setup(start_server, stop_server)
+def test_unreachable_api_falls_back_to_expired_cache():
+    "an expired cache is still used when the API can't be reached"
+
+    cache_file = os.path.join(work_dir, "oncotree.json")
+    oncotree_cache.load_tumor_types(cache_file, url=server_url)
+    stop_server_now()
+    tumor_types = oncotree_cache.load_tumor_types(cache_file, ttl=0, url=server_url, timeout=5)
+    assert_equals(sorted(tumor_types), ["BRCA", "LUAD"])
+    missing_cache_file = os.path.join(work_dir, "missing.json")
+    assert_raises(oncotree_cache.requests.RequestException, oncotree_cache.load_tumor_types, missing_cache_file,
+                  url=server_url, timeout=5)
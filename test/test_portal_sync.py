@@ -0,0 +1,40 @@
+import os
+import sys
+from nose.tools import assert_equals
+from nose.tools import with_setup
+import fixtures
+from fixtures import make_work_dir
+from fixtures import remove_work_dir
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import portal_sync
+
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as output_file:
+        output_file.write(content)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_sync_copies_only_changed_files():
+    "a re-sync only rewrites the files whose content changed, and leaves files missing from the source"
+
+    source = os.path.join(fixtures.work_dir, "portal")
+    destination = os.path.join(fixtures.work_dir, "repo", "proj")
+    write_file(os.path.join(source, "meta_study.txt"), "type_of_cancer: mixed\n")
+    write_file(os.path.join(source, "case_lists", "cases_all.txt"), "case_list_ids: s1\n")
+    report = portal_sync.sync_tree(source, destination)
+    assert_equals(report.added, ["case_lists/cases_all.txt", "meta_study.txt"])
+    assert_equals(open(os.path.join(destination, "case_lists", "cases_all.txt")).read(), "case_list_ids: s1\n")
+
+    # Same size, different content
+    write_file(os.path.join(source, "case_lists", "cases_all.txt"), "case_list_ids: s2\n")
+    write_file(os.path.join(destination, "data_old.txt"), "stale\n")
+    unchanged_mtime = os.path.getmtime(os.path.join(destination, "meta_study.txt"))
+    report = portal_sync.sync_tree(source, destination)
+    assert_equals(report, portal_sync.SyncReport([], ["case_lists/cases_all.txt"], ["meta_study.txt"], ["data_old.txt"]))
+    assert_equals(open(os.path.join(destination, "case_lists", "cases_all.txt")).read(), "case_list_ids: s2\n")
+    assert_equals(os.path.getmtime(os.path.join(destination, "meta_study.txt")), unchanged_mtime)
+    assert_equals(sorted(os.listdir(os.path.join(destination, "case_lists"))), ["cases_all.txt"])
@@ -0,0 +1,105 @@
+import os
+import sys
+import shutil
+import tempfile
+from nose.tools import assert_equals
+from nose.tools import with_setup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import portal_validation
+
+STUDY_FILES = {
+    "meta_study.txt": "type_of_cancer: mixed\ncancer_study_identifier: proj_study\n",
+    "meta_clinical_sample.txt": "cancer_study_identifier: proj_study\ngenetic_alteration_type: CLINICAL\n"
+                                "datatype: SAMPLE_ATTRIBUTES\ndata_filename: data_clinical_sample.txt\n",
+    "data_clinical_sample.txt": "SAMPLE_ID\tPATIENT_ID\ns1\tp1\n",
+    "meta_CNA.txt": "cancer_study_identifier: proj_study\ngenetic_alteration_type: COPY_NUMBER_ALTERATION\n"
+                    "datatype: DISCRETE\ndata_filename: data_CNA.txt\n",
+    "data_CNA.txt": "Hugo_Symbol\ts1\nTP53\t-2\n",
+    "proj_study_meta_cna_hg19_seg.txt": "cancer_study_identifier: proj_study\ngenetic_alteration_type: COPY_NUMBER_ALTERATION\n"
+                                        "datatype: SEG\ndata_filename: proj_study_data_cna_hg19.seg\n",
+    "proj_study_data_cna_hg19.seg": "ID\tchrom\tloc.start\tloc.end\tnum.mark\tseg.mean\ns1\t1\t1\t100\t10\t0.1000\n",
+    "case_lists/cases_all.txt": "cancer_study_identifier: proj_study\ncase_list_ids: s1\n",
+}
+
+
+class FakeValidator(object):
+    "stands in for the validateData module, recording the files of each study it validates"
+
+    def __init__(self, validator_file, exit_status=0):
+        self.__file__ = validator_file
+        self.exit_status = exit_status
+        self.studies = []
+
+    def main_validate(self, args):
+        self.studies.append(sorted(os.listdir(args.study_directory)))
+        return self.exit_status
+
+
+work_dir = None
+study_dir = None
+validator = None
+
+
+def make_study():
+    global work_dir, study_dir, validator
+    work_dir = tempfile.mkdtemp()
+    study_dir = os.path.join(work_dir, "portal")
+    for file_name, content in STUDY_FILES.items():
+        write_file(os.path.join(study_dir, file_name), content)
+    validator_file = os.path.join(work_dir, "validateData.py")
+    write_file(validator_file, "")
+    validator = FakeValidator(validator_file)
+
+
+def remove_study():
+    shutil.rmtree(work_dir)
+
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as output_file:
+        output_file.write(content)
+
+
+@with_setup(make_study, remove_study)
+def test_metadata_is_validated_without_data_files():
+    "the metadata validation only sees the study meta, clinical files and case lists"
+
+    portal_validator = portal_validation.PortalValidator(validator, os.path.join(work_dir, "cache.json"))
+    assert_equals(portal_validator.validate_metadata(study_dir), 0)
+    assert_equals(validator.studies, [["case_lists", "data_clinical_sample.txt", "meta_clinical_sample.txt", "meta_study.txt"]])
+
+
+@with_setup(make_study, remove_study)
+def test_bad_meta_file_fails_without_running_validator():
+    "a meta file without a data file or with another study identifier fails before the validator runs"
+
+    write_file(os.path.join(study_dir, "meta_CNA.txt"), "cancer_study_identifier: other_study\n")
+    portal_validator = portal_validation.PortalValidator(validator, os.path.join(work_dir, "cache.json"))
+    assert_equals(portal_validator.validate_metadata(study_dir), 1)
+    assert_equals(validator.studies, [])
+
+
+@with_setup(make_study, remove_study)
+def test_unchanged_profiles_are_not_revalidated():
+    "a re-run only validates the profiles whose data changed, and invalid results aren't cached"
+
+    cache_file = os.path.join(work_dir, "cache.json")
+    portal_validator = portal_validation.PortalValidator(validator, cache_file)
+    assert_equals(portal_validator.validate_data(study_dir), 0)
+    assert_equals(len(validator.studies[-1]), 8)
+    assert_equals(portal_validator.validate_data(study_dir), 0)
+    assert_equals(len(validator.studies), 1)
+
+    write_file(os.path.join(study_dir, "data_CNA.txt"), "Hugo_Symbol\ts1\nTP53\t2\n")
+    validator.exit_status = 1
+    assert_equals(portal_validator.validate_data(study_dir), 1)
+    assert_equals(validator.studies[-1], ["case_lists", "data_CNA.txt", "data_clinical_sample.txt", "meta_CNA.txt",
+                                          "meta_clinical_sample.txt", "meta_study.txt"])
+    validator.exit_status = 3
+    assert_equals(portal_validator.validate_data(study_dir), 3)
+    assert_equals(len(validator.studies), 3)
+    assert_equals(portal_validator.validate_data(study_dir), 3)
+    assert_equals(len(validator.studies), 3)
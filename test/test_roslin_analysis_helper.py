@@ -0,0 +1,223 @@
+import os
+import csv
+import sys
+import json
+import shutil
+import tempfile
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+from nose.tools import with_setup
+import fixtures
+
+test_directory = os.path.dirname(os.path.abspath(__file__))
+script_path = os.path.abspath(os.path.join(test_directory, os.pardir, "setup", "bin"))
+sys.path.insert(0, script_path)
+sys.path.insert(0, os.path.join(test_directory, "benchmark"))
+import portal_validation
+import roslin_executor
+import synthetic_data
+
+# The helper logs to roslin_analysis_helper.log in the directory it is imported from, so it is imported from a
+# scratch directory and its log is dropped, leaving the log records to nose
+import_dir = tempfile.mkdtemp()
+original_dir = os.getcwd()
+os.chdir(import_dir)
+try:
+    import roslin_analysis_helper
+finally:
+    os.chdir(original_dir)
+roslin_analysis_helper.logger.removeHandler(roslin_analysis_helper.log_file_handler)
+roslin_analysis_helper.log_file_handler.close()
+shutil.rmtree(import_dir)
+
+# cmo_facets writes the gene level CNA table and the scna table next to it
+CMO_FACETS_STUB = """#!/bin/sh
+out=$(echo "$@" | sed 's/.* -o //')
+printf 'Hugo_Symbol\\ts_C_000000_T001_d\\nTP53\\t-2\\n' > $out
+printf 'Hugo_Symbol\\ts_C_000000_T001_d\\nTP53\\t-2\\n' > $(echo $out | sed 's/\\.txt$/.scna.txt/')
+"""
+SEG_HEADER = "ID\tchrom\tloc.start\tloc.end\tnum.mark\tseg.mean\n"
+
+
+LEGACY_CLINICAL_DATA = ("SAMPLE_ID\tPATIENT_ID\tCOLLAB_ID\tSAMPLE_TYPE\tONCOTREE_CODE\tSEX\tSAMPLE_COVERAGE\n"
+                        "s_C_000000_T001_d\tp_C_000000\tCOLLAB-0\tPrimary\tLUAD\tM\t512\n"
+                        "s_C_000001_T001_d\tp_C_000000\t COLLAB-1 \tMetastasis\tLUAD\tM\t301\n"
+                        "s_C_000002_T001_d\tp_C_000001\tCOLLAB-2\tPrimary\tBRCA \tF\t88\n")
+
+
+def legacy_generate_file_txt(data, attr, header):
+    # How roslin_analysis_helper wrote a new-format clinical file before ClinicalFileWriter, from every row at once
+    order = list(header)
+    metadata = "#" + "\t".join(order) + "\n"
+    metadata += "#" + "\t".join(attr[heading]["desc"] for heading in order) + "\n"
+    metadata += "#" + "\t".join(attr[heading]["datatype"] for heading in order) + "\n"
+    metadata += "#" + "\t".join(attr[heading]["priority"] for heading in order) + "\n"
+    data_str = "\t".join(order) + "\n"
+    for row in data:
+        data_str += "\t".join(row[heading].strip() for heading in order) + "\n"
+    return metadata + data_str
+
+
+class FakeValidator(object):
+    "stands in for the validateData module, and crashes on the studies of projects titled Failing"
+
+    def __init__(self, validator_file):
+        self.__file__ = validator_file
+
+    def main_validate(self, args):
+        with open(os.path.join(args.study_directory, "meta_study.txt")) as meta_file:
+            if "Failing" in meta_file.read():
+                raise IOError("validator crashed")
+        return 0
+
+
+class RecordingExecutor(roslin_executor.LocalExecutor):
+    "a local executor that records the jobs it is asked to cancel"
+
+    def __init__(self, workers=None):
+        super(RecordingExecutor, self).__init__(workers)
+        self.cancelled = []
+
+    def cancel(self, job_ids):
+        self.cancelled.extend(job_ids)
+        super(RecordingExecutor, self).cancel(job_ids)
+
+
+original_path = None
+original_validator = roslin_analysis_helper.portal_validator
+original_cache_directory = roslin_analysis_helper.maf_filter_cache_directory
+
+
+def make_work_dir():
+    # The jobs run python and cmo_facets from the PATH, and the helper writes its logs under the working directory
+    global original_path
+    fixtures.make_work_dir()
+    stub_dir = os.path.join(fixtures.work_dir, "bin")
+    os.mkdir(stub_dir)
+    os.symlink(sys.executable, os.path.join(stub_dir, "python"))
+    write_file(os.path.join(stub_dir, "cmo_facets"), CMO_FACETS_STUB)
+    os.chmod(os.path.join(stub_dir, "cmo_facets"), 0o755)
+    original_path = os.environ["PATH"]
+    os.environ["PATH"] = stub_dir + os.pathsep + original_path
+    os.chdir(fixtures.work_dir)
+    validator_file = os.path.join(fixtures.work_dir, "validateData.py")
+    write_file(validator_file, "")
+    roslin_analysis_helper.portal_validator = portal_validation.PortalValidator(FakeValidator(validator_file), os.path.join(fixtures.work_dir, "validation_cache.json"))
+    roslin_analysis_helper.maf_filter_cache_directory = os.path.join(fixtures.work_dir, "maf_filter_cache")
+
+
+def remove_work_dir():
+    roslin_analysis_helper.portal_validator = original_validator
+    roslin_analysis_helper.maf_filter_cache_directory = original_cache_directory
+    os.environ["PATH"] = original_path
+    os.chdir(original_dir)
+    fixtures.remove_work_dir()
+
+
+def write_file(path, content):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as output_file:
+        output_file.write(content)
+
+
+def make_inputs(pairs=2):
+    # The per-pair MAFs, facets files, clinical data and roslin stdout that the projects of a manifest share
+    inputs_dir = os.path.join(fixtures.work_dir, "inputs")
+    os.makedirs(os.path.join(inputs_dir, "maf"))
+    synthetic_data.generate_maf(os.path.join(inputs_dir, "maf", "synthetic.muts.maf"), 60, 7, pairs)
+    for pair in range(pairs):
+        tumor_id = "s_C_%06i_T001_d" % pair
+        write_file(os.path.join(inputs_dir, "facets", tumor_id + "_hisens.seg"), SEG_HEADER + tumor_id + "\t1\t1\t100\t10\t0.123456\n")
+        write_file(os.path.join(inputs_dir, "facets", tumor_id + "_hisens.cncf.txt"), "")
+    synthetic_data.generate_clinical(os.path.join(inputs_dir, "data_clinical.txt"), os.path.join(inputs_dir, "sample_summary.txt"), pairs, 7)
+    write_file(os.path.join(inputs_dir, "roslin_output.txt"), "line1\nline2\nVERSIONS: roslin: 2.4.0\n")
+    return {"clinical_data": os.path.join(inputs_dir, "data_clinical.txt"),
+            "sample_summary": os.path.join(inputs_dir, "sample_summary.txt"),
+            "roslin_output": os.path.join(inputs_dir, "roslin_output.txt"),
+            "maf_directory": os.path.join(inputs_dir, "maf"),
+            "facets_directory": os.path.join(inputs_dir, "facets")}
+
+
+def make_project(inputs, project_id, title):
+    request_file = os.path.join(fixtures.work_dir, project_id + "_request.txt")
+    write_file(request_file, "PI: Jane Doe\nProjectID: %s\nProjectTitle: %s\nProjectDesc: A test project\n"
+                             "TumorType: luad\nAssay: WholeExomeSequencing\n" % (project_id, title))
+    output_directory = os.path.join(fixtures.work_dir, project_id, "portal")
+    os.makedirs(output_directory)
+    return dict(inputs, request_file=request_file, output_directory=output_directory)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_clinical_files_match_legacy_writer():
+    "the sample and patient files are written byte for byte like the legacy writer did, with a row per sample"
+
+    legacy_file = os.path.join(fixtures.work_dir, "data_clinical.txt")
+    write_file(legacy_file, LEGACY_CLINICAL_DATA)
+    samples_file = os.path.join(fixtures.work_dir, "data_clinical_sample.txt")
+    patients_file = os.path.join(fixtures.work_dir, "data_clinical_patient.txt")
+    roslin_analysis_helper.create_data_clinical_files_new_format(legacy_file, samples_file, patients_file)
+
+    with open(legacy_file, "rb") as legacy_clinical:
+        data = list(csv.DictReader(legacy_clinical, delimiter="\t"))
+    header = data[0].keys()
+    attr = roslin_analysis_helper.set_attributes(header)
+    samples_header = roslin_analysis_helper.get_samples_header(header)
+    with open(samples_file, "rb") as samples, open(patients_file, "rb") as patients:
+        samples_txt, patients_txt = samples.read(), patients.read()
+    assert_equals(samples_txt, legacy_generate_file_txt(data, attr, samples_header))
+    assert_equals(patients_txt, legacy_generate_file_txt(data, attr, roslin_analysis_helper.get_patients_header(header)))
+
+    sample_lines = samples_txt.split("\n")
+    assert_equals(sample_lines[0], "#" + "\t".join(samples_header))
+    assert_equals(samples_header[:2], ["SAMPLE_ID", "PATIENT_ID"])
+    assert_equals(sorted(samples_header), ["COLLAB_ID", "ONCOTREE_CODE", "PATIENT_ID", "SAMPLE_COVERAGE", "SAMPLE_ID", "SAMPLE_TYPE"])
+    assert_equals(sample_lines[2].split("\t")[samples_header.index("SAMPLE_COVERAGE")], "NUMBER")
+    assert_equals(sample_lines[3].split("\t")[samples_header.index("COLLAB_ID")], "0")
+    assert_equals(sample_lines[4], "\t".join(samples_header))
+    assert_equals(sample_lines[6].split("\t")[samples_header.index("COLLAB_ID")], "COLLAB-1")
+    assert_equals(len(sample_lines), 5 + 3 + 1)
+    assert_equals(len(patients_txt.split("\n")), 5 + 3 + 1)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_batch_reports_each_project_and_cancels_failed_preparation():
+    "a project whose preparation fails after submitting its jobs has them cancelled, without stopping the others"
+
+    inputs = make_inputs()
+    projects = [make_project(inputs, "Proj_05500", "Test project"), make_project(inputs, "Proj_05501", "Failing project")]
+    manifest_file = os.path.join(fixtures.work_dir, "manifest.json")
+    write_file(manifest_file, json.dumps({"projects": projects}))
+    report_file = os.path.join(fixtures.work_dir, "report.json")
+    executor = RecordingExecutor(2)
+    try:
+        exit_status = roslin_analysis_helper.run_batch(manifest_file, script_path, executor, None, True, report_file)
+    finally:
+        executor.shutdown()
+    assert_equals(exit_status, 1)
+    with open(report_file) as report_json:
+        report = json.load(report_json)
+    assert_equals([(result["request_file"], result["project_id"], result["exit_status"], result["result"]) for result in report], [
+        (projects[1]["request_file"], None, 1, "preparation failed: validator crashed"),
+        (projects[0]["request_file"], "Proj_05500", 0, "success")])
+    # The first project's jobs are local-1 to local-3, and the failing project's are the next three
+    assert_equals(executor.cancelled, ["local-4", "local-5", "local-6"])
+    portal_files = os.listdir(projects[0]["output_directory"])
+    for file_name in ("data_mutations_extended.txt", "data_CNA.txt", "data_clinical_sample.txt", "meta_study.txt"):
+        assert_equals(file_name in portal_files, True)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_manifest_missing_field():
+    "a manifest with a project that lacks one of the per-project arguments is rejected before any job is submitted"
+
+    project = make_project(make_inputs(), "Proj_05500", "Test project")
+    del project["facets_directory"]
+    manifest_file = os.path.join(fixtures.work_dir, "manifest.json")
+    write_file(manifest_file, json.dumps([project]))
+    executor = RecordingExecutor(2)
+    try:
+        assert_raises(Exception, roslin_analysis_helper.run_batch, manifest_file, script_path, executor, None, True)
+    finally:
+        executor.shutdown()
+    assert_equals(executor.jobs, {})
@@ -0,0 +1,42 @@
+import os
+import sys
+import shutil
+import tempfile
+from nose.tools import assert_equals
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import roslin_executor
+
+
+def test_local_executor_runs_jobs_concurrently():
+    "local jobs run side by side, and each log gets the stdout and stderr of its job"
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        executor = roslin_executor.get_executor("local", 2)
+        # Each job waits for the other to start, so this only finishes if both run at once
+        wait_command = "cd %s; touch %s.started; while [ ! -e %s.started ]; do sleep 0.01; done; "
+        first = executor.submit("first", wait_command % (work_dir, "first", "second") + "echo first",
+                                os.path.join(work_dir, "first.log"))
+        second = executor.submit("second", wait_command % (work_dir, "second", "first") + "echo second >&2",
+                                 os.path.join(work_dir, "second.log"))
+        assert_equals(executor.wait([first, second], "test jobs"), 0)
+        executor.shutdown()
+        assert_equals(open(os.path.join(work_dir, "first.log")).read(), "first\n")
+        assert_equals(open(os.path.join(work_dir, "second.log")).read(), "second\n")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+def test_local_executor_reports_failed_jobs():
+    "a job with a non-zero exit code fails the whole wait"
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        executor = roslin_executor.get_executor("local", 2)
+        job_ids = [executor.submit("ok", "true", os.path.join(work_dir, "ok.log")),
+                   executor.submit("fail", "exit 3", os.path.join(work_dir, "fail.log"))]
+        assert_equals(executor.wait(job_ids, "test jobs"), 1)
+        executor.shutdown()
+    finally:
+        shutil.rmtree(work_dir)
@@ -0,0 +1,42 @@
+import os
+import sys
+import shutil
+import tempfile
+from nose.tools import assert_equals
+from nose.tools import assert_true
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import roslin_request
+
+EXAMPLE_REQUEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "examples",
+                               "Proj_DEV_0001", "Proj_DEV_0001_request.txt")
+
+
+def test_parse_example_request():
+    "the fields the scripts use are parsed from a real request file"
+
+    request = roslin_request.load_request_file(EXAMPLE_REQUEST)
+    assert_equals((request.assay, request.project_id, request.pi, request.tumor_type),
+                  ("AgilentExon_51MB_b37_v3", "Proj_DEV_0001", "soccin", None))
+    assert_equals(request.fields["Data_Analyst_E-mail"], "soccin@mskcc.org")
+    assert_equals(request.is_impact, False)
+
+
+def test_multi_line_values_and_cache():
+    "lines without a colon continue the value before them, and a file is reparsed only after it changes"
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        request_file = os.path.join(work_dir, "Proj_01234_request.txt")
+        with open(request_file, "w") as request:
+            request.write("ProjectID: Proj_01234\nProjectDesc: first line,\n second line\nAssay: IMPACT468\n")
+        request = roslin_request.load_request_file(request_file)
+        assert_equals(request.fields["ProjectDesc"], "first line, second line")
+        assert_true(request.is_impact)
+        assert_true(roslin_request.load_request_file(request_file) is request)
+
+        with open(request_file, "a") as request_append:
+            request_append.write("TumorType: luad\n")
+        assert_equals(roslin_request.load_request_file(request_file).tumor_type, "luad")
+    finally:
+        shutil.rmtree(work_dir)
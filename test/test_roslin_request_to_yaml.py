@@ -0,0 +1,66 @@
+import os
+import sys
+import glob
+import shutil
+import tempfile
+from nose.tools import assert_equals
+from nose.tools import with_setup
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import roslin_request_to_yaml
+
+work_dir = None
+
+
+def make_runs():
+    global work_dir
+    work_dir = tempfile.mkdtemp()
+    for run, sample in [("RUN_A", "s_C_000001_N001_d"), ("RUN_A", "s_C_000001_T001_d"), ("RUN_B", "s_C_000001_T001_d")]:
+        sample_directory = os.path.join(work_dir, run, "Sample_" + sample)
+        if not os.path.isdir(sample_directory):
+            os.makedirs(sample_directory)
+        for name in [sample + "_IGO_00001_1_S1_L001_R1_001.fastq.gz", sample + "_IGO_00001_1_S1_L001_R2_001.fastq.gz",
+                     "." + sample + "_IGO_00001_1_S1_L001_R1_001.fastq.gz", sample + "_IGO_00001_1_S1_L001_I1_001.fastq.gz",
+                     "SampleSheet.csv"]:
+            open(os.path.join(sample_directory, name), "w").close()
+    roslin_request_to_yaml.fastq_listings.clear()
+
+
+def remove_runs():
+    shutil.rmtree(work_dir)
+
+
+@with_setup(make_runs, remove_runs)
+def test_fastq_listing_matches_glob():
+    "a listing has the same fastqs as the glob it replaces, and a missing directory has none"
+
+    for sample_directory in glob.glob(os.path.join(work_dir, "*", "Sample_*")) + [os.path.join(work_dir, "missing")]:
+        assert_equals(sorted(roslin_request_to_yaml.list_fastq_directory(sample_directory)),
+                      sorted(glob.glob(os.path.join(sample_directory, roslin_request_to_yaml.fastq_pattern))))
+
+
+@with_setup(make_runs, remove_runs)
+def test_mapping_rows_share_directory_listings():
+    "each fastq directory is listed once, however many mapping rows point at it"
+
+    mapping_file = os.path.join(work_dir, "Proj_01234_sample_mapping.txt")
+    with open(mapping_file, "w") as mapping:
+        for run, sample in [("RUN_A", "s_C_000001_N001_d"), ("RUN_A", "s_C_000001_T001_d"),
+                            ("RUN_B", "s_C_000001_T001_d"), ("RUN_B", "s_C_000001_T001_d")]:
+            mapping.write("\t".join(["_1", sample, run, os.path.join(work_dir, run, "Sample_" + sample), "PE"]) + "\n")
+    listed_directories = []
+    list_fastq_directory = roslin_request_to_yaml.list_fastq_directory
+
+    def counting_list_fastq_directory(fastq_directory):
+        listed_directories.append(fastq_directory)
+        return list_fastq_directory(fastq_directory)
+
+    roslin_request_to_yaml.list_fastq_directory = counting_list_fastq_directory
+    try:
+        mapping_dict = roslin_request_to_yaml.parse_mapping_file(mapping_file)
+    finally:
+        roslin_request_to_yaml.list_fastq_directory = list_fastq_directory
+    assert_equals(len(listed_directories), 3)
+    assert_equals(len(mapping_dict["s_C_000001_T001_d"]["fastqs"]["R1"]), 3)
+    assert_equals(mapping_dict["s_C_000001_N001_d"]["fastqs"]["R2"],
+                  [os.path.join(work_dir, "RUN_A", "Sample_s_C_000001_N001_d", "s_C_000001_N001_d_IGO_00001_1_S1_L001_R2_001.fastq.gz")])
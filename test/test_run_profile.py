@@ -0,0 +1,36 @@
+import os
+import sys
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import run_profile
+import roslin_executor
+
+
+def test_spans_record_status_and_attributes():
+    "a span is recorded as failed when its body raises, and keeps the attributes the body added"
+
+    profile = run_profile.RunProfile()
+    with profile.span("clinical data", "Proj_1") as span:
+        span["bytes"] = 10
+    with assert_raises(ValueError):
+        with profile.span("case lists", "Proj_1"):
+            raise ValueError("bad clinical file")
+    assert_equals([(span["stage"], span["project"], span["status"], span.get("bytes")) for span in profile.spans],
+                  [("clinical data", "Proj_1", "ok", 10), ("case lists", "Proj_1", "failed", None)])
+
+
+def test_summarize_stages_across_profiles():
+    "stages are totalled across profiles, slowest first, with the mean time jobs spent queued"
+
+    first = run_profile.RunProfile()
+    first.add_span("clinical data", 0, 2, "Proj_1", bytes=100)
+    first.add_job_spans([roslin_executor.JobResult("1", "MAF data generation", "DONE", "0", 0, 10, 40)], "Proj_1")
+    second = run_profile.RunProfile()
+    second.add_span("clinical data", 0, 4, "Proj_2", bytes=50)
+    second.add_job_spans([roslin_executor.JobResult("2", "MAF data generation", "EXIT", "1", 0, 30, 50)], "Proj_2")
+    profiles = [{"spans": first.spans}, {"spans": second.spans}]
+    assert_equals(run_profile.summarize_stages(profiles),
+                  [run_profile.StageSummary("job: MAF data generation", 2, 1, 50, 25, 30, 20, 0),
+                   run_profile.StageSummary("clinical data", 2, 0, 6, 3, 4, None, 150)])
@@ -0,0 +1,94 @@
+import os
+import sys
+from nose.tools import assert_equals
+from nose.tools import assert_raises
+from nose.tools import with_setup
+import fixtures
+from fixtures import make_work_dir
+from fixtures import remove_work_dir
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "setup", "bin"))
+import seg_merge
+
+
+# Seg lines and what awk 'OFS="\t" {$6=sprintf("%.4f",$6); print}' prints for them
+AWK_CASES = [
+    ("s1\t1\t100\t200\t50\t0.123456\n", "s1\t1\t100\t200\t50\t0.1235\n"),
+    ("s1\t1\t2\t3\t4\t0.12345\n", "s1\t1\t2\t3\t4\t0.1235\n"),
+    ("s1\t1\t2\t3\t4\t.5\ts2\tx\n", "s1\t1\t2\t3\t4\t0.5000\ts2\tx\n"),
+]
+AWK_FIELD_SPLITTING_CASES = [
+    ("s1  1\t\t100 200\t 50\t-0.55555\n", "s1\t1\t100\t200\t50\t-0.5555\n"),
+    ("  s1\t1\t2\t3\t4\t5  \n", "s1\t1\t2\t3\t4\t5.0000\n"),
+    ("s1\t1\t2\t3\t4\t0.5\r\n", "s1\t1\t2\t3\t4\t0.5000\n"),
+]
+AWK_PADDING_CASES = [
+    ("s1\t1\t100\n", "s1\t1\t100\t\t\t0.0000\n"),
+    ("\n", "\t\t\t\t\t0.0000\n"),
+]
+AWK_NUMBER_CASES = [
+    ("s1\t1\t2\t3\t4\t1.5e-3abc\n", "s1\t1\t2\t3\t4\t0.0015\n"),
+    ("s1\t1\t2\t3\t4\t12abc\n", "s1\t1\t2\t3\t4\t12.0000\n"),
+    ("s1\t1\t2\t3\t4\tNA\n", "s1\t1\t2\t3\t4\t0.0000\n"),
+]
+
+
+def check_awk_cases(cases):
+    for line, awk_line in cases:
+        assert_equals(seg_merge.round_seg_line(line), awk_line)
+
+
+def test_rounding():
+    "seg.mean is printed with 4 decimals, and the other fields are kept as they are"
+
+    check_awk_cases(AWK_CASES)
+
+
+def test_field_splitting():
+    "fields are split on runs of spaces and tabs, ignoring them at either end, and rejoined with tabs"
+
+    check_awk_cases(AWK_FIELD_SPLITTING_CASES)
+
+
+def test_short_lines_are_padded():
+    "lines with fewer than 6 fields get empty fields up to a seg.mean of 0"
+
+    check_awk_cases(AWK_PADDING_CASES)
+
+
+def test_leading_number():
+    "seg.mean is read from the leading number of the field, and is 0 when the field has none, like NA"
+
+    check_awk_cases(AWK_NUMBER_CASES)
+
+
+def write_seg(file_name, lines):
+    path = os.path.join(fixtures.work_dir, file_name)
+    with open(path, "w") as seg_file:
+        seg_file.write("".join(lines))
+    return path
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_merge_seg_files():
+    "the merged seg files have one header and the rounded lines of every tumor in input order, with any worker count"
+
+    header = "ID\tchrom\tloc.start\tloc.end\tnum.mark\tseg.mean\n"
+    input_files = [write_seg("t1_hisens.seg", [header, "t1\t1\t100\t200\t50\t0.123456\n"]),
+                   write_seg("t2_hisens.seg", [header, "t2\t2\t300\t400\t60\tNA\n", "t2\t3\t500\t600\t70\t-1.23456\n"])]
+    expected = header + "t1\t1\t100\t200\t50\t0.1235\n" + "t2\t2\t300\t400\t60\t0.0000\n" + "t2\t3\t500\t600\t70\t-1.2346\n"
+    for workers in (1, 2):
+        output_files = [os.path.join(fixtures.work_dir, "portal.seg"), os.path.join(fixtures.work_dir, "analysis.seg")]
+        seg_merge.merge_seg_files(input_files, output_files, workers)
+        for output_file in output_files:
+            assert_equals(open(output_file).read(), expected)
+
+
+@with_setup(make_work_dir, remove_work_dir)
+def test_mismatched_headers():
+    "seg files whose columns differ, or without seg.mean as column 6, are rejected"
+
+    first_file = write_seg("t1_hisens.seg", ["ID\tchrom\tloc.start\tloc.end\tnum.mark\tseg.mean\n"])
+    second_file = write_seg("t2_hisens.seg", ["ID\tchrom\tloc.start\tloc.end\tseg.mean\tnum.mark\n"])
+    assert_raises(ValueError, seg_merge.check_seg_headers, [first_file, second_file])
+    assert_raises(ValueError, seg_merge.check_seg_headers, [second_file])